@@ -0,0 +1,256 @@
+"""Result caches for expensive, repeatable work (e.g. metadata generation).
+
+Two tiers are provided:
+
+- ``MemoryLRU``: a small in-process LRU holding serialized values.
+- ``DiskCache``: one file per key under a directory, with an idle TTL and a
+  total byte budget. The least recently used entries are evicted first.
+
+``TieredCache`` combines both for JSON-serializable values: memory is checked
+first, then disk, and disk hits are promoted into memory.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(*parts) -> str:
+    """Build a stable cache key from arbitrary parts (None is allowed)."""
+    raw = json.dumps([p if p is None else str(p) for p in parts], separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def sha256_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class MemoryLRU:
+    """Bounded in-process LRU."""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    """Directory-backed cache with an idle TTL and a byte budget.
+
+    Entries are written atomically (temp file + rename). Reads refresh the
+    file mtime, so an entry expires once it has not been used for
+    ``ttl_seconds`` and eviction removes the least recently used ones first.
+    """
+
+    def __init__(self, root: str, ttl_seconds: float = 7 * 24 * 3600, max_bytes: int = 64 * 1024 * 1024, suffix: str = ".bin"):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.evictions = 0
+        self._bytes: int | None = None
+        self._lock = threading.Lock()
+
+    def path_for(self, key: str, suffix: str | None = None) -> str:
+        return os.path.join(self.root, key[:2], key + (suffix or self.suffix))
+
+    def get_path(self, key: str, suffix: str | None = None) -> str | None:
+        """Return the path of a live entry (refreshing its access time) or None."""
+        path = self.path_for(key, suffix)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if self.ttl_seconds and time.time() - st.st_mtime > self.ttl_seconds:
+            self._remove(path, st.st_size)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def get(self, key: str, suffix: str | None = None) -> bytes | None:
+        path = self.get_path(key, suffix)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as fh:
+                return fh.read()
+        except OSError:
+            return None
+
+    def put(self, key: str, value: bytes, suffix: str | None = None) -> str:
+        path = self.path_for(key, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(value)
+        try:
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+        os.replace(tmp, path)
+        with self._lock:
+            self._bytes = self._scan_bytes() if self._bytes is None else self._bytes + len(value) - previous
+            over_budget = self.max_bytes and self._bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+        return path
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones until under 90% of the budget."""
+        entries = []
+        for path in self._iter_files():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9) if self.max_bytes else total
+        now = time.time()
+        for mtime, size, path in entries:
+            expired = self.ttl_seconds and now - mtime > self.ttl_seconds
+            if not expired and total <= target:
+                break
+            if self._unlink(path):
+                total -= size
+                self.evictions += 1
+        with self._lock:
+            self._bytes = total
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._scan_bytes()
+            return self._bytes
+
+    def _iter_files(self):
+        if not os.path.isdir(self.root):
+            return
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".tmp"):
+                    yield os.path.join(dirpath, name)
+
+    def _scan_bytes(self) -> int:
+        total = 0
+        for path in self._iter_files():
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    def _remove(self, path: str, size: int):
+        if self._unlink(path):
+            with self._lock:
+                if self._bytes is not None:
+                    self._bytes = max(0, self._bytes - size)
+
+    @staticmethod
+    def _unlink(path: str) -> bool:
+        try:
+            os.unlink(path)
+            return True
+        except OSError:
+            return False
+
+
+class TieredCache:
+    """Memory LRU in front of a ``DiskCache`` for JSON-serializable values.
+
+    Values are stored serialized, so callers always get a fresh copy they are
+    free to mutate.
+    """
+
+    def __init__(self, root: str, max_entries: int = 512, ttl_seconds: float = 7 * 24 * 3600, max_bytes: int = 64 * 1024 * 1024):
+        self.memory = MemoryLRU(max_entries)
+        self.disk = DiskCache(root, ttl_seconds=ttl_seconds, max_bytes=max_bytes, suffix=".json")
+        self.ttl_seconds = ttl_seconds
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.writes = 0
+
+    def get(self, key: str):
+        entry = self.memory.get(key)
+        if entry is not None and entry[0] >= time.time():
+            self.hits_memory += 1
+            return json.loads(entry[1])
+        try:
+            raw = self.disk.get(key)
+        except Exception:
+            logger.exception("Disk cache read failed for %s", key)
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            self.misses += 1
+            return None
+        self.hits_disk += 1
+        self._remember(key, raw)
+        return value
+
+    def put(self, key: str, value):
+        raw = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self._remember(key, raw)
+        self.writes += 1
+        try:
+            self.disk.put(key, raw)
+        except Exception:
+            logger.exception("Disk cache write failed for %s", key)
+
+    def _remember(self, key: str, raw: bytes):
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else float("inf")
+        self.memory.put(key, (expires_at, raw))
+
+    def stats(self) -> dict:
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "writes": self.writes,
+            "hit_rate": round((self.hits_memory + self.hits_disk) / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_max_entries": self.memory.max_entries,
+            "disk_bytes": self.disk.total_bytes,
+            "disk_max_bytes": self.disk.max_bytes,
+            "disk_evictions": self.disk.evictions,
+        }
@@ -0,0 +1,80 @@
+"""Request de-duplication for expensive endpoints.
+
+- ``SingleFlight`` coalesces concurrent calls with the same key onto one
+  computation; every caller gets its own copy of the result.
+- ``IdempotencyStore`` keeps completed responses for an ``Idempotency-Key``
+  for a time window so client retries replay the stored result.
+"""
+import asyncio
+import copy
+import time
+
+from .cache import MemoryLRU
+
+
+class IdempotencyConflict(Exception):
+    """The Idempotency-Key was already used for a different request."""
+
+
+class SingleFlight:
+    def __init__(self):
+        self.executed = 0
+        self.coalesced = 0
+        self._inflight: dict = {}
+
+    async def do(self, key: str, fn):
+        """Run `fn()` (a coroutine factory) once per key at a time; concurrent callers share it.
+
+        The computation is shielded, so one caller disconnecting does not cancel
+        it for the others.
+        """
+        loop = asyncio.get_running_loop()
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is loop and not entry[1].done():
+            self.coalesced += 1
+            task = entry[1]
+        else:
+            self.executed += 1
+            task = loop.create_task(fn())
+            self._inflight[key] = (loop, task)
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _forget(self, key: str, task):
+        entry = self._inflight.get(key)
+        if entry is not None and entry[1] is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # mark the exception as retrieved when nobody is left waiting on it
+            task.exception()
+
+    def stats(self) -> dict:
+        return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
+
+
+class IdempotencyStore:
+    def __init__(self, ttl_seconds: float = 24 * 3600, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.replayed = 0
+        self.stored = 0
+        self._entries = MemoryLRU(max_entries)
+
+    def get(self, key: str, fingerprint: str | None = None):
+        """Stored response for `key`, or None. Raises IdempotencyConflict on a fingerprint mismatch."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, stored_fingerprint, value = entry
+        if expires_at < time.time():
+            return None
+        if fingerprint and stored_fingerprint and fingerprint != stored_fingerprint:
+            raise IdempotencyConflict(key)
+        self.replayed += 1
+        return copy.deepcopy(value)
+
+    def put(self, key: str, value, fingerprint: str | None = None):
+        self.stored += 1
+        self._entries.put(key, (time.time() + self.ttl_seconds, fingerprint, copy.deepcopy(value)))
+
+    def stats(self) -> dict:
+        return {"stored": self.stored, "replayed": self.replayed, "entries": len(self._entries), "ttl_seconds": self.ttl_seconds}
@@ -0,0 +1,123 @@
+"""Resized / re-encoded copies of uploads and outputs for previews.
+
+A derivative is identified by its source file and a spec (width, height,
+fit, format, quality). The source is identified by its inode, size and
+mtime instead of a content hash: logical names are hard links into the blob
+store, so every name of the same content shares one inode (and its
+derivatives), and nothing has to be read to build the key.
+
+Rendered derivatives live in a ``DiskCache`` with an LRU byte budget:
+
+- ``DERIVATIVE_CACHE_MAX_BYTES``: disk budget (default 256 MiB)
+- ``DERIVATIVE_CACHE_TTL``: idle expiry in seconds (default 30 days)
+- ``DERIVATIVE_MAX_DIM``: largest width/height that can be requested (default 2048)
+"""
+import io
+import os
+
+from PIL import Image, ImageOps
+
+from .cache import DiskCache, make_key
+
+DERIVATIVE_CACHE_MAX_BYTES = int(os.getenv("DERIVATIVE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+DERIVATIVE_CACHE_TTL = float(os.getenv("DERIVATIVE_CACHE_TTL", str(30 * 24 * 3600)))
+DERIVATIVE_MAX_DIM = int(os.getenv("DERIVATIVE_MAX_DIM", "2048"))
+# Bump when rendering changes so cached derivatives are not reused
+DERIVATIVES_VERSION = "1"
+
+# format name -> (PIL format, media type, file suffix)
+FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+    "webp": ("WEBP", "image/webp", ".webp"),
+}
+FITS = ("contain", "cover", "fill")
+
+
+def parse_spec(width: int | None = None, height: int | None = None, fit: str = "contain", fmt: str = "webp", quality: int = 80) -> dict:
+    """Validate request parameters into a spec; raises ValueError with a user-facing message."""
+    fmt = (fmt or "webp").lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+    if fit not in FITS:
+        raise ValueError(f"fit must be one of: {', '.join(FITS)}")
+    if width is None and height is None:
+        raise ValueError("width or height is required")
+    for value in (width, height):
+        if value is not None and not 1 <= value <= DERIVATIVE_MAX_DIM:
+            raise ValueError(f"width and height must be between 1 and {DERIVATIVE_MAX_DIM}")
+    if fit != "contain" and (width is None or height is None):
+        raise ValueError(f"fit={fit} needs both width and height")
+    if not 1 <= quality <= 100:
+        raise ValueError("quality must be between 1 and 100")
+    return {"width": width, "height": height, "fit": fit, "format": fmt, "quality": quality}
+
+
+def derivative_key(path: str, spec: dict) -> str:
+    st = os.stat(path)
+    source = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+    return make_key("derivative", DERIVATIVES_VERSION, source, spec["width"], spec["height"], spec["fit"], spec["format"], spec["quality"])
+
+
+def _box(size: tuple, spec: dict) -> tuple:
+    """Target box; a missing dimension follows the source aspect ratio."""
+    w, h = spec["width"], spec["height"]
+    if w is None:
+        w = max(1, round(size[0] * h / size[1]))
+    if h is None:
+        h = max(1, round(size[1] * w / size[0]))
+    return w, h
+
+
+def render_derivative(path: str, spec: dict) -> bytes:
+    """Decode `path` at the smallest scale that covers the target and encode the derivative."""
+    pil_format, _, _ = FORMATS[spec["format"]]
+    with Image.open(path) as img:
+        if spec["fit"] != "fill":
+            # JPEG sources decode at 1/2, 1/4 or 1/8 scale when that still covers the box
+            # (square request: the EXIF rotation below may swap width and height)
+            side = max(_box(img.size, spec))
+            img.draft("RGB", (side, side))
+        img = ImageOps.exif_transpose(img)
+        box = _box(img.size, spec)
+        keep_alpha = pil_format == "WEBP" and (img.mode in ("RGBA", "LA") or "transparency" in img.info)
+        if keep_alpha:
+            img = img.convert("RGBA")
+        elif img.mode != "RGB":
+            # flatten transparency onto white for JPEG
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        if spec["fit"] == "contain":
+            img = ImageOps.contain(img, box, Image.Resampling.LANCZOS)
+        elif spec["fit"] == "cover":
+            img = ImageOps.fit(img, box, Image.Resampling.LANCZOS)
+        else:
+            img = img.resize(box, Image.Resampling.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, pil_format, quality=spec["quality"], **({"method": 4} if pil_format == "WEBP" else {"optimize": True}))
+    return buf.getvalue()
+
+
+class DerivativeCache:
+    def __init__(self, root: str, max_bytes: int = DERIVATIVE_CACHE_MAX_BYTES, ttl_seconds: float = DERIVATIVE_CACHE_TTL):
+        self.disk = DiskCache(root, ttl_seconds=ttl_seconds, max_bytes=max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, path: str, spec: dict, key: str | None = None) -> bytes:
+        """Encoded derivative of `path`, rendered and cached on first use."""
+        key = key or derivative_key(path, spec)
+        suffix = FORMATS[spec["format"]][2]
+        data = self.disk.get(key, suffix)
+        if data is not None:
+            self.hits += 1
+            return data
+        self.misses += 1
+        data = render_derivative(path, spec)
+        self.disk.put(key, data, suffix)
+        return data
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.disk.evictions}
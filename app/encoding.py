@@ -0,0 +1,165 @@
+"""Named encoding presets for generated images.
+
+A preset fixes the container (progressive JPEG, WebP with alpha or
+palette-quantized PNG), the largest edge, and a byte budget. Encoding
+searches the quality setting (the palette size for PNG): the highest one
+that fits the budget, then the lowest one at or below it that still reaches
+the preset's PSNR threshold, so simple images are not stored at a needlessly
+high quality. When even the lowest setting is over budget it is used anyway.
+
+Presets are looked up by name (``get_preset``); ``encode`` returns the bytes
+and the chosen setting.
+"""
+import io
+import math
+
+from PIL import Image, ImageChops, ImageStat
+
+
+class Preset:
+    def __init__(self, name: str, format: str, max_edge: int | None = None, max_bytes: int | None = None,
+                 min_quality: int = 60, max_quality: int = 90, min_psnr: float | None = None,
+                 background: tuple | None = None, colors: tuple = (256, 128, 64, 32)):
+        self.name = name
+        self.format = format
+        self.max_edge = max_edge
+        self.max_bytes = max_bytes
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.min_psnr = min_psnr
+        # flatten transparency onto this color (always done for JPEG, white by default)
+        self.background = background
+        # PNG only: palette sizes to try, largest first
+        self.colors = colors
+
+    @property
+    def extension(self) -> str:
+        return {"JPEG": ".jpg", "WEBP": ".webp", "PNG": ".png"}[self.format]
+
+    @property
+    def media_type(self) -> str:
+        return {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}[self.format]
+
+    def spec(self) -> dict:
+        """Everything that affects the output, for cache keys."""
+        return dict(vars(self))
+
+
+PRESETS = {
+    preset.name: preset
+    for preset in (
+        # Etsy listing photos: 2000px recommended, uploads up to 1 MB
+        Preset("etsy-hero", "JPEG", max_edge=3000, max_bytes=1_000_000, min_quality=75, max_quality=92, min_psnr=40),
+        # Amazon main image: pure white background, JPEG, 1000px+ for zoom
+        Preset("amazon-main", "JPEG", max_edge=2000, max_bytes=2_000_000, min_quality=80, max_quality=95, min_psnr=42, background=(255, 255, 255)),
+        Preset("web-thumb", "WEBP", max_edge=512, max_bytes=50_000, min_quality=50, max_quality=85, min_psnr=36),
+        Preset("web-transparent", "WEBP", max_edge=2048, max_bytes=400_000, min_quality=60, max_quality=90, min_psnr=38),
+        # cutouts where the destination needs PNG (marketplaces do not take WebP)
+        Preset("transparent", "PNG", max_edge=2048, max_bytes=1_500_000, min_psnr=36),
+        # slideshow frames fed to ffmpeg: fixed quality, no search
+        Preset("video-frame", "JPEG", min_quality=90, max_quality=90),
+    )
+}
+
+
+def get_preset(name: str) -> Preset:
+    """The preset called `name`; raises ValueError listing the known names."""
+    try:
+        return PRESETS[name]
+    except KeyError:
+        raise ValueError(f"unknown encoding preset {name!r} (known: {', '.join(PRESETS)})") from None
+
+
+class Encoded:
+    def __init__(self, data: bytes, preset: Preset, setting: int):
+        self.data = data
+        self.preset = preset
+        # quality (JPEG/WebP) or palette size (PNG) that was chosen
+        self.setting = setting
+
+
+def _as_seen(img: Image.Image) -> Image.Image:
+    """RGB as displayed: transparent images composited onto mid gray (hidden pixels do not count)."""
+    if img.mode == "RGB":
+        return img
+    rgba = img.convert("RGBA")
+    flat = Image.new("RGB", rgba.size, (128, 128, 128))
+    flat.paste(rgba, mask=rgba.getchannel("A"))
+    return flat
+
+
+def psnr(reference: Image.Image, other: Image.Image) -> float:
+    """Peak signal-to-noise ratio in dB between the two images as displayed (inf when identical)."""
+    diff = ImageChops.difference(_as_seen(reference), _as_seen(other))
+    sum2 = ImageStat.Stat(diff).sum2
+    mse = sum(sum2) / (len(sum2) * reference.width * reference.height)
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def prepare(img: Image.Image, preset: Preset) -> Image.Image:
+    """Downscale to the preset's max edge and convert to the mode its format stores."""
+    if preset.max_edge and max(img.size) > preset.max_edge:
+        img = img.copy()
+        img.thumbnail((preset.max_edge, preset.max_edge), Image.Resampling.LANCZOS)
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+    if has_alpha and (preset.format == "JPEG" or preset.background):
+        rgba = img.convert("RGBA")
+        flat = Image.new("RGB", rgba.size, preset.background or (255, 255, 255))
+        flat.paste(rgba, mask=rgba.getchannel("A"))
+        return flat
+    if has_alpha:
+        return img if img.mode == "RGBA" else img.convert("RGBA")
+    return img if img.mode == "RGB" else img.convert("RGB")
+
+
+def _encode_at(img: Image.Image, preset: Preset, setting: int) -> bytes:
+    buf = io.BytesIO()
+    if preset.format == "JPEG":
+        img.save(buf, "JPEG", quality=setting, optimize=True, progressive=True)
+    elif preset.format == "WEBP":
+        img.save(buf, "WEBP", quality=setting, method=4)
+    else:
+        method = Image.Quantize.FASTOCTREE if img.mode == "RGBA" else Image.Quantize.MEDIANCUT
+        img.quantize(setting, method=method).save(buf, "PNG", optimize=True)
+    return buf.getvalue()
+
+
+def encode(img: Image.Image, preset: Preset | str) -> Encoded:
+    """Encode `img` with `preset` (a Preset or its name), searching the setting as described above."""
+    if isinstance(preset, str):
+        preset = get_preset(preset)
+    img = prepare(img, preset)
+    # candidate settings, best quality last
+    if preset.format == "PNG":
+        settings = sorted(preset.colors)
+    else:
+        settings = list(range(preset.min_quality, preset.max_quality + 1))
+    results = {}
+
+    def at(i: int) -> bytes:
+        if i not in results:
+            results[i] = _encode_at(img, preset, settings[i])
+        return results[i]
+
+    # highest setting within the byte budget (binary search: size grows with the setting)
+    best = len(settings) - 1
+    if preset.max_bytes and len(at(best)) > preset.max_bytes:
+        lo, hi, best = 0, best - 1, 0
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            if len(at(mid)) <= preset.max_bytes:
+                best, lo = mid, mid + 1
+            else:
+                hi = mid - 1
+    # lowest setting up to there that still meets the perceptual threshold
+    if preset.min_psnr and best > 0:
+        lo, hi = 0, best
+        while lo < hi:
+            mid = (lo + hi) // 2
+            with Image.open(io.BytesIO(at(mid))) as decoded:
+                if psnr(img, decoded) >= preset.min_psnr:
+                    hi = mid
+                else:
+                    lo = mid + 1
+        best = lo
+    return Encoded(at(best), preset, settings[best])
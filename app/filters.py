@@ -0,0 +1,94 @@
+"""Image filters shared by the visuals script, the API fallback and the graph executor.
+
+Everything runs inside Pillow's C routines: sepia is a single color-matrix
+conversion, the vignette is a single composite against a radial mask (built
+once per size and strength) and a solid background that are both cached, and
+fonts are loaded once per (name, size).
+"""
+from functools import lru_cache
+
+from PIL import Image, ImageChops, ImageDraw, ImageEnhance, ImageFilter, ImageFont
+
+# Luma weights (ITU-R 601, as used by convert("L")) scaled by the sepia tint per channel
+_LUMA = (0.299, 0.587, 0.114)
+_SEPIA_TINT = (0.95, 0.85, 0.65)
+SEPIA_MATRIX = tuple(w * tint for tint in _SEPIA_TINT for w in _LUMA + (0,))
+
+FONT_CANDIDATES = ("DejaVuSans.ttf", "arial.ttf", "Arial.ttf")
+
+
+def sepia(im: Image.Image) -> Image.Image:
+    """Warm monochrome: luma scaled by (0.95, 0.85, 0.65) per channel."""
+    rgb = im if im.mode == "RGB" else im.convert("RGB")
+    return rgb.convert("RGB", matrix=SEPIA_MATRIX)
+
+
+@lru_cache(maxsize=16)
+def vignette_mask(size: tuple, strength: float = 0.8, inner: float = 0.45) -> Image.Image:
+    """L mask for `size`: 255 inside `inner` of the radius, easing to 255*(1-strength) at the corners.
+
+    Cached: callers must not modify the returned image.
+    """
+    lut = []
+    for v in range(256):
+        t = v / 255.0
+        if t <= inner:
+            lut.append(255)
+            continue
+        x = (t - inner) / (1.0 - inner)
+        ease = x * x * (3 - 2 * x)
+        lut.append(int(round(255 * (1.0 - strength * ease))))
+    # radial_gradient is 0 at the centre and 255 in the corners; stretch it to the image aspect
+    return Image.radial_gradient("L").point(lut).resize(size, Image.Resampling.BILINEAR)
+
+
+@lru_cache(maxsize=4)
+def _solid(size: tuple, color: tuple) -> Image.Image:
+    """Cached solid RGB image (callers must not modify it)."""
+    return Image.new("RGB", size, color)
+
+
+def vignette(im: Image.Image, strength: float = 0.8, color: tuple = (10, 10, 10)) -> Image.Image:
+    """Darken the edges of `im` towards `color`."""
+    # composite() writes a new image, so an RGB input needs no defensive copy
+    rgb = im if im.mode == "RGB" else im.convert("RGB")
+    return Image.composite(rgb, _solid(rgb.size, tuple(color)), vignette_mask(rgb.size, strength))
+
+
+@lru_cache(maxsize=32)
+def load_font(size: int, name: str | None = None) -> ImageFont.ImageFont:
+    for candidate in ((name,) if name else ()) + FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(candidate, size=size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def overlay_text(im: Image.Image, text: str, position: str = "bottom-right", font_name: str | None = None) -> Image.Image:
+    """Return a copy of `im` with `text` on a dark box in a corner (`top-left` ... `bottom-right`)."""
+    out = im.convert("RGB") if im.mode != "RGB" else im.copy()
+    if not text:
+        return out
+    draw = ImageDraw.Draw(out)
+    font = load_font(max(16, out.width // 32), font_name)
+    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    w, h, pad = right - left, bottom - top, 10
+    x = pad if position.endswith("left") else out.width - w - pad
+    y = pad if position.startswith("top") else out.height - h - pad
+    draw.rectangle((x - 6, y - 6, x + w + 6, y + h + 6), fill=(0, 0, 0))
+    draw.text((x - left, y - top), text, fill=(255, 255, 255), font=font)
+    return out
+
+
+def enhance(im: Image.Image, brightness: float = 1.0, contrast: float = 1.0, saturation: float = 1.0) -> Image.Image:
+    """Apply brightness, contrast and saturation factors (1.0 leaves a channel untouched)."""
+    for factor, enhancer in ((brightness, ImageEnhance.Brightness), (contrast, ImageEnhance.Contrast), (saturation, ImageEnhance.Color)):
+        if factor != 1.0:
+            im = enhancer(im).enhance(factor)
+    return im
+
+
+def soft_glow(im: Image.Image, strength: float = 0.6) -> Image.Image:
+    glow = im.filter(ImageFilter.GaussianBlur(radius=max(2, max(im.size) // 100)))
+    return Image.blend(im, ImageChops.screen(im, glow), strength)
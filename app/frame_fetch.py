@@ -0,0 +1,176 @@
+"""Concurrent resolution of slideshow frame URLs into bytes.
+
+`/api/generate-video` takes a list of frame URLs: `/uploads/...` and
+`/outputs/...` files, ``data:`` URLs and remote http(s) URLs. Remote frames
+are downloaded concurrently over one pooled aiohttp session (connections are
+kept alive between requests), data URLs are decoded in memory by worker
+threads (off the event loop), and local files are passed on as paths.
+Nothing is written to temp files: the frames go straight to
+`make_video_from_frames`.
+
+A frame that cannot be resolved (bad URL, HTTP error, over the size limit,
+not finished by the deadline) is logged and left out, like before.
+
+Tunables (environment):
+
+- ``FRAME_FETCH_CONCURRENCY``: max downloads in flight per request (default 8)
+- ``FRAME_FETCH_POOL_SIZE``: max pooled connections (default 16)
+- ``FRAME_FETCH_TIMEOUT``: per-frame download timeout in seconds (default 10)
+- ``FRAME_FETCH_DEADLINE``: deadline for resolving all frames of one request (default 30s)
+- ``FRAME_MAX_BYTES``: largest accepted frame (default 20 MiB)
+"""
+import asyncio
+import base64
+import binascii
+import logging
+import os
+
+from fastapi.concurrency import run_in_threadpool
+
+try:
+    import aiohttp
+except Exception:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+FRAME_FETCH_CONCURRENCY = int(os.getenv("FRAME_FETCH_CONCURRENCY", "8"))
+FRAME_FETCH_POOL_SIZE = int(os.getenv("FRAME_FETCH_POOL_SIZE", "16"))
+FRAME_FETCH_TIMEOUT = float(os.getenv("FRAME_FETCH_TIMEOUT", "10"))
+FRAME_FETCH_DEADLINE = float(os.getenv("FRAME_FETCH_DEADLINE", "30"))
+FRAME_MAX_BYTES = int(os.getenv("FRAME_MAX_BYTES", str(20 * 1024 * 1024)))
+
+
+class FrameTooLarge(ValueError):
+    pass
+
+
+def decode_data_url(url: str, max_bytes: int = FRAME_MAX_BYTES) -> bytes:
+    """Payload of a base64 ``data:`` URL; the size is checked before decoding."""
+    header, sep, encoded = url.partition(",")
+    if not sep or not header.endswith(";base64"):
+        raise ValueError("only base64 data URLs are supported")
+    if len(encoded) * 3 // 4 > max_bytes + 2:
+        raise FrameTooLarge(f"frame is larger than {max_bytes} bytes")
+    try:
+        data = base64.b64decode(encoded)
+    except binascii.Error as e:
+        raise ValueError(f"invalid base64 data: {e}") from None
+    if len(data) > max_bytes:
+        raise FrameTooLarge(f"frame is larger than {max_bytes} bytes")
+    return data
+
+
+class FrameFetcher:
+    def __init__(self, concurrency: int = FRAME_FETCH_CONCURRENCY, pool_size: int = FRAME_FETCH_POOL_SIZE,
+                 timeout: float = FRAME_FETCH_TIMEOUT, deadline: float = FRAME_FETCH_DEADLINE,
+                 max_bytes: int = FRAME_MAX_BYTES, keepalive_timeout: float = 30.0):
+        self.concurrency = concurrency
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_bytes = max_bytes
+        self.keepalive_timeout = keepalive_timeout
+        self.fetched = 0
+        self.bytes_fetched = 0
+        self.failed = 0
+        self.timed_out = 0
+        self._loop = None
+        self._session = None
+
+    def _bind_loop(self):
+        """The session for the running loop (recreated if the loop changes)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._session = None
+        if self._session is None or self._session.closed:
+            if aiohttp is None:
+                raise RuntimeError("aiohttp is not installed; cannot download frames")
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def download(self, url: str) -> bytes:
+        """GET `url` into memory, refusing bodies over `max_bytes` before and while reading."""
+        session = self._bind_loop()
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=self.timeout)) as resp:
+            resp.raise_for_status()
+            if resp.content_length is not None and resp.content_length > self.max_bytes:
+                raise FrameTooLarge(f"frame is larger than {self.max_bytes} bytes ({resp.content_length})")
+            buf = bytearray()
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                buf += chunk
+                if len(buf) > self.max_bytes:
+                    raise FrameTooLarge(f"frame is larger than {self.max_bytes} bytes")
+        self.fetched += 1
+        self.bytes_fetched += len(buf)
+        return bytes(buf)
+
+    async def fetch_frames(self, urls: list, local=None) -> list:
+        """Resolve `urls` to frames (file paths or bytes) in their original order.
+
+        `local(url)` maps a local URL to a file path (None when there is no
+        such file). Unresolvable frames are logged and dropped.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def resolve(url: str):
+            if url.startswith("data:"):
+                # decoding megabytes of base64 would stall every other request on the loop
+                return await run_in_threadpool(decode_data_url, url, self.max_bytes)
+            if url.startswith(("http://", "https://")):
+                async with semaphore:
+                    return await self.download(url)
+            path = local(url) if local is not None else None
+            if path is None:
+                raise FileNotFoundError(f"File not found: {url}")
+            return path
+
+        tasks = [asyncio.ensure_future(resolve(url)) for url in urls]
+        if not tasks:
+            return []
+        done, pending = await asyncio.wait(tasks, timeout=self.deadline)
+        for task in pending:
+            task.cancel()
+        if pending:
+            self.timed_out += len(pending)
+            logger.warning("Dropping %d frame(s) not resolved within %.1fs", len(pending), self.deadline)
+            await asyncio.gather(*pending, return_exceptions=True)
+        frames = []
+        for url, task in zip(urls, tasks):
+            if task not in done:
+                continue
+            error = task.exception()
+            if error is not None:
+                self.failed += 1
+                logger.error("Failed to process image %s: %s", url[:80], error)
+                continue
+            frames.append(task.result())
+        return frames
+
+    async def aclose(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stats(self) -> dict:
+        return {
+            "fetched": self.fetched,
+            "bytes_fetched": self.bytes_fetched,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "concurrency": self.concurrency,
+            "max_bytes": self.max_bytes,
+        }
+
+
+_fetcher: FrameFetcher | None = None
+
+
+def get_fetcher() -> FrameFetcher:
+    """Process-wide shared fetcher."""
+    global _fetcher
+    if _fetcher is None:
+        _fetcher = FrameFetcher()
+    return _fetcher
@@ -0,0 +1,254 @@
+"""CPU executor for the ComfyUI-style node graphs in ``comfyui/node_graphs``.
+
+A graph file lists ``nodes`` (``id``, ``type``, ``params``) and
+``connections`` (``[from_id, to_id]`` pairs). The executor checks the graph
+is acyclic, then runs every node as soon as its inputs are ready, so
+independent branches run in parallel (PIL releases the GIL for its heavy
+operations, so threads are enough).
+
+Each node's output is cached under a Merkle-style key: a hash of the node
+type, its params and the keys of its inputs (for ``ImageLoader`` the file
+content hash). Changing one param only invalidates that node and what
+depends on it; e.g. editing the overlay text reuses the cached resize and
+color results.
+
+``GRAPH_MAX_DIM`` (default 4096) bounds the width and height a Resize node
+may produce; graph params can come from API callers.
+"""
+import asyncio
+import copy
+import json
+import os
+from collections import deque
+
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image, ImageFilter
+
+from . import filters
+from .cache import MemoryLRU, make_key, sha256_file
+from .storage import get_store
+
+GRAPH_MAX_DIM = int(os.getenv("GRAPH_MAX_DIM", "4096"))
+
+
+class GraphError(ValueError):
+    """The graph file is malformed, cyclic or uses an unknown node type."""
+
+
+def _canonical(params: dict) -> str:
+    return json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+
+
+# --- node implementations: (inputs, params, context) -> output -------------
+
+
+def _load(inputs, params, ctx):
+    with Image.open(ctx.resolve_input(params["path"])) as img:
+        return img.convert("RGB")
+
+
+def _resize(inputs, params, ctx):
+    img = inputs[0]
+    size = (int(params.get("width", img.width)), int(params.get("height", img.height)))
+    if not all(1 <= v <= GRAPH_MAX_DIM for v in size):
+        raise GraphError(f"Resize width and height must be between 1 and {GRAPH_MAX_DIM}")
+    if params.get("mode", "fit") == "exact":
+        return img.resize(size, Image.Resampling.LANCZOS)
+    # fit inside the box, keeping the aspect ratio
+    scale = min(size[0] / img.width, size[1] / img.height)
+    return img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.Resampling.LANCZOS)
+
+
+def _color_balance(inputs, params, ctx):
+    return filters.enhance(
+        inputs[0],
+        brightness=float(params.get("brightness", 1.0)),
+        contrast=float(params.get("contrast", 1.0)),
+        saturation=float(params.get("saturation", 1.0)),
+    )
+
+
+def _stylize(inputs, params, ctx):
+    img = inputs[0]
+    kind = params.get("filter", "none")
+    strength = float(params.get("strength", 1.0))
+    if kind == "soft_glow":
+        return filters.soft_glow(img, strength)
+    if kind == "sepia":
+        return Image.blend(img, filters.sepia(img), min(1.0, strength))
+    if kind == "vignette":
+        return filters.vignette(img, min(1.0, strength))
+    if kind == "blur":
+        return img.filter(ImageFilter.GaussianBlur(radius=max(1, strength * 4)))
+    if kind == "sharpen":
+        return Image.blend(img, img.filter(ImageFilter.SHARPEN), min(1.0, strength))
+    if kind == "none":
+        return img
+    raise GraphError(f"unknown StylizeFilter filter: {kind}")
+
+
+def _overlay_text(inputs, params, ctx):
+    return filters.overlay_text(inputs[0], str(params.get("text", "")), params.get("position", "bottom-right"))
+
+
+def _save(inputs, params, ctx):
+    path = ctx.resolve_output(params["path"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fmt = Image.registered_extensions().get(os.path.splitext(path)[1].lower(), "PNG")
+    get_store(path).save_image(inputs[0], path, fmt, quality=int(params.get("quality", 90)))
+    return path
+
+
+NODE_TYPES = {
+    "ImageLoader": _load,
+    "Resize": _resize,
+    "ColorBalance": _color_balance,
+    "StylizeFilter": _stylize,
+    "OverlayText": _overlay_text,
+    "ImageSaver": _save,
+}
+# Nodes with side effects always run; their upstream results still come from the cache
+UNCACHED_TYPES = {"ImageSaver"}
+
+
+class Graph:
+    def __init__(self, spec: dict):
+        nodes = spec.get("nodes")
+        if not isinstance(nodes, list) or not nodes:
+            raise GraphError("graph has no nodes")
+        self.name = spec.get("name", "")
+        self.nodes = {}
+        for node in nodes:
+            if node.get("id") in self.nodes:
+                raise GraphError(f"duplicate node id: {node.get('id')}")
+            if node.get("type") not in NODE_TYPES:
+                raise GraphError(f"unknown node type: {node.get('type')}")
+            self.nodes[node["id"]] = {"type": node["type"], "params": dict(node.get("params") or {})}
+        self.inputs = {node_id: [] for node_id in self.nodes}
+        for edge in spec.get("connections") or []:
+            src, dst = edge[0], edge[1]
+            if src not in self.nodes or dst not in self.nodes:
+                raise GraphError(f"connection references unknown node: {src} -> {dst}")
+            self.inputs[dst].append(src)
+        self.order = self._topological_order()
+
+    def with_params(self, overrides: dict) -> "Graph":
+        """A copy of the graph with `overrides[node_id]` merged over each node's params."""
+        unknown = set(overrides) - set(self.nodes)
+        if unknown:
+            raise GraphError(f"params given for unknown nodes: {', '.join(sorted(unknown))}")
+        graph = copy.copy(self)
+        graph.nodes = {node_id: {"type": node["type"], "params": {**node["params"], **(overrides.get(node_id) or {})}} for node_id, node in self.nodes.items()}
+        return graph
+
+    def _topological_order(self) -> list:
+        pending = {node_id: len(srcs) for node_id, srcs in self.inputs.items()}
+        consumers = {node_id: [] for node_id in self.nodes}
+        for dst, srcs in self.inputs.items():
+            for src in srcs:
+                consumers[src].append(dst)
+        ready = deque(node_id for node_id, n in pending.items() if n == 0)
+        order = []
+        while ready:
+            node_id = ready.popleft()
+            order.append(node_id)
+            for dst in consumers[node_id]:
+                pending[dst] -= 1
+                if pending[dst] == 0:
+                    ready.append(dst)
+        if len(order) != len(self.nodes):
+            raise GraphError("graph contains a cycle")
+        return order
+
+
+def load_graph(path: str) -> Graph:
+    with open(path, "r", encoding="utf-8") as fh:
+        try:
+            spec = json.load(fh)
+        except ValueError as e:
+            raise GraphError(f"invalid graph JSON: {e}") from e
+    return Graph(spec)
+
+
+class RunContext:
+    """Where a run reads inputs from and writes outputs to."""
+
+    def __init__(self, input_root: str, output_root: str, name: str):
+        self.input_root = input_root
+        self.output_root = output_root
+        self.name = name
+
+    def resolve_input(self, path: str) -> str:
+        return _inside(self.input_root, path)
+
+    def resolve_output(self, path: str) -> str:
+        path = path.replace("%name%", self.name)
+        # graph files write to "outputs/..." relative to the project; map that onto output_root
+        if path.startswith("outputs/"):
+            path = path[len("outputs/"):]
+        return _inside(self.output_root, path)
+
+
+def _inside(root: str, path: str) -> str:
+    root = os.path.realpath(root)
+    full = os.path.realpath(os.path.join(root, path))
+    if not full.startswith(root + os.sep):
+        raise GraphError(f"path escapes {root}: {path}")
+    return full
+
+
+class GraphExecutor:
+    def __init__(self, cache_entries: int = 64):
+        self.cache = MemoryLRU(cache_entries)
+        self.hits = 0
+        self.misses = 0
+
+    def node_key(self, graph: Graph, node_id: str, input_keys: list, ctx: RunContext) -> str:
+        node = graph.nodes[node_id]
+        identity = _canonical(node["params"])
+        if node["type"] == "ImageLoader":
+            # key on the file content so an edited file is never served from cache
+            identity += sha256_file(ctx.resolve_input(node["params"]["path"]))
+        return make_key("node", node["type"], identity, *input_keys)
+
+    async def run(self, graph: Graph, ctx: RunContext, overrides: dict | None = None) -> dict:
+        """Execute `graph`; `overrides` maps node id to params merged over the file's params.
+
+        Returns `{"outputs": {node_id: path}, "cached": [...], "computed": [...]}`
+        where `outputs` lists the ImageSaver results.
+        """
+        run_graph = graph.with_params(overrides or {})
+        nodes = run_graph.nodes
+        tasks = {}
+        cached, computed, outputs = [], [], {}
+
+        async def run_node(node_id: str):
+            parents = [await tasks[src] for src in run_graph.inputs[node_id]]
+            node = nodes[node_id]
+            key = await run_in_threadpool(self.node_key, run_graph, node_id, [k for k, _ in parents], ctx)
+            value = None if node["type"] in UNCACHED_TYPES else self.cache.get(key)
+            if value is not None:
+                self.hits += 1
+                cached.append(node_id)
+            else:
+                self.misses += 1
+                value = await run_in_threadpool(NODE_TYPES[node["type"]], [v for _, v in parents], node["params"], ctx)
+                computed.append(node_id)
+                if node["type"] not in UNCACHED_TYPES:
+                    self.cache.put(key, value)
+            if node["type"] == "ImageSaver":
+                outputs[node_id] = value
+            return key, value
+
+        # tasks are created in topological order, so every parent task exists before its consumers
+        for node_id in run_graph.order:
+            tasks[node_id] = asyncio.ensure_future(run_node(node_id))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        return {"outputs": outputs, "cached": cached, "computed": computed}
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.cache)}
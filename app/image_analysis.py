@@ -0,0 +1,149 @@
+"""Fast image analysis for metadata generation.
+
+Works on a ~128px proxy instead of the full image: the embedded EXIF
+thumbnail when a camera wrote one, otherwise a reduced-resolution decode
+(JPEG draft mode / ``Image.reduce``). Visual facts are then derived with
+Pillow's C-level histogram routines: dominant colors, brightness,
+saturation, background uniformity and an aspect class.
+"""
+import io
+
+from PIL import ExifTags, Image, ImageStat
+
+ANALYSIS_SIZE = 128
+
+NAMED_COLORS = {
+    "black": (20, 20, 20),
+    "white": (245, 245, 245),
+    "gray": (128, 128, 128),
+    "silver": (192, 192, 192),
+    "red": (200, 30, 30),
+    "maroon": (120, 20, 30),
+    "orange": (240, 140, 20),
+    "yellow": (240, 220, 50),
+    "olive": (120, 120, 30),
+    "green": (40, 150, 60),
+    "teal": (20, 128, 128),
+    "blue": (40, 90, 200),
+    "navy": (20, 30, 100),
+    "purple": (120, 40, 140),
+    "pink": (240, 150, 190),
+    "brown": (130, 85, 45),
+    "beige": (225, 205, 170),
+}
+
+
+def color_name(rgb) -> str:
+    r, g, b = rgb[:3]
+    return min(NAMED_COLORS, key=lambda n: (NAMED_COLORS[n][0] - r) ** 2 + (NAMED_COLORS[n][1] - g) ** 2 + (NAMED_COLORS[n][2] - b) ** 2)
+
+
+def aspect_class(width: int, height: int) -> str:
+    ratio = width / height if height else 1.0
+    if ratio > 2.0:
+        return "panoramic"
+    if ratio > 1.1:
+        return "landscape"
+    if ratio >= 0.9:
+        return "square"
+    if ratio >= 0.5:
+        return "portrait"
+    return "tall"
+
+
+def exif_thumbnail(img: Image.Image) -> Image.Image | None:
+    """The JPEG thumbnail embedded in EXIF IFD1, if present and of the same aspect as `img`."""
+    raw = img.info.get("exif")
+    if not raw:
+        return None
+    try:
+        ifd1 = img.getexif().get_ifd(ExifTags.IFD.IFD1)
+        offset, length = ifd1.get(0x0201), ifd1.get(0x0202)
+        if not offset or not length:
+            return None
+        # EXIF offsets are relative to the TIFF header that follows the b"Exif\0\0" marker
+        base = 6 if raw.startswith(b"Exif") else 0
+        thumb = Image.open(io.BytesIO(raw[base + offset:base + offset + length]))
+        thumb.load()
+    except Exception:
+        return None
+    # letterboxed or rotated thumbnails would skew the statistics
+    if abs(thumb.width / thumb.height - img.width / img.height) > 0.05 * (img.width / img.height):
+        return None
+    return thumb
+
+
+def load_proxy(img: Image.Image, size: int = ANALYSIS_SIZE) -> Image.Image:
+    """Decode `img` at (roughly) `size` px on the long edge, as RGB."""
+    thumb = exif_thumbnail(img) if img.format in ("JPEG", "MPO") else None
+    if thumb is not None and max(thumb.size) >= size // 2:
+        img = thumb
+    elif img.format == "JPEG":
+        # DCT scaling: decode at 1/2, 1/4 or 1/8 resolution instead of full size
+        img.draft("RGB", (size, size))
+    if img.mode not in ("L", "LA", "RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info or "A" in img.getbands() else "RGB")
+    factor = max(1, min(img.width, img.height) // (size * 2))
+    small = img.reduce(factor) if factor > 1 else img
+    if small.mode in ("RGBA", "LA"):
+        rgba = small.convert("RGBA")
+        small = Image.new("RGB", rgba.size, (255, 255, 255))
+        small.paste(rgba, mask=rgba.getchannel("A"))
+    elif small.mode != "RGB":
+        small = small.convert("RGB")
+    small.thumbnail((size, size), Image.Resampling.BILINEAR)
+    return small
+
+
+def dominant_colors(small: Image.Image, count: int = 4) -> list:
+    quant = small.quantize(colors=count + 2, method=Image.Quantize.FASTOCTREE)
+    palette = quant.getpalette()
+    total = small.width * small.height
+    merged = {}
+    for pixels, index in quant.getcolors(count + 2) or []:
+        rgb = tuple(palette[index * 3:index * 3 + 3])
+        name = color_name(rgb)
+        entry = merged.setdefault(name, {"name": name, "hex": "#%02x%02x%02x" % rgb, "share": 0.0, "_px": 0})
+        # keep the hex of the largest cluster for each name
+        if pixels > entry["_px"]:
+            entry["hex"], entry["_px"] = "#%02x%02x%02x" % rgb, pixels
+        entry["share"] += pixels / total
+    colors = sorted(merged.values(), key=lambda c: c["share"], reverse=True)[:count]
+    return [{"name": c["name"], "hex": c["hex"], "share": round(c["share"], 3)} for c in colors]
+
+
+def background_stats(small: Image.Image, border: float = 0.08) -> dict:
+    """Uniformity (0..1) and dominant color of the image border, where product photos show background."""
+    w, h = small.size
+    bw, bh = max(1, int(w * border)), max(1, int(h * border))
+    strips = [(0, 0, w, bh), (0, h - bh, w, h), (0, bh, bw, h - bh), (w - bw, bh, w, h - bh)]
+    hist = [0] * 768
+    for box in strips:
+        for i, v in enumerate(small.crop(box).histogram()):
+            hist[i] += v
+    stat = ImageStat.Stat(hist)
+    spread = sum(stat.stddev) / 3
+    mean = tuple(int(round(m)) for m in stat.mean)
+    return {"uniformity": round(max(0.0, 1.0 - spread / 64.0), 3), "color": color_name(mean), "hex": "#%02x%02x%02x" % mean}
+
+
+def analyze_image_file(path: str) -> dict:
+    """Header fields plus visual statistics for the image at `path`."""
+    with Image.open(path) as img:
+        info = {"width": img.width, "height": img.height, "mode": img.mode, "format": img.format or "unknown"}
+        small = load_proxy(img)
+    info.update(analyze_proxy(small))
+    info["aspect"] = aspect_class(info["width"], info["height"])
+    return info
+
+
+def analyze_proxy(small: Image.Image) -> dict:
+    luma = small.convert("L").histogram()
+    brightness = sum(i * n for i, n in enumerate(luma)) / max(1, sum(luma)) / 255
+    saturation = ImageStat.Stat(small.convert("HSV").getchannel("S")).mean[0] / 255
+    return {
+        "dominant_colors": dominant_colors(small),
+        "brightness": round(brightness, 3),
+        "saturation": round(saturation, 3),
+        "background": background_stats(small),
+    }
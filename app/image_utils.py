@@ -1,6 +1,143 @@
-"""Image utility helpers (background removal, conversions)."""
+"""Image utility helpers (background removal, conversions).
+
+Background removal keeps a pool of long-lived rembg sessions so the ONNX
+model is loaded once per process instead of once per call. Configuration:
+
+- ``REMBG_MODEL``: rembg model name (default ``u2net``)
+- ``REMBG_SESSIONS``: number of sessions, i.e. concurrent inferences (default 1)
+- ``REMBG_INTRA_OP_THREADS`` / ``REMBG_INTER_OP_THREADS``: ONNX Runtime
+  thread counts per session (0 keeps the runtime default)
+"""
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from typing import Optional
 
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+REMBG_MODEL = os.getenv("REMBG_MODEL", "u2net")
+REMBG_SESSIONS = int(os.getenv("REMBG_SESSIONS", "1"))
+REMBG_INTRA_OP_THREADS = int(os.getenv("REMBG_INTRA_OP_THREADS", "0"))
+REMBG_INTER_OP_THREADS = int(os.getenv("REMBG_INTER_OP_THREADS", "0"))
+
+
+def _import_rembg():
+    try:
+        import rembg
+    except Exception as e:
+        raise ImportError("rembg is not installed") from e
+    return rembg
+
+
+def new_rembg_session(model_name: str = REMBG_MODEL, intra_op_threads: int = 0, inter_op_threads: int = 0):
+    """Create a rembg session, applying ONNX Runtime thread settings when given."""
+    rembg = _import_rembg()
+    if intra_op_threads or inter_op_threads:
+        try:
+            import onnxruntime as ort
+            from rembg.sessions import sessions_class
+
+            session_class = next(cls for cls in sessions_class if cls.name() == model_name)
+            opts = ort.SessionOptions()
+            if intra_op_threads:
+                opts.intra_op_num_threads = intra_op_threads
+            if inter_op_threads:
+                opts.inter_op_num_threads = inter_op_threads
+            return session_class(model_name, opts)
+        except (ImportError, StopIteration, TypeError):
+            logger.warning("Cannot set ONNX thread counts for rembg model %s; using defaults", model_name)
+    return rembg.new_session(model_name)
+
+
+class SessionPool:
+    """A fixed set of rembg sessions; each call borrows one for the duration of an inference."""
+
+    def __init__(self, size: int = 1, model_name: str = REMBG_MODEL, intra_op_threads: int = 0, inter_op_threads: int = 0, factory=None):
+        self.size = max(1, size)
+        self.model_name = model_name
+        self._factory = factory or (lambda: new_rembg_session(model_name, intra_op_threads, inter_op_threads))
+        self._sessions: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._executor: ThreadPoolExecutor | None = None
+
+    def load(self):
+        """Create all sessions (loads the model); later calls are no-ops."""
+        with self._lock:
+            if self._loaded:
+                return
+            for _ in range(self.size):
+                self._sessions.put(self._factory())
+            self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="rembg")
+            self._loaded = True
+
+    def warmup(self):
+        """Run a tiny image through every session so first requests skip lazy ONNX initialisation."""
+        self.load()
+        dummy = Image.new("RGB", (64, 64), (128, 128, 128))
+        self.remove_many([dummy] * self.size)
+
+    @contextmanager
+    def session(self):
+        self.load()
+        session = self._sessions.get()
+        try:
+            yield session
+        finally:
+            self._sessions.put(session)
+
+    def remove(self, image):
+        """Remove the background of `image` (encoded bytes or a PIL image; the result has the same type)."""
+        rembg = _import_rembg()
+        with self.session() as session:
+            return rembg.remove(image, session=session)
+
+    def remove_many(self, images: list) -> list:
+        """Process `images` across all sessions at once.
+
+        Returns results in input order; an item that failed is returned as its exception.
+        """
+        self.load()
+        futures = [self._executor.submit(self.remove, image) for image in images]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+_pool: Optional[SessionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_session_pool() -> SessionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SessionPool(REMBG_SESSIONS, REMBG_MODEL, REMBG_INTRA_OP_THREADS, REMBG_INTER_OP_THREADS)
+        return _pool
+
+
+def warmup_background_removal(run_dummy: bool = True) -> bool:
+    """Load (and optionally warm) the session pool; False when rembg is not installed."""
+    try:
+        _import_rembg()
+    except ImportError:
+        return False
+    pool = get_session_pool()
+    if run_dummy:
+        pool.warmup()
+    else:
+        pool.load()
+    return True
+
 
 def remove_background_bytes(data: bytes) -> bytes:
     """Remove background from image bytes using rembg.
@@ -9,11 +146,19 @@ def remove_background_bytes(data: bytes) -> bytes:
     Raises ImportError if rembg is not installed.
     Raises Exception on processing errors.
     """
-    try:
-        from rembg import remove
-    except Exception as e:
-        raise ImportError("rembg is not installed") from e
-
+    _import_rembg()
     # rembg.remove accepts bytes and returns PNG bytes
-    out = remove(data)
-    return out
+    return get_session_pool().remove(data)
+
+
+def remove_background_batch(images: list) -> list:
+    """Remove backgrounds from several images concurrently.
+
+    Items are encoded bytes (PNG bytes come back) or PIL images (RGBA images
+    come back).
+
+    Failed items are returned as their exception. Raises ImportError if rembg
+    is not installed.
+    """
+    _import_rembg()
+    return get_session_pool().remove_many(images)
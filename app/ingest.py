@@ -0,0 +1,91 @@
+"""Single-pass upload ingest.
+
+Streams an upload to disk in chunks without blocking the event loop. In the
+same pass it computes the SHA-256 of the content and parses the image header
+(dimensions, mode, format) from the first bytes, so the file never has to be
+re-read or re-opened just to describe it. The content hash also places the
+file in the content-addressed blob store (see ``storage``).
+"""
+import hashlib
+import io
+import os
+import uuid
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+
+from .storage import BlobStore, get_store
+
+CHUNK_SIZE = 256 * 1024
+# Give up on header sniffing after this many bytes (very large EXIF/ICC blocks)
+MAX_HEADER_BYTES = 2 * 1024 * 1024
+
+
+class _IngestSink:
+    """Per-upload state: temp file in the blob store, running hash and header sniffing buffer."""
+
+    def __init__(self, path: str, store: BlobStore):
+        self.path = path
+        self.store = store
+        self.tmp = store.temp_path()
+        self.fh = open(self.tmp, "wb")
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.header = None
+        self._head = bytearray()
+
+    def write(self, chunk: bytes):
+        self.hasher.update(chunk)
+        self.size += len(chunk)
+        if self.header is None and self._head is not None:
+            self._head += chunk
+            self.header = sniff_image_header(bytes(self._head))
+            if self.header is not None or len(self._head) >= MAX_HEADER_BYTES:
+                self._head = None
+        self.fh.write(chunk)
+
+    def commit(self):
+        """Store the content (once per distinct content) and link it under the upload's name."""
+        self.fh.close()
+        self.store.commit(self.tmp, self.hasher.hexdigest(), self.path)
+
+    def abort(self):
+        self.fh.close()
+        if os.path.exists(self.tmp):
+            os.unlink(self.tmp)
+
+
+def sniff_image_header(data: bytes) -> dict | None:
+    """Parse width/height/mode/format from the leading bytes of an image, or None if not enough data."""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return {"width": img.width, "height": img.height, "mode": img.mode, "format": img.format or "unknown"}
+    except Exception:
+        return None
+
+
+async def ingest_upload(upload_file: UploadFile, dest_dir: str, prefix: str = "", store: BlobStore | None = None) -> dict:
+    """Stream `upload_file` into `dest_dir` and describe it.
+
+    The bytes are kept once in the blob store; the file in `dest_dir` is a
+    link to that blob, so re-uploading the same image costs no extra disk.
+
+    Returns a dict with `filename`, `path`, `sha256`, `size` and `info`
+    (the image header fields, or None when the header could not be parsed).
+    """
+    filename = f"{prefix}{uuid.uuid4().hex}_{os.path.basename(upload_file.filename or 'upload')}"
+    path = os.path.join(dest_dir, filename)
+    sink = await run_in_threadpool(_IngestSink, path, store or get_store(path))
+    try:
+        while True:
+            chunk = await upload_file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            # hashing, header parsing and the disk write happen off the event loop
+            await run_in_threadpool(sink.write, chunk)
+    except BaseException:
+        await run_in_threadpool(sink.abort)
+        raise
+    await run_in_threadpool(sink.commit)
+    return {"filename": filename, "path": path, "sha256": sink.hasher.hexdigest(), "size": sink.size, "info": sink.header}
@@ -0,0 +1,312 @@
+"""Durable background jobs for long-running endpoints (visuals, video).
+
+Jobs live in a SQLite table, so queued work survives a restart: when the
+queue starts, jobs that were running in a previous process go back to
+``queued``. A pool of asyncio worker tasks claims jobs in submission order
+and runs the handler registered for the job's ``kind``.
+
+A failed attempt is retried after an exponential backoff
+(``JOB_RETRY_BASE`` * 2^(attempt-1) seconds, at most ``JOB_RETRY_MAX``) until
+``JOB_MAX_ATTEMPTS`` is reached. An ``HTTPException`` with a 4xx status is a
+problem with the request itself and fails the job immediately; its status
+and detail are kept for the result endpoint.
+
+One application process owns the queue (the Docker image runs a single
+uvicorn worker).
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB = os.getenv("JOBS_DB", "/data/jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE = float(os.getenv("JOB_RETRY_BASE", "5"))
+JOB_RETRY_MAX = float(os.getenv("JOB_RETRY_MAX", "300"))
+# Finished jobs are deleted this long after they complete
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", str(7 * 24 * 3600)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after, created);
+"""
+
+FINISHED = ("succeeded", "failed")
+
+
+def backoff(attempt: int, base: float = JOB_RETRY_BASE, cap: float = JOB_RETRY_MAX) -> float:
+    """Delay before retrying after failed attempt number `attempt` (1-based)."""
+    return min(cap, base * 2 ** (attempt - 1))
+
+
+class JobQueue:
+    def __init__(self, path: str = JOBS_DB, max_attempts: int = JOB_MAX_ATTEMPTS, retry_base: float = JOB_RETRY_BASE, retry_max: float = JOB_RETRY_MAX):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.handlers = {}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._wakeup: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._workers: list = []
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def register(self, kind: str, handler):
+        """`handler(payload, progress)` is an async function; `progress(fraction, message)` records progress."""
+        self.handlers[kind] = handler
+
+    # --- storage -----------------------------------------------------------
+
+    def submit(self, kind: str, payload: dict) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"no handler for job kind {kind!r}")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, payload, status, max_attempts, run_after, created, updated) VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), self.max_attempts, now, now, now),
+            )
+        self._wake()
+        return job_id
+
+    def _wake(self):
+        # safe from any thread: the event belongs to the workers' loop
+        if self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        for field in ("result", "error"):
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+
+    def claim(self) -> dict | None:
+        """Mark the oldest ready job as running (counting an attempt) and return it."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' AND run_after <= ? ORDER BY created LIMIT 1", (now,)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated = ? WHERE id = ?", (now, row["id"])
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row is not None else None
+
+    def next_ready_in(self) -> float | None:
+        """Seconds until the next queued job may run (None when nothing is queued)."""
+        with self._lock:
+            row = self._db.execute("SELECT MIN(run_after) AS t FROM jobs WHERE status = 'queued'").fetchone()
+        return None if row["t"] is None else max(0.0, row["t"] - time.time())
+
+    def set_progress(self, job_id: str, progress: float, message: str | None = None):
+        with self._lock:
+            # only while running: a late write must not undo the final state
+            self._db.execute(
+                "UPDATE jobs SET progress = ?, message = COALESCE(?, message), updated = ? WHERE id = ? AND status = 'running'",
+                (max(0.0, min(1.0, progress)), message, time.time(), job_id),
+            )
+
+    def complete(self, job_id: str, result):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'succeeded', progress = 1, result = ?, error = NULL, updated = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id),
+            )
+        self.completed += 1
+
+    def fail(self, job_id: str, error: dict, retry: bool = True) -> str:
+        """Record a failed attempt; requeue with backoff while attempts remain. Returns the new status."""
+        job = self.get(job_id)
+        now = time.time()
+        if retry and job["attempts"] < job["max_attempts"]:
+            status, run_after = "queued", now + backoff(job["attempts"], self.retry_base, self.retry_max)
+            self.retried += 1
+        else:
+            status, run_after = "failed", job["run_after"]
+            self.failed += 1
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, run_after = ?, error = ?, updated = ? WHERE id = ?",
+                (status, run_after, json.dumps(error), now, job_id),
+            )
+        return status
+
+    def requeue_running(self, count_attempt: bool = True) -> int:
+        """Put jobs left `running` (by a previous process, or cancelled on shutdown) back in the queue.
+
+        With `count_attempt` the interrupted run counts as an attempt, so a job
+        that keeps taking the process down ends up `failed`.
+        """
+        now = time.time()
+        with self._lock:
+            if not count_attempt:
+                return self._db.execute(
+                    "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), updated = ? WHERE status = 'running'", (now,)
+                ).rowcount
+            return self._db.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,"
+                " error = CASE WHEN attempts >= max_attempts THEN ? ELSE error END, updated = ? WHERE status = 'running'",
+                (json.dumps({"status_code": 500, "detail": "interrupted by a restart"}), now),
+            ).rowcount
+
+    def purge(self, older_than: float = JOB_RETENTION) -> int:
+        with self._lock:
+            return self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated < ?", (time.time() - older_than,)
+            ).rowcount
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    @property
+    def running(self) -> bool:
+        """Whether workers are running, i.e. submitted jobs will be picked up."""
+        return bool(self._workers)
+
+    def stats(self) -> dict:
+        return {"jobs": self.counts(), "workers": len(self._workers), "completed": self.completed, "retried": self.retried, "failed": self.failed}
+
+    # --- execution ---------------------------------------------------------
+
+    async def run_job(self, job: dict):
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            await run_in_threadpool(self.fail, job["id"], {"status_code": 500, "detail": f"no handler for {job['kind']}"}, False)
+            return
+
+        # progress() is called on the loop; the latest value is written from a worker thread,
+        # one write at a time, so the handler never waits on SQLite
+        latest = {}
+        flushing = []
+
+        async def flush():
+            try:
+                while latest:
+                    fraction, message = latest.pop("value")
+                    await run_in_threadpool(self.set_progress, job["id"], fraction, message)
+            finally:
+                flushing.clear()
+
+        def progress(fraction: float, message: str | None = None):
+            latest["value"] = (fraction, message)
+            if not flushing:
+                flushing.append(asyncio.ensure_future(flush()))
+
+        try:
+            try:
+                result = await handler(job["payload"], progress)
+            finally:
+                if flushing:
+                    await asyncio.gather(*flushing, return_exceptions=True)
+        except asyncio.CancelledError:
+            raise
+        except HTTPException as e:
+            # 4xx: the request itself is bad, retrying cannot help
+            retry = e.status_code >= 500
+            status = await run_in_threadpool(self.fail, job["id"], {"status_code": e.status_code, "detail": e.detail}, retry)
+            logger.warning("Job %s (%s) attempt %d failed with %d: %s -> %s", job["id"], job["kind"], job["attempts"], e.status_code, e.detail, status)
+            return
+        except Exception as e:
+            status = await run_in_threadpool(self.fail, job["id"], {"status_code": 500, "detail": str(e)}, True)
+            logger.exception("Job %s (%s) attempt %d failed -> %s", job["id"], job["kind"], job["attempts"], status)
+            return
+        await run_in_threadpool(self.complete, job["id"], result)
+
+    async def _worker(self):
+        while True:
+            self._wakeup.clear()
+            job = None
+            try:
+                job = await run_in_threadpool(self.claim)
+                if job is not None:
+                    await self.run_job(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # e.g. a SQLite error or a result that is not JSON: keep the worker alive, fail the job
+                logger.exception("Job worker error%s", f" on job {job['id']}" if job else "")
+                if job is not None:
+                    try:
+                        await run_in_threadpool(self.fail, job["id"], {"status_code": 500, "detail": str(e)}, True)
+                    except Exception:
+                        logger.exception("Could not record the failure of job %s", job["id"])
+                await asyncio.sleep(1)
+                continue
+            # sleep until a submit, the next retry becomes due, or a periodic re-check
+            wait = await run_in_threadpool(self.next_ready_in)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(wait if wait is not None else 5.0, 5.0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self, workers: int = JOB_WORKERS):
+        """Recover interrupted jobs and start `workers` worker tasks on the running loop."""
+        recovered = await run_in_threadpool(self.requeue_running)
+        if recovered:
+            logger.info("Requeued %d job(s) interrupted by a restart", recovered)
+        await run_in_threadpool(self.purge)
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._worker(), name=f"job-worker-{i}") for i in range(workers)]
+
+    async def stop(self):
+        """Cancel the workers; jobs they were running go back to the queue without using up an attempt."""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._wakeup = None
+        await run_in_threadpool(self.requeue_running, False)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,197 @@
+"""Deterministic, local repair of near-miss JSON returned by the model.
+
+Handles the common failure modes without another OpenAI round trip:
+
+- markdown code fences and leading/trailing prose around the object
+- trailing commas, single-quoted strings and Python literals (True/None)
+- output truncated mid-object (unterminated strings, unclosed brackets)
+- string-vs-list and list-vs-string mismatches against the schema
+  (e.g. ``"bullets": "a\\nb"`` or ``"tags": "mug, ceramic"``)
+"""
+import json
+import re
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.S)
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_BULLET_PREFIX_RE = re.compile(r"^\s*(?:[-*•·]|\d+[.)])\s*")
+
+
+def strip_wrapping(text: str) -> str:
+    """Remove code fences and any prose before the first `{` / after the last `}`."""
+    fenced = _FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start = text.find("{")
+    if start == -1:
+        return text.strip()
+    end = text.rfind("}")
+    # keep everything after the start when the object looks truncated
+    return text[start:end + 1] if end > start else text[start:]
+
+
+def normalize_json(text: str) -> str:
+    """Rewrite JSON-ish text into strict JSON syntax where that is unambiguous.
+
+    Converts single-quoted strings to double-quoted ones, maps Python literals
+    and drops trailing commas. Content inside strings is left untouched.
+    """
+    out = []
+    i, n = 0, len(text)
+    quote = None
+    while i < n:
+        ch = text[i]
+        if quote:
+            if ch == "\\" and i + 1 < n:
+                nxt = text[i + 1]
+                # \' is only meaningful inside single-quoted strings
+                out.append(nxt if nxt == "'" else ch + nxt)
+                i += 2
+                continue
+            if ch == quote:
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+        if ch in "\"'":
+            quote = ch
+            out.append('"')
+            i += 1
+            continue
+        if ch == ",":
+            j = i + 1
+            while j < n and text[j].isspace():
+                j += 1
+            if j < n and text[j] in "}]":
+                i += 1
+                continue
+        if ch.isalpha():
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            out.append(_LITERALS.get(word, word))
+            i = j
+            continue
+        out.append(ch)
+        i += 1
+    if quote:
+        # unterminated string at the end of truncated output
+        out.append('"')
+    return "".join(out)
+
+
+def _close_brackets(text: str) -> str:
+    stack = []
+    in_string = False
+    escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(",")
+    return text + "".join(reversed(stack))
+
+
+def _comma_positions(text: str) -> list:
+    positions = []
+    in_string = False
+    escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == ",":
+            positions.append(i)
+    return positions
+
+
+def parse_lenient(text: str, max_backtrack: int = 20):
+    """Parse model output into a Python object, repairing it if needed. Returns None on failure."""
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        pass
+    candidate = normalize_json(strip_wrapping(text))
+    try:
+        return json.loads(candidate)
+    except ValueError:
+        pass
+    # Truncated output: close what is open, backing off to earlier element boundaries if needed
+    cuts = [len(candidate)] + list(reversed(_comma_positions(candidate)))[:max_backtrack]
+    for cut in cuts:
+        try:
+            return json.loads(_close_brackets(candidate[:cut]))
+        except ValueError:
+            continue
+    return None
+
+
+def _split_list(value: str) -> list:
+    if "\n" in value or "•" in value:
+        parts = re.split(r"[\n•]", value)
+    elif ";" in value:
+        parts = value.split(";")
+    elif "," in value and all(len(p.split()) <= 3 for p in value.split(",")):
+        parts = value.split(",")
+    else:
+        parts = [value]
+    parts = [_BULLET_PREFIX_RE.sub("", p).strip() for p in parts]
+    return [p for p in parts if p]
+
+
+def coerce_to_schema(obj, schema: dict):
+    """Coerce top-level property types to what `schema` expects, where the intent is clear."""
+    if not isinstance(obj, dict):
+        return obj
+    props = schema.get("properties", {})
+    for key, spec in props.items():
+        if key not in obj:
+            continue
+        value = obj[key]
+        expected = spec.get("type")
+        if expected == "array":
+            if isinstance(value, str):
+                value = _split_list(value)
+            if isinstance(value, list) and spec.get("items", {}).get("type") == "string":
+                value = [v if isinstance(v, str) else json.dumps(v) if isinstance(v, (dict, list)) else str(v) for v in value if v is not None]
+        elif expected == "string":
+            if isinstance(value, list):
+                value = " ".join(str(v) for v in value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = str(value)
+        elif expected == "object" and value is None:
+            value = {}
+        obj[key] = value
+    return obj
+
+
+def local_repair(text: str, schema: dict):
+    """Best-effort local repair: lenient parse followed by schema-guided coercion."""
+    parsed = parse_lenient(text)
+    if parsed is None:
+        return None
+    return coerce_to_schema(parsed, schema)
@@ -0,0 +1,272 @@
+"""Non-blocking OpenAI chat client shared by metadata generation and repair.
+
+Uses the async API of the ``openai`` package (``ChatCompletion.acreate``) on
+top of one long-lived aiohttp session, so connections are kept alive and
+reused instead of being re-established per request. A semaphore bounds the
+number of completions in flight per worker.
+
+Tunables (environment):
+
+- ``OPENAI_MODEL``: chat model (default ``gpt-4o-mini``)
+- ``OPENAI_TIMEOUT``: default per-call timeout in seconds (default 30)
+- ``OPENAI_MAX_CONCURRENCY``: max concurrent completions (default 8)
+- ``OPENAI_POOL_SIZE``: max pooled connections (default 16)
+- ``OPENAI_JSON_MODE``: set to ``0`` to stop requesting JSON output mode
+- ``OPENAI_MAX_TOKENS``: fixed completion budget; when unset it is derived
+  from the observed completion sizes (see ``TokenAccounting``)
+- ``OPENAI_DEADLINE``: overall deadline for one generation, hedges included
+  (default 20s)
+- ``OPENAI_HEDGE_DELAY``: send a duplicate request if the first is still
+  pending after this many seconds, or ``p95`` to use the observed p95
+  latency; unset/``0`` disables hedging
+- ``OPENAI_BREAKER_ERROR_RATE`` / ``OPENAI_BREAKER_SLOW_SECONDS`` /
+  ``OPENAI_BREAKER_COOLDOWN``: circuit breaker thresholds (0.5 / 10s / 30s)
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+
+from .resilience import CircuitBreaker, CircuitOpenError, HedgeStats, LatencyTracker, hedged_call
+
+try:
+    import openai
+except Exception:
+    openai = None
+
+try:
+    import aiohttp
+except Exception:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+
+class TokenAccounting:
+    """Per-purpose token usage from chat responses, used to right-size `max_tokens`."""
+
+    def __init__(self, window: int = 500, default_max_tokens: int = 400, min_samples: int = 20, headroom: float = 1.25, floor: int = 128, ceiling: int = 2048):
+        self.window = window
+        self.default_max_tokens = default_max_tokens
+        self.min_samples = min_samples
+        self.headroom = headroom
+        self.floor = floor
+        self.ceiling = ceiling
+        self._samples: dict[str, deque] = {}
+        self._totals: dict[str, dict] = {}
+
+    def record(self, purpose: str, usage, truncated: bool = False, limit: int | None = None) -> dict | None:
+        """Record one response's usage; `truncated` when it stopped at the `limit` it was sent with."""
+        if not usage:
+            return None
+        details = usage.get("prompt_tokens_details") or {}
+        sample = {
+            "prompt_tokens": int(usage.get("prompt_tokens") or 0),
+            "completion_tokens": int(usage.get("completion_tokens") or 0),
+            "cached_tokens": int(details.get("cached_tokens") or 0),
+        }
+        self._samples.setdefault(purpose, deque(maxlen=self.window)).append(
+            {**sample, "truncated": truncated, "limit": limit or sample["completion_tokens"]}
+        )
+        totals = self._totals.setdefault(purpose, {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "truncated": 0})
+        totals["requests"] += 1
+        totals["truncated"] += int(truncated)
+        for k, v in sample.items():
+            totals[k] += v
+        return sample
+
+    def _percentile(self, purpose: str, q: float) -> int | None:
+        # truncated completions only say "at least the limit", so they are left out
+        values = sorted(s["completion_tokens"] for s in self._samples.get(purpose, ()) if not s["truncated"])
+        if not values:
+            return None
+        return values[min(len(values) - 1, math.ceil(q * len(values)) - 1)]
+
+    def max_tokens(self, purpose: str) -> int:
+        """Completion budget: OPENAI_MAX_TOKENS if set, else p99 of recent completions plus headroom.
+
+        A completion cut off at its limit within the window raises the budget
+        to twice that limit, so the budget cannot ratchet down below what the
+        answers need.
+        """
+        fixed = os.getenv("OPENAI_MAX_TOKENS")
+        if fixed:
+            return int(fixed)
+        samples = self._samples.get(purpose, ())
+        truncated_at = max((s["limit"] for s in samples if s["truncated"]), default=0)
+        p99 = self._percentile(purpose, 0.99) if len(samples) >= self.min_samples else None
+        budget = self.default_max_tokens if p99 is None else math.ceil(p99 * self.headroom)
+        return max(self.floor, min(self.ceiling, max(budget, 2 * truncated_at)))
+
+    def stats(self) -> dict:
+        out = {}
+        for purpose, totals in self._totals.items():
+            n = totals["requests"]
+            out[purpose] = {
+                **totals,
+                "avg_prompt_tokens": round(totals["prompt_tokens"] / n, 1),
+                "avg_completion_tokens": round(totals["completion_tokens"] / n, 1),
+                "cached_prompt_ratio": round(totals["cached_tokens"] / totals["prompt_tokens"], 4) if totals["prompt_tokens"] else 0.0,
+                "p50_completion_tokens": self._percentile(purpose, 0.5),
+                "p95_completion_tokens": self._percentile(purpose, 0.95),
+                "max_tokens": self.max_tokens(purpose),
+            }
+        return out
+
+
+def _finish_reason(res) -> str | None:
+    try:
+        choice = res["choices"][0] if hasattr(res, "get") else res.choices[0]
+    except (AttributeError, IndexError, KeyError, TypeError):
+        return None
+    return choice.get("finish_reason") if hasattr(choice, "get") else getattr(choice, "finish_reason", None)
+
+
+class LLMClient:
+    def __init__(self, max_concurrency: int | None = None, timeout: float | None = None, pool_size: int | None = None, keepalive_timeout: float = 60.0):
+        self.max_concurrency = max_concurrency or int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+        self.timeout = timeout or float(os.getenv("OPENAI_TIMEOUT", "30"))
+        self.pool_size = pool_size or int(os.getenv("OPENAI_POOL_SIZE", "16"))
+        self.keepalive_timeout = keepalive_timeout
+        self.json_mode = os.getenv("OPENAI_JSON_MODE", "1").lower() not in ("0", "false", "no")
+        self.in_flight = 0
+        self.tokens = TokenAccounting()
+        self.deadline = float(os.getenv("OPENAI_DEADLINE", "20"))
+        self.hedge_delay = os.getenv("OPENAI_HEDGE_DELAY", "0").strip().lower()
+        self.breaker = CircuitBreaker(
+            error_rate=float(os.getenv("OPENAI_BREAKER_ERROR_RATE", "0.5")),
+            slow_call_seconds=float(os.getenv("OPENAI_BREAKER_SLOW_SECONDS", "10")),
+            cooldown=float(os.getenv("OPENAI_BREAKER_COOLDOWN", "30")),
+        )
+        self.latency = LatencyTracker()
+        self.hedges = HedgeStats()
+        self._loop = None
+        self._session = None
+        self._semaphore = None
+
+    @property
+    def available(self) -> bool:
+        return openai is not None and bool(os.getenv("OPENAI_API_KEY"))
+
+    def _bind_loop(self):
+        """Create the session/semaphore for the running loop (recreated if the loop changes)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._session = None
+        if aiohttp is not None and (self._session is None or self._session.closed):
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._semaphore
+
+    async def chat(self, messages: list, model: str | None = None, temperature: float = 0.6, max_tokens: int | None = None, timeout: float | None = None, json_mode: bool = False, purpose: str = "chat", **kwargs):
+        """Run one chat completion and return the raw response object.
+
+        `json_mode` asks the provider to emit a single JSON object (unless
+        disabled via OPENAI_JSON_MODE). Token usage is recorded under `purpose`,
+        which also sizes `max_tokens` when it is not given. Raises on
+        transport/API errors or when the timeout elapses.
+        """
+        if openai is None:
+            raise RuntimeError("openai package is not installed")
+        if json_mode and self.json_mode:
+            kwargs.setdefault("response_format", {"type": "json_object"})
+        semaphore = self._bind_loop()
+        async with semaphore:
+            # openai reads the shared session from a context variable; set it for this task only
+            token = openai.aiosession.set(self._session)
+            self.in_flight += 1
+            try:
+                limit = max_tokens or self.tokens.max_tokens(purpose)
+                res = await openai.ChatCompletion.acreate(
+                    model=model or DEFAULT_MODEL,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=limit,
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    request_timeout=timeout or self.timeout,
+                    **kwargs,
+                )
+            finally:
+                self.in_flight -= 1
+                openai.aiosession.reset(token)
+        truncated = _finish_reason(res) == "length"
+        if truncated:
+            logger.warning("OpenAI %s completion was cut off at max_tokens=%s", purpose, limit)
+        usage = self.tokens.record(purpose, res.get("usage") if hasattr(res, "get") else None, truncated, limit)
+        if usage:
+            logger.info("OpenAI %s usage: prompt=%s (cached=%s) completion=%s", purpose, usage["prompt_tokens"], usage["cached_tokens"], usage["completion_tokens"])
+        return res
+
+    def _hedge_after(self) -> float | None:
+        if self.hedge_delay in ("", "0", "off", "none"):
+            return None
+        if self.hedge_delay == "p95":
+            # need a few samples before the percentile means anything
+            return self.latency.percentile(0.95) if len(self.latency) >= 20 else None
+        return float(self.hedge_delay)
+
+    async def complete(self, messages: list, deadline: float | None = None, hedge: bool = True, **kwargs):
+        """`chat()` guarded by the circuit breaker, with an overall deadline and optional hedging.
+
+        Raises `CircuitOpenError` without touching the network while the
+        breaker is open, so callers can fall back immediately.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("OpenAI circuit breaker is open")
+        # while half-open, allow() only lets the single probe through
+        probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+        start = time.monotonic()
+        try:
+            res = await hedged_call(
+                lambda: self.chat(messages, **kwargs),
+                deadline=deadline or self.deadline,
+                hedge_delay=self._hedge_after() if hedge else None,
+                stats=self.hedges,
+            )
+        except asyncio.CancelledError:
+            # cancellation by the caller is not the provider's fault, but the probe slot must be freed
+            if probe:
+                self.breaker.release_probe()
+            raise
+        except BaseException:
+            self.breaker.record(False, time.monotonic() - start, probe)
+            raise
+        elapsed = time.monotonic() - start
+        self.breaker.record(True, elapsed, probe)
+        self.latency.record(elapsed)
+        return res
+
+    async def aclose(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "pool_size": self.pool_size,
+            "timeout": self.timeout,
+            "tokens": self.tokens.stats(),
+            "latency_p50": self.latency.percentile(0.5),
+            "latency_p95": self.latency.percentile(0.95),
+            "breaker": self.breaker.stats(),
+            "hedging": {**self.hedges.stats(), "delay": self._hedge_after()},
+        }
+
+
+_client: LLMClient | None = None
+
+
+def get_client() -> LLMClient:
+    """Process-wide shared client."""
+    global _client
+    if _client is None:
+        _client = LLMClient()
+    return _client
@@ -1,24 +1,53 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, BackgroundTasks, Response
+from fastapi.concurrency import run_in_threadpool
+import asyncio
+import io
 import os
+import re
 import uuid
-import shutil
 from PIL import Image
 import json
 import logging
+from collections import Counter
 from .prompting import generate_structured_metadata
+from .cache import TieredCache, make_key, sha256_file
+from .image_analysis import analyze_image_file
+from .llm_client import get_client
+from .resilience import CircuitOpenError
+from .dedupe import IdempotencyConflict, IdempotencyStore, SingleFlight
 from pathlib import Path
+from contextlib import asynccontextmanager
 
-try:
-    import openai
-except Exception:
-    openai = None
 
-app = FastAPI(title="AI Product Listing Generator - Microservice")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the background-removal model before serving (REMBG_PRELOAD=0 defers it to first use)
+    if os.getenv("REMBG_PRELOAD", "1") != "0":
+        from .image_utils import warmup_background_removal
+
+        try:
+            if await run_in_threadpool(warmup_background_removal, os.getenv("REMBG_WARMUP", "1") != "0"):
+                logger.info("rembg session pool ready")
+        except Exception:
+            logger.exception("rembg warmup failed; sessions will load on first use")
+    # Background job workers; queued jobs from before a restart are picked up again
+    if JOB_WORKERS > 0:
+        await job_queue.start(JOB_WORKERS)
+    yield
+    await job_queue.stop()
+    # Release pooled keep-alive connections and worker processes on shutdown
+    await get_client().aclose()
+    await get_fetcher().aclose()
+    shutdown_pool()
+
+
+app = FastAPI(title="AI Product Listing Generator - Microservice", lifespan=lifespan)
 
 # Use /data directory for persistent storage in Docker
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 UPLOAD_DIR = "/data/uploads"
 OUTPUTS_DIR = "/data/outputs"
+CACHE_DIR = "/data/cache"
 
 # Create directories if they don't exist
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -26,6 +55,7 @@ os.makedirs(os.path.join(OUTPUTS_DIR, "videos"), exist_ok=True)
 os.makedirs(os.path.join(OUTPUTS_DIR, "images"), exist_ok=True)
 os.makedirs(os.path.join(OUTPUTS_DIR, "supplementary"), exist_ok=True)
 os.makedirs(os.path.join(OUTPUTS_DIR, "audio"), exist_ok=True)
+os.makedirs(CACHE_DIR, exist_ok=True)
 
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
@@ -46,21 +76,37 @@ app.mount("/outputs", StaticFiles(directory=OUTPUTS_DIR), name="outputs")
 logger = logging.getLogger("uvicorn")
 
 
-def save_upload_file(upload_file: UploadFile) -> str:
-    filename = f"{uuid.uuid4().hex}_{upload_file.filename}"
-    path = os.path.join(UPLOAD_DIR, filename)
-    with open(path, "wb") as buffer:
-        shutil.copyfileobj(upload_file.file, buffer)
-    return filename  # Return just the filename, not full path
-
-
 def analyze_image(filename: str) -> dict:
-    full_path = os.path.join(UPLOAD_DIR, filename)
-    with Image.open(full_path) as img:
-        return {"width": img.width, "height": img.height, "mode": img.mode, "format": getattr(img, "format", "unknown")}
+    """Header fields plus colors/brightness/background stats from a reduced-resolution decode."""
+    return analyze_image_file(os.path.join(UPLOAD_DIR, filename))
+
+
+from .validation import is_valid_metadata, repair_with_openai, schema_for, schema_fingerprint
+from .json_repair import local_repair
+from .prompt_builder import build_metadata_messages
+from .ingest import ingest_upload
+from .visuals import VISUALS_CUTOUT_PRESET, VISUALS_PRESET, generate_variants, shutdown_pool, stats as visuals_stats
+from .encoding import encode as encode_image, get_preset
+from .graph_executor import GraphError, GraphExecutor, RunContext, load_graph
+from .storage import get_store, stats as storage_stats
+from .derivatives import FORMATS, DerivativeCache, derivative_key, parse_spec
+from .jobs import JOB_WORKERS, JOBS_DB, JobQueue
+from .frame_fetch import get_fetcher
+
+# Bump when the prompt or post-processing changes so stale cached results are ignored
+METADATA_CACHE_VERSION = "3"
+
+metadata_cache = TieredCache(
+    os.path.join(CACHE_DIR, "metadata"),
+    max_entries=int(os.getenv("METADATA_CACHE_SIZE", "512")),
+    ttl_seconds=float(os.getenv("METADATA_CACHE_TTL", str(7 * 24 * 3600))),
+    max_bytes=int(os.getenv("METADATA_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+)
 
 
-from .validation import is_valid_metadata, repair_with_openai, METADATA_SCHEMA
+def metadata_cache_key(image_hash: str, category: str | None, platform: str, tone: str) -> str:
+    """Cache key for generated metadata: image content + request options + prompt/schema version."""
+    return make_key("metadata", METADATA_CACHE_VERSION, schema_fingerprint(platform), image_hash, category, platform, tone)
 
 
 def fallback_generate_metadata(info: dict, category: str | None = None, platform: str = "generic") -> dict:
@@ -70,56 +116,101 @@ def fallback_generate_metadata(info: dict, category: str | None = None, platform
     return meta
 
 
-async def try_ai_generate(prompt: str) -> dict | None:
-    """Attempt to generate JSON via OpenAI and validate/repair it to match METADATA_SCHEMA."""
-    ai_text = await openai_generate(prompt)
+# Concurrent identical requests share one computation; finished responses are kept per Idempotency-Key
+inflight = SingleFlight()
+idempotency_store = IdempotencyStore(
+    ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600))),
+    max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "1024")),
+)
+
+
+def payload_key(payload: dict) -> str:
+    """Stable key for a JSON request body (key order does not matter)."""
+    return make_key(json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str))
+
+
+async def deduplicated(scope: str, idempotency_key: str | None, compute, request_key: str | None = None, response: Response | None = None):
+    """Run `compute()` for an endpoint, coalescing duplicates and honouring `Idempotency-Key`.
+
+    Requests with the same `request_key` that arrive while one is running await
+    that computation instead of starting their own. With an idempotency key the
+    completed result is stored and replayed for retries; reusing the key for a
+    different request (another `request_key`) is rejected with 422.
+    """
+    store_key = f"{scope}:{idempotency_key}" if idempotency_key else None
+    if store_key:
+        try:
+            stored = idempotency_store.get(store_key, request_key)
+        except IdempotencyConflict:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        if stored is not None:
+            if response is not None:
+                response.headers["Idempotent-Replayed"] = "true"
+            return stored
+    flight_key = f"{scope}:{request_key}" if request_key else store_key
+    result = await inflight.do(flight_key, compute) if flight_key else await compute()
+    if store_key:
+        idempotency_store.put(store_key, result, request_key)
+    return result
+
+
+# How each AI result was obtained: parsed directly, fixed locally, fixed by a second OpenAI call, or failed
+metadata_path_counts = Counter({"direct": 0, "local_repair": 0, "remote_repair": 0, "failed": 0})
+
+
+def _accept(parsed, platform: str | None) -> dict | None:
+    if not isinstance(parsed, dict):
+        return None
+    valid, err = is_valid_metadata(parsed, platform)
+    if not valid:
+        return None
+    parsed["ai_used"] = True
+    return parsed
+
+
+async def try_ai_generate(messages: list, platform: str | None = None) -> dict | None:
+    """Attempt to generate JSON via OpenAI and validate/repair it to match the platform schema.
+
+    Repairs are tried locally first (see `json_repair`); a second OpenAI call is
+    only made when the local repair cannot produce valid metadata.
+    """
+    ai_text = await openai_generate(messages)
     if not ai_text:
         return None
     try:
         parsed = json.loads(ai_text)
     except Exception:
-        # try to repair using OpenAI ChatCompletion
-        repaired = await repair_with_openai(openai, ai_text)
-        if not repaired:
-            return None
-        try:
-            parsed = json.loads(repaired)
-        except Exception:
-            return None
-    valid, err = is_valid_metadata(parsed)
-    if valid:
-        parsed["ai_used"] = True
-        return parsed
+        parsed = None
+    result = _accept(parsed, platform)
+    if result:
+        metadata_path_counts["direct"] += 1
+        return result
+
+    schema = schema_for(platform)
+    result = _accept(local_repair(ai_text, schema), platform)
+    if result:
+        metadata_path_counts["local_repair"] += 1
+        return result
+
     # attempt to repair using openai
-    repaired = await repair_with_openai(openai, ai_text)
-    if not repaired:
-        return None
-    try:
-        parsed = json.loads(repaired)
-        valid, err = is_valid_metadata(parsed)
-        if valid:
-            parsed["ai_used"] = True
-            return parsed
-    except Exception:
-        return None
-    return None
+    repaired = await repair_with_openai(ai_text, platform=platform)
+    result = _accept(local_repair(repaired, schema), platform) if repaired else None
+    metadata_path_counts["remote_repair" if result else "failed"] += 1
+    return result
 
 
-async def openai_generate(prompt: str) -> str | None:
-    key = os.getenv("OPENAI_API_KEY")
-    if not key or openai is None:
+async def openai_generate(messages: list) -> str | None:
+    client = get_client()
+    if not client.available:
         return None
-    openai.api_key = key
     try:
-        res = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "system", "content": "You are an assistant that returns a single valid JSON object given the user's request."}, {"role": "user", "content": prompt}],
-            temperature=0.6,
-            max_tokens=400,
-        )
+        res = await client.complete(messages=messages, temperature=0.6, json_mode=True, purpose="metadata")
         return res.choices[0].message.content
+    except CircuitOpenError:
+        # provider degraded: go straight to the local fallback
+        return None
     except Exception as e:
-        logger.error("OpenAI call failed: %s", e)
+        logger.error("OpenAI call failed: %r", e)
         return None
 
 
@@ -129,7 +220,24 @@ def health():
     return {"status": "ok"}
 
 
-from fastapi.responses import HTMLResponse
+@app.get("/api/stats")
+def api_stats():
+    """Runtime counters (cache effectiveness etc.) for sizing and monitoring."""
+    return {
+        "metadata_cache": metadata_cache.stats(),
+        "metadata_paths": dict(metadata_path_counts),
+        "llm_client": get_client().stats(),
+        "dedupe": {"single_flight": inflight.stats(), "idempotency": idempotency_store.stats()},
+        "graph_cache": graph_executor.stats(),
+        "visual_variants": visuals_stats(),
+        "storage": storage_stats(),
+        "derivatives": derivative_cache.stats(),
+        "jobs": job_queue.stats(),
+        "frame_fetch": get_fetcher().stats(),
+    }
+
+
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi import Request
 from jinja2 import Environment, FileSystemLoader
 
@@ -149,9 +257,46 @@ def index(request: Request):
     return HTMLResponse(content=template.render())
 
 
+# Long-running endpoints can run as durable background jobs (see app/jobs.py)
+job_queue = JobQueue(JOBS_DB)
+
+
+def wants_async(payload: dict, prefer: str | None) -> bool:
+    """Clients opt into a background job with `Prefer: respond-async` or `"async": true`."""
+    return payload.get("async") is True or "respond-async" in (prefer or "").lower()
+
+
+async def enqueue(kind: str, payload: dict, idempotency_key: str | None, response: Response) -> dict:
+    """Queue `payload` as a `kind` job and answer 202 with where to poll it."""
+    if not job_queue.running:
+        # JOB_WORKERS=0 (or not started): a queued job would never run
+        raise HTTPException(status_code=503, detail="Background jobs are disabled; send the request without respond-async")
+    job_payload = {k: v for k, v in payload.items() if k != "async"}
+
+    async def submit():
+        job_id = await run_in_threadpool(job_queue.submit, kind, job_payload)
+        return {"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}", "result_url": f"/api/jobs/{job_id}/result"}
+
+    accepted = await deduplicated(f"{kind}:job", idempotency_key, submit, payload_key(job_payload), response)
+    response.status_code = 202
+    response.headers["Location"] = accepted["status_url"]
+    response.headers["Preference-Applied"] = "respond-async"
+    return accepted
+
+
+def _no_progress(fraction: float, message: str | None = None):
+    pass
+
+
 @app.post("/api/generate-visuals")
-async def api_generate_visuals(payload: dict):
+async def api_generate_visuals(payload: dict, response: Response, idempotency_key: str | None = Header(None), prefer: str | None = Header(None)):
     """Generate supplementary visuals for a product image."""
+    if wants_async(payload, prefer):
+        return await enqueue("generate-visuals", payload, idempotency_key, response)
+    return await deduplicated("generate-visuals", idempotency_key, lambda: _generate_visuals(payload), payload_key(payload), response)
+
+
+async def _generate_visuals(payload: dict, progress=_no_progress) -> dict:
     # Accept multiple input shapes for backwards/forwards compatibility
     image_filename = payload.get("image_filename")
     image_path = payload.get("image_path") or payload.get("image_url")
@@ -168,6 +313,21 @@ async def api_generate_visuals(payload: dict):
     if not os.path.exists(image_path):
         raise HTTPException(status_code=404, detail=f"Image not found: {image_filename}")
     
+    # Long edge of the local variants in px (defaults to VISUALS_OUTPUT_SIZE)
+    output_size = payload.get("output_size")
+    # bool is an int subclass: `true` must not become a 1px variant
+    if output_size is not None and (type(output_size) is not int or output_size <= 0):
+        raise HTTPException(status_code=400, detail="output_size must be a positive integer")
+    # Encoding presets (see app/encoding.py) for plain variants and background-removed cutouts
+    preset = payload.get("preset") or VISUALS_PRESET
+    cutout_preset = payload.get("cutout_preset") or VISUALS_CUTOUT_PRESET
+    if not isinstance(preset, str) or not isinstance(cutout_preset, str):
+        raise HTTPException(status_code=400, detail="preset and cutout_preset must be preset names")
+    try:
+        get_preset(preset), get_preset(cutout_preset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     outdir = os.path.join(OUTPUTS_DIR, "supplementary")
     os.makedirs(outdir, exist_ok=True)
     
@@ -175,96 +335,36 @@ async def api_generate_visuals(payload: dict):
     
     # Try OpenAI variations if API key is available
     if os.getenv('OPENAI_API_KEY'):
+        progress(0.1, "requesting OpenAI variations")
         try:
             from .openai_utils import generate_variations_from_image
             prompt_hint = f"Create product-focused variations of the provided image, keep the main subject consistent and present the item on a clean background. Title: {title}"
-            generated = generate_variations_from_image(image_path, prompt=prompt_hint, n=5, size="1024x1024", outdir=outdir)
+            generated = await run_in_threadpool(generate_variations_from_image, image_path, prompt=prompt_hint, n=5, size="1024x1024", outdir=outdir)
         except Exception as e:
             logger.exception("OpenAI variations failed: %s", e)
             generated = []
     
-    # Fallback to local PIL variants
+    remove_bg = payload.get("remove_background", True)
+    if remove_bg and generated:
+        progress(0.6, "removing backgrounds")
+        generated = await _remove_backgrounds_from_files(generated, outdir, cutout_preset)
+
+    # Fallback to local PIL variants, rendered in the process pool; with background
+    # removal they stay in memory until the final cutouts are written
     if not generated:
+        from .image_utils import REMBG_MODEL, remove_background_batch
+
+        progress(0.2, "rendering local variants")
         try:
-            # Simple image manipulation as fallback
-            from PIL import Image, ImageEnhance, ImageFilter
-            import random
-            
-            img = Image.open(image_path)
-            
-            # Create variations
-            for i in range(5):
-                variant = img.copy()
-                
-                # Apply random transformations
-                # Random crop
-                width, height = variant.size
-                left = random.randint(0, width // 4)
-                top = random.randint(0, height // 4)
-                right = width - random.randint(0, width // 4)
-                bottom = height - random.randint(0, height // 4)
-                variant = variant.crop((left, top, right, bottom))
-                
-                # Resize back to original
-                variant = variant.resize((width, height), Image.Resampling.LANCZOS)
-                
-                # Random color adjustments
-                if random.random() > 0.5:
-                    enhancer = ImageEnhance.Brightness(variant)
-                    variant = enhancer.enhance(random.uniform(0.8, 1.2))
-                
-                if random.random() > 0.5:
-                    enhancer = ImageEnhance.Contrast(variant)
-                    variant = enhancer.enhance(random.uniform(0.8, 1.2))
-                
-                if random.random() > 0.5:
-                    enhancer = ImageEnhance.Color(variant)
-                    variant = enhancer.enhance(random.uniform(0.8, 1.2))
-                
-                # Add background if transparent
-                if variant.mode in ('RGBA', 'LA') or (variant.mode == 'P' and 'transparency' in variant.info):
-                    background = Image.new('RGB', variant.size, (255, 255, 255))
-                    if variant.mode == 'RGBA':
-                        background.paste(variant, mask=variant.split()[3])
-                    else:
-                        background.paste(variant)
-                    variant = background
-                
-                # Save the variant
-                output_path = os.path.join(outdir, f"variant_{uuid.uuid4().hex[:8]}_{i}.jpg")
-                variant.save(output_path, "JPEG", quality=85)
-                generated.append(output_path)
-                
+            matte = remove_background_batch if remove_bg else None
+            generated = await generate_variants(
+                image_path, outdir, count=5, output_size=output_size,
+                matte=matte, matte_name=f"rembg:{REMBG_MODEL}", seed=payload.get("seed"),
+                preset=preset, cutout_preset=cutout_preset,
+            )
         except Exception as e:
             logger.exception("Local visual generation failed: %s", e)
             raise HTTPException(status_code=500, detail=f"Visual generation failed: {str(e)}")
-    
-    # Optionally remove backgrounds from generated images
-    remove_bg = payload.get("remove_background", True)
-    if remove_bg:
-        try:
-            from .image_utils import remove_background_bytes
-
-            processed = []
-            for p in generated:
-                try:
-                    with open(p, "rb") as fh:
-                        data = fh.read()
-                    out_bytes = remove_background_bytes(data)
-                    # Save as PNG to preserve alpha channel
-                    base = os.path.splitext(os.path.basename(p))[0]
-                    png_name = f"{base}.png"
-                    out_path = os.path.join(outdir, png_name)
-                    with open(out_path, "wb") as fh:
-                        fh.write(out_bytes)
-                    processed.append(out_path)
-                except Exception as e:
-                    logger.exception("Background removal failed for %s: %s", p, e)
-                    # Fall back to original
-                    processed.append(p)
-            generated = processed
-        except ImportError:
-            logger.info("rembg is not installed; skipping background removal")
 
     # Return web-accessible URLs
     web_paths = []
@@ -276,9 +376,46 @@ async def api_generate_visuals(payload: dict):
     return {"success": True, "generated": web_paths}
 
 
+async def _remove_backgrounds_from_files(paths: list, outdir: str, preset: str = VISUALS_CUTOUT_PRESET) -> list:
+    """Background-remove already-encoded images (e.g. OpenAI variations), saving the cutouts next to them."""
+    from .image_utils import remove_background_batch
+
+    try:
+        sources = [await run_in_threadpool(Path(p).read_bytes) for p in paths]
+        # all images go through the session pool together
+        results = await run_in_threadpool(remove_background_batch, sources)
+    except ImportError:
+        logger.info("rembg is not installed; skipping background removal")
+        return paths
+    processed = []
+    for p, out_bytes in zip(paths, results):
+        if isinstance(out_bytes, Exception):
+            logger.error("Background removal failed for %s: %r", p, out_bytes)
+            # Fall back to original
+            processed.append(p)
+            continue
+        # Re-encode rembg's full-size PNG with the cutout preset (keeps the alpha channel).
+        # Own name: the source may be content-named with the same extension and must not be replaced
+        out_path = os.path.join(outdir, os.path.splitext(os.path.basename(p))[0] + "_cutout" + get_preset(preset).extension)
+        await run_in_threadpool(_save_cutout, out_bytes, out_path, preset)
+        processed.append(out_path)
+    return processed
+
+
+def _save_cutout(png_bytes: bytes, path: str, preset: str):
+    with Image.open(io.BytesIO(png_bytes)) as img:
+        get_store(path).put_bytes(encode_image(img, preset).data, path)
+
+
 @app.post("/api/generate-video")
-async def api_generate_video(payload: dict):
+async def api_generate_video(payload: dict, response: Response, idempotency_key: str | None = Header(None), prefer: str | None = Header(None)):
     """Create a slideshow video from images."""
+    if wants_async(payload, prefer):
+        return await enqueue("generate-video", payload, idempotency_key, response)
+    return await deduplicated("generate-video", idempotency_key, lambda: _generate_video(payload), payload_key(payload), response)
+
+
+async def _generate_video(payload: dict, progress=_no_progress) -> dict:
     # Accept both 'frames' and 'image_urls'
     image_urls = payload.get("frames") or payload.get("image_urls") or []
     title = payload.get("title", "Product Video")
@@ -286,44 +423,11 @@ async def api_generate_video(payload: dict):
     if not image_urls:
         raise HTTPException(status_code=400, detail="image_urls is required")
     
-    # For Docker, we need to handle both local paths and URLs
-    frame_paths = []
-    
-    for i, url in enumerate(image_urls):
-        if url.startswith('/outputs/') or url.startswith('/uploads/'):
-            # Local file in Docker volume
-            local_path = f"/data{url}"  # Convert web path to Docker path
-            if os.path.exists(local_path):
-                frame_paths.append(local_path)
-            else:
-                logger.warning(f"File not found: {local_path}")
-        else:
-            # Handle data URLs or external URLs
-            try:
-                import requests
-                import tempfile
-                
-                if url.startswith('data:'):
-                    # Handle data URL
-                    import base64
-                    header, encoded = url.split(',', 1)
-                    data = base64.b64decode(encoded)
-                    
-                    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as f:
-                        f.write(data)
-                        frame_paths.append(f.name)
-                else:
-                    # Handle HTTP URL
-                    response = requests.get(url, timeout=10)
-                    response.raise_for_status()
-                    
-                    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as f:
-                        f.write(response.content)
-                        frame_paths.append(f.name)
-            except Exception as e:
-                logger.error(f"Failed to process image {url}: {e}")
-    
-    if not frame_paths:
+    # Local files stay paths; data URLs and remote images are resolved concurrently into memory
+    progress(0.05, f"resolving {len(image_urls)} frames")
+    frames = await get_fetcher().fetch_frames(image_urls, local=resolve_media_path)
+
+    if not frames:
         raise HTTPException(status_code=400, detail="No valid images to create video")
     
     # Create video
@@ -334,16 +438,9 @@ async def api_generate_video(payload: dict):
         os.makedirs(out_videos, exist_ok=True)
         out_path = os.path.join(out_videos, f"video_{uuid.uuid4().hex[:8]}.mp4")
         
-        # Create video with frames
-        final_path = make_video_from_frames(frame_paths, out_path, fps=2, audio_path=None)
-        
-        # Clean up temp files
-        for path in frame_paths:
-            if path.startswith('/tmp/'):
-                try:
-                    os.unlink(path)
-                except:
-                    pass
+        # Create video with frames (ffmpeg runs in a worker thread, not on the event loop)
+        progress(0.3, f"encoding {len(frames)} frames")
+        final_path = await run_in_threadpool(make_video_from_frames, frames, out_path, fps=2, audio_path=None)
         
         # Return web-accessible URL
         filename = os.path.basename(final_path)
@@ -353,47 +450,84 @@ async def api_generate_video(payload: dict):
         
     except Exception as e:
         logger.exception("Video generation failed: %s", e)
-        # Clean up temp files on error
-        for path in frame_paths:
-            if path.startswith('/tmp/'):
-                try:
-                    os.unlink(path)
-                except:
-                    pass
         raise HTTPException(status_code=500, detail=f"Video generation failed: {str(e)}")
 
 
+job_queue.register("generate-visuals", _generate_visuals)
+job_queue.register("generate-video", _generate_video)
+
+
+@app.get("/api/jobs/{job_id}")
+def api_job_status(job_id: str):
+    """Status and progress of a background job."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    fields = ("id", "kind", "status", "progress", "message", "attempts", "max_attempts", "created", "updated", "error")
+    return {**{k: job[k] for k in fields}, "result_url": f"/api/jobs/{job_id}/result"}
+
+
+@app.get("/api/jobs/{job_id}/result")
+def api_job_result(job_id: str):
+    """The job's response once it succeeded; 202 while it is pending, its error once it failed."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    if job["status"] == "succeeded":
+        return job["result"]
+    if job["status"] == "failed":
+        raise HTTPException(status_code=job["error"]["status_code"], detail=job["error"]["detail"])
+    return JSONResponse(
+        status_code=202,
+        content={"id": job_id, "status": job["status"], "progress": job["progress"], "message": job["message"]},
+        headers={"Retry-After": "2"},
+    )
+
+
 # Primary endpoint used by the frontend
 @app.post("/generate-metadata")
 async def api_generate_metadata(
     file: UploadFile = File(...),
     category: str = Form(None),
     platform: str = Form("generic"),
-    tone: str = Form("professional")
+    tone: str = Form("professional"),
+    response: Response = None,
+    idempotency_key: str | None = Header(None),
 ):
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
-    
-    filename = save_upload_file(file)
-    info = analyze_image(filename)
 
-    # Generate metadata using OpenAI or fallback
-    prompt = (
-        f"Produce a JSON object with keys: title (short string), bullets (array of 3 concise bullet points),"
-        f" description (short marketing paragraph), tags (array), and attributes (object), based on the following image metadata:"
-        f" width={info['width']}, height={info['height']}, format={info['format']}, mode={info['mode']}."
-        f" Category: {category or 'N/A'}. Platform: {platform}. Tone: {tone}."
-        f" The JSON must conform to this schema: {json.dumps(METADATA_SCHEMA)}. Return only a single valid JSON object."
-    )
+    async def compute():
+        stored = await ingest_upload(file, UPLOAD_DIR)
+        return await metadata_for_upload(stored["filename"], category, platform, tone, image_hash=stored["sha256"], header=stored["info"])
 
-    # Try AI-first generation + validation
-    ai_result = await try_ai_generate(prompt)
-    if ai_result:
-        result = ai_result
-    else:
-        # Fallback if AI unavailable or failed
-        result = fallback_generate_metadata(info, category, platform)
-    
+    # a replayed Idempotency-Key skips even the upload; identical images are coalesced in metadata_for_upload.
+    # The body is not read yet, so a reused key is matched on the options and the upload's name, size and type
+    # (the key is part of the fingerprint: different uploads that merely look alike are never coalesced)
+    request_key = None
+    if idempotency_key:
+        request_key = make_key(idempotency_key, category, platform, tone, file.filename, file.size, file.content_type)
+    return await deduplicated("generate-metadata", idempotency_key, compute, request_key, response)
+
+
+async def metadata_for_upload(filename: str, category: str | None, platform: str, tone: str, image_hash: str | None = None, header: dict | None = None) -> dict:
+    """Metadata for a stored upload: cached AI result, fresh AI result or local fallback.
+
+    `image_hash` and `header` come from the ingest pass when available; the
+    hash is otherwise computed here. Image analysis only runs on a cache miss.
+    """
+    # Identical image + options: reuse the previous AI result and skip OpenAI entirely
+    if image_hash is None:
+        image_hash = await run_in_threadpool(sha256_file, os.path.join(UPLOAD_DIR, filename))
+    cache_key = metadata_cache_key(image_hash, category, platform, tone)
+    result = metadata_cache.get(cache_key)
+    if result is None:
+        # concurrent requests for the same image + options wait for one generation
+        result = await inflight.do(f"metadata:{cache_key}", lambda: _generate_and_cache(cache_key, filename, category, platform, tone, header))
+    return _with_request_fields(result, filename, category, platform, tone)
+
+
+def _with_request_fields(result: dict, filename: str, category: str | None, platform: str, tone: str) -> dict:
     # Add additional information
     result["image_filename"] = filename
     # Include fields used by both UI and tests
@@ -402,10 +536,241 @@ async def api_generate_metadata(
     result["category"] = category or "Generic Product"
     result["platform"] = platform
     result["tone"] = tone
-    
     return result
 
 
+async def _generate_and_cache(cache_key: str, filename: str, category: str | None, platform: str, tone: str, header: dict | None) -> dict:
+    result = await _generate_metadata(filename, category, platform, tone, header)
+    if result.get("ai_used"):
+        metadata_cache.put(cache_key, result)
+    return result
+
+
+async def _generate_metadata(filename: str, category: str | None, platform: str, tone: str, header: dict | None = None) -> dict:
+    try:
+        info = await run_in_threadpool(analyze_image, filename)
+    except Exception:
+        # undecodable pixels: describe the image from its header alone
+        if header is None:
+            raise
+        logger.exception("Image analysis failed for %s", filename)
+        info = dict(header)
+
+    # Generate metadata using OpenAI or fallback
+    messages = build_metadata_messages(info, category, platform, tone)
+    # Try AI-first generation + validation
+    ai_result = await try_ai_generate(messages, platform)
+    if ai_result:
+        result = ai_result
+    else:
+        # Fallback if AI unavailable or failed
+        result = fallback_generate_metadata(info, category, platform)
+    return result
+
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+
+@app.post("/api/generate-metadata/batch")
+async def api_generate_metadata_batch(
+    files: list[UploadFile] = File(None),
+    items: str = Form(None),
+    category: str = Form(None),
+    platform: str = Form("generic"),
+    tone: str = Form("professional"),
+):
+    """Generate metadata for many images, streaming one NDJSON line per item as it completes.
+
+    `items` is an optional JSON array of per-item options (`category`, `platform`,
+    `tone`). Entries with `image_filename` refer to an already-uploaded file; the
+    others are matched, in order, to the uploaded `files`. Files without an entry
+    use the top-level form values. Each line is
+    `{"index": i, "ok": true, "result": {...}}` or `{"index": i, "ok": false, "error": "..."}`.
+    """
+    try:
+        specs = json.loads(items) if items else []
+    except ValueError:
+        specs = None
+    if not isinstance(specs, list) or not all(isinstance(spec, dict) for spec in specs):
+        raise HTTPException(status_code=400, detail="items must be a JSON array of objects")
+    if isinstance(files, UploadFile):
+        files = [files]
+    uploads = list(files or [])
+
+    jobs = []
+
+    async def add_job(spec: dict, upload: UploadFile | None):
+        job = {
+            "index": len(jobs),
+            "category": spec.get("category", category),
+            "platform": spec.get("platform") or platform,
+            "tone": spec.get("tone") or tone,
+        }
+        if upload is not None:
+            if not (upload.content_type or "").startswith("image/"):
+                job["error"] = f"{upload.filename}: file must be an image"
+            else:
+                stored = await ingest_upload(upload, UPLOAD_DIR)
+                job.update(filename=stored["filename"], image_hash=stored["sha256"], header=stored["info"])
+        else:
+            name = os.path.basename(spec.get("image_filename") or "")
+            if name and os.path.exists(os.path.join(UPLOAD_DIR, name)):
+                job["filename"] = name
+            else:
+                job["error"] = f"Image not found: {name}"
+        jobs.append(job)
+
+    # Save every upload before streaming starts; the request body is gone once the response begins
+    for spec in specs:
+        if spec.get("image_filename"):
+            await add_job(spec, None)
+        elif uploads:
+            await add_job(spec, uploads.pop(0))
+    for upload in uploads:
+        await add_job({}, upload)
+    if not jobs:
+        raise HTTPException(status_code=400, detail="No images provided")
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run(job: dict) -> dict:
+        if "error" in job:
+            return {"index": job["index"], "ok": False, "error": job["error"]}
+        args = (job["filename"], job["category"], job["platform"], job["tone"])
+        async with semaphore:
+            try:
+                result = await metadata_for_upload(*args, image_hash=job.get("image_hash"), header=job.get("header"))
+            except Exception as e:
+                logger.exception("Batch item %s failed, using fallback: %s", job["index"], e)
+                try:
+                    info = await run_in_threadpool(analyze_image, job["filename"])
+                except Exception:
+                    info = job.get("header") or {}
+                result = _with_request_fields(fallback_generate_metadata(info, job["category"], job["platform"]), *args)
+        return {"index": job["index"], "ok": True, "result": result}
+
+    async def stream():
+        tasks = [asyncio.create_task(run(job)) for job in jobs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+        finally:
+            # Client went away or streaming finished: don't leave work running
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+GRAPHS_DIR = os.getenv("GRAPHS_DIR", os.path.join(PROJECT_ROOT, "comfyui", "node_graphs"))
+# Intermediate node results, keyed on node type + params + input keys
+graph_executor = GraphExecutor(cache_entries=int(os.getenv("GRAPH_CACHE_SIZE", "64")))
+
+
+@app.get("/api/graphs")
+def api_graphs():
+    """Node graphs that /api/graphs/{name}/run can execute."""
+    names = sorted(n[:-5] for n in os.listdir(GRAPHS_DIR) if n.endswith(".json")) if os.path.isdir(GRAPHS_DIR) else []
+    return {"graphs": names}
+
+
+@app.post("/api/graphs/{name}/run")
+async def api_run_graph(name: str, payload: dict, response: Response, idempotency_key: str | None = Header(None)):
+    """Run a node graph on an uploaded image.
+
+    Payload: `image_filename` (an upload, fed to every ImageLoader node),
+    optional `params` (`{node_id: {param: value}}` overrides; ImageSaver paths
+    cannot be overridden) and `output_name` (a plain image file name; a unique
+    suffix is added and the result substituted for `%name%` in ImageSaver paths).
+    """
+    request_key = payload_key({"graph": name, **payload})
+    return await deduplicated("run-graph", idempotency_key, lambda: _run_graph(name, payload), request_key, response)
+
+
+GRAPH_OUTPUT_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]{0,63}\.(jpg|jpeg|png|webp)")
+
+
+def graph_output_name(graph: str, requested: str | None) -> str:
+    """File name for a graph run's output: `requested` (validated) or the graph name, plus a unique suffix."""
+    if requested is None:
+        requested = f"{os.path.basename(graph)}.jpg"
+    elif not isinstance(requested, str) or not GRAPH_OUTPUT_NAME.fullmatch(requested):
+        raise ValueError("output_name must be a plain file name ending in .jpg, .jpeg, .png or .webp")
+    stem, ext = os.path.splitext(requested)
+    return f"{stem}_{uuid.uuid4().hex[:8]}{ext}"
+
+
+async def _run_graph(name: str, payload: dict) -> dict:
+    path = os.path.join(GRAPHS_DIR, os.path.basename(name) + ".json")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Graph not found: {name}")
+    image_filename = os.path.basename(payload.get("image_filename") or "")
+    if not image_filename or not os.path.exists(os.path.join(UPLOAD_DIR, image_filename)):
+        raise HTTPException(status_code=404, detail=f"Image not found: {image_filename}")
+    try:
+        graph = await run_in_threadpool(load_graph, path)
+        params = payload.get("params") or {}
+        if not isinstance(params, dict) or not all(isinstance(p, dict) for p in params.values()):
+            raise ValueError("params must be an object of {node_id: {param: value}} objects")
+        overrides = {node_id: dict(node_params) for node_id, node_params in params.items()}
+        for node_id, node in graph.nodes.items():
+            if node["type"] == "ImageLoader":
+                overrides.setdefault(node_id, {})["path"] = image_filename
+            elif node["type"] == "ImageSaver" and "path" in overrides.get(node_id, {}):
+                # outputs only go where the graph says; a caller must not overwrite other (cached) outputs
+                raise ValueError(f"the path of ImageSaver node {node_id!r} cannot be overridden")
+        ctx = RunContext(UPLOAD_DIR, OUTPUTS_DIR, graph_output_name(name, payload.get("output_name")))
+        result = await graph_executor.run(graph, ctx, overrides)
+    except (GraphError, KeyError, TypeError, ValueError, OverflowError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid graph run: {e}")
+    outputs = {node_id: "/outputs/" + os.path.relpath(p, os.path.realpath(OUTPUTS_DIR)) for node_id, p in result["outputs"].items()}
+    return {"success": True, "outputs": outputs, "cached": result["cached"], "computed": result["computed"]}
+
+
+# Resized previews of uploads and outputs, rendered on first request and kept under a byte budget
+DERIVATIVE_ROOTS = {"uploads": UPLOAD_DIR, "outputs": OUTPUTS_DIR}
+DERIVATIVE_MAX_AGE = int(os.getenv("DERIVATIVE_MAX_AGE", str(30 * 24 * 3600)))
+derivative_cache = DerivativeCache(os.path.join(CACHE_DIR, "derivatives"))
+
+
+def resolve_media_path(src: str) -> str | None:
+    """Map a `/uploads/...` or `/outputs/...` URL to its file, or None if it is outside those mounts."""
+    mount, _, rel = src.lstrip("/").partition("/")
+    root = DERIVATIVE_ROOTS.get(mount)
+    if root is None or not rel:
+        return None
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, rel))
+    return path if path.startswith(root + os.sep) and os.path.isfile(path) else None
+
+
+@app.get("/api/derivative")
+async def api_derivative(request: Request, src: str, w: int | None = None, h: int | None = None, fit: str = "contain", format: str = "webp", q: int = 80):
+    """Serve `src` (an `/uploads/...` or `/outputs/...` URL) resized to `w` x `h`.
+
+    `fit` is `contain` (inside the box), `cover` (crop to fill it) or `fill`
+    (stretch); `format` is `webp` or `jpeg`. Responses are cacheable for
+    DERIVATIVE_MAX_AGE seconds and revalidate by ETag.
+    """
+    try:
+        spec = parse_spec(w, h, fit, format, q)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    path = resolve_media_path(src)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Image not found: {src}")
+    key = derivative_key(path, spec)
+    headers = {"Cache-Control": f"public, max-age={DERIVATIVE_MAX_AGE}", "ETag": f'"{key[:32]}"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    try:
+        data = await inflight.do("derivative:" + key, lambda: run_in_threadpool(derivative_cache.get_or_render, path, spec, key))
+    except (OSError, Image.DecompressionBombError) as e:
+        raise HTTPException(status_code=415, detail=f"Cannot render {src}: {e}")
+    return Response(content=data, media_type=FORMATS[spec["format"]][1], headers=headers)
+
+
 # Ingest edited images and a description from an external workflow (e.g., n8n)
 @app.post("/api/ingest-edits")
 async def api_ingest_edits(
@@ -428,12 +793,8 @@ async def api_ingest_edits(
         if isinstance(files, UploadFile):
             files = [files]
         for f in files:
-            safe_name = os.path.basename(f.filename)
-            filename = f"edited_{uuid.uuid4().hex[:8]}_{safe_name}"
-            dest = os.path.join(outdir, filename)
-            with open(dest, "wb") as fh:
-                shutil.copyfileobj(f.file, fh)
-            saved.append(f"/outputs/supplementary/{filename}")
+            stored = await ingest_upload(f, outdir, prefix="edited_")
+            saved.append(f"/outputs/supplementary/{stored['filename']}")
 
     listing_path = None
     if metadata:
@@ -482,31 +843,37 @@ async def api_listings():
 
 
 @app.post("/api/remove-background")
-async def api_remove_background(file: UploadFile = File(...)):
-    """Remove image background and return a PNG with transparency (alpha channel).
+async def api_remove_background(file: UploadFile = File(...), preset: str = Form(None)):
+    """Remove image background and return the cutout with transparency (alpha channel).
 
-    If `rembg` is not installed, returns 501 with a helpful message.
+    The result is encoded with `preset` (default VISUALS_CUTOUT_PRESET, a
+    size-budgeted PNG). If `rembg` is not installed, returns 501 with a
+    helpful message.
     """
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
+    try:
+        encoding_preset = get_preset(preset or VISUALS_CUTOUT_PRESET)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     data = await file.read()
 
+    from .image_utils import remove_background_bytes
+
     try:
-        from .image_utils import remove_background_bytes
+        out_bytes = await run_in_threadpool(remove_background_bytes, data)
     except ImportError:
         raise HTTPException(status_code=501, detail="Background removal not available: 'rembg' is not installed")
-
-    try:
-        out_bytes = remove_background_bytes(data)
     except Exception as e:
         logger.exception("Background removal failed: %s", e)
         raise HTTPException(status_code=500, detail=f"Background removal failed: {e}")
 
-    import io
-    from fastapi.responses import StreamingResponse
+    def reencode() -> bytes:
+        with Image.open(io.BytesIO(out_bytes)) as img:
+            return encode_image(img, encoding_preset).data
 
-    return StreamingResponse(io.BytesIO(out_bytes), media_type="image/png")
+    return Response(content=await run_in_threadpool(reencode), media_type=encoding_preset.media_type)
 
 
 # Backwards-compatible alias (older clients may call the /api path)
@@ -515,6 +882,8 @@ async def api_generate_metadata_alias(
     file: UploadFile = File(...),
     category: str = Form(None),
     platform: str = Form("generic"),
-    tone: str = Form("professional")
+    tone: str = Form("professional"),
+    response: Response = None,
+    idempotency_key: str | None = Header(None),
 ):
-    return await api_generate_metadata(file=file, category=category, platform=platform, tone=tone)
\ No newline at end of file
+    return await api_generate_metadata(file=file, category=category, platform=platform, tone=tone, response=response, idempotency_key=idempotency_key)
\ No newline at end of file
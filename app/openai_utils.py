@@ -1,19 +1,128 @@
 import os
 import base64
+import hashlib
+import threading
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+
+from .storage import get_store
 
 logger = logging.getLogger(__name__)
 
 OPENAI_IMAGES_ENDPOINT = "https://api.openai.com/v1/images/generations"
 OPENAI_IMAGES_EDITS_ENDPOINT = "https://api.openai.com/v1/images/edits"
 
+# Concurrent result downloads per call, and the keep-alive pool shared by all calls
+DOWNLOAD_CONCURRENCY = int(os.getenv("OPENAI_DOWNLOAD_CONCURRENCY", "8"))
+DOWNLOAD_POOL_SIZE = int(os.getenv("OPENAI_DOWNLOAD_POOL_SIZE", "16"))
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
 
 def _get_api_key():
     return os.getenv("OPENAI_API_KEY")
 
 
+def get_session() -> requests.Session:
+    """Shared session so API calls and result downloads reuse TLS connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=DOWNLOAD_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def _extension(head: bytes) -> str:
+    if head.startswith(b"\x89PNG"):
+        return ".png"
+    if head.startswith(b"\xff\xd8"):
+        return ".jpg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return ".png"
+
+
+class _ResultWriter:
+    """Writes one result to a blob-store temp file, then links it as `<outdir>/<prefix>_<sha256>.<ext>`."""
+
+    def __init__(self, outdir: Path, prefix: str):
+        self.outdir = outdir
+        self.prefix = prefix
+        self.store = get_store(str(outdir))
+        self.tmp = Path(self.store.temp_path())
+        self.fh = open(self.tmp, "wb")
+        self.hasher = hashlib.sha256()
+        self.head = b""
+
+    def write(self, chunk: bytes):
+        if len(self.head) < 16:
+            self.head += chunk[:16]
+        self.hasher.update(chunk)
+        self.fh.write(chunk)
+
+    def commit(self) -> str:
+        self.fh.close()
+        digest = self.hasher.hexdigest()
+        path = self.outdir / f"{self.prefix}_{digest[:32]}{_extension(self.head)}"
+        # identical content already stored (another prompt, another job): only the link is new
+        self.store.commit(str(self.tmp), digest, str(path))
+        return str(path)
+
+    def abort(self):
+        self.fh.close()
+        self.tmp.unlink(missing_ok=True)
+
+
+def _save_item(item: dict, outdir: Path, prefix: str) -> str | None:
+    writer = None
+    try:
+        b64 = item.get("b64_json") or item.get("b64") or item.get("b64_png")
+        if b64:
+            writer = _ResultWriter(outdir, prefix)
+            writer.write(base64.b64decode(b64))
+            return writer.commit()
+        url = item.get("url")
+        if not url:
+            return None
+        with get_session().get(url, stream=True, timeout=60) as r:
+            r.raise_for_status()
+            writer = _ResultWriter(outdir, prefix)
+            for chunk in r.iter_content(DOWNLOAD_CHUNK_SIZE):
+                writer.write(chunk)
+        return writer.commit()
+    except Exception as e:
+        logger.error("Failed to save OpenAI image result: %r", e)
+        if writer is not None:
+            writer.abort()
+        return None
+
+
+def save_results(items: list, outdir: str | Path, prefix: str = "image") -> list:
+    """Save OpenAI image results (base64 or URL) into `outdir` concurrently.
+
+    Downloads stream to disk in chunks over the shared session. Each file is
+    named after its content hash and appears atomically, so concurrent jobs
+    writing to the same directory never overwrite each other's results.
+    Returns the saved paths in result order; failed items are skipped.
+    """
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(DOWNLOAD_CONCURRENCY, len(items)))) as pool:
+        paths = list(pool.map(lambda item: _save_item(item, outdir, prefix), items))
+    return [p for p in paths if p]
+
+
 def generate_images(prompt: str, n: int = 3, size: str = "1024x1024", outdir: str | Path | None = None) -> list:
     """Generate `n` images from prompt using OpenAI Images API (direct HTTP call).
 
@@ -25,37 +134,14 @@ def generate_images(prompt: str, n: int = 3, size: str = "1024x1024", outdir: st
 
     headers = {"Authorization": f"Bearer {key}", "Content-Type": "application/json"}
     payload = {"prompt": prompt, "n": n, "size": size}
-    resp = requests.post(OPENAI_IMAGES_ENDPOINT, json=payload, headers=headers, timeout=60)
+    resp = get_session().post(OPENAI_IMAGES_ENDPOINT, json=payload, headers=headers, timeout=60)
     if resp.status_code != 200:
         logger.error("OpenAI images API error: %s %s", resp.status_code, resp.text)
         raise RuntimeError(f"OpenAI images API error: {resp.status_code} {resp.text}")
 
     j = resp.json()
-    data = j.get("data") or []
     outdir = Path(outdir or Path.cwd() / "outputs" / "images")
-    outdir.mkdir(parents=True, exist_ok=True)
-    out_paths = []
-    for i, item in enumerate(data):
-        b64 = item.get("b64_json") or item.get("b64") or item.get("b64_png")
-        if not b64:
-            # Some responses may include a url instead
-            url = item.get("url")
-            if url:
-                # Download it
-                r2 = requests.get(url, timeout=60)
-                p = outdir / f"image_{i:03d}.jpg"
-                with open(p, "wb") as f:
-                    f.write(r2.content)
-                out_paths.append(str(p))
-                continue
-            else:
-                continue
-        img_bytes = base64.b64decode(b64)
-        p = outdir / f"image_{i:03d}.jpg"
-        with open(p, "wb") as f:
-            f.write(img_bytes)
-        out_paths.append(str(p))
-    return out_paths
+    return save_results(j.get("data") or [], outdir, prefix="image")
 
 
 def generate_variations_from_image(image_path: str, prompt: str | None = None, n: int = 3, size: str = "1024x1024", outdir: str | Path | None = None) -> list:
@@ -86,32 +172,12 @@ def generate_variations_from_image(image_path: str, prompt: str | None = None, n
             data["n"] = n
             data["size"] = size
             # multipart upload: files + fields
-            resp = requests.post(OPENAI_IMAGES_EDITS_ENDPOINT, headers=headers, files=files, data=data, timeout=120)
+            resp = get_session().post(OPENAI_IMAGES_EDITS_ENDPOINT, headers=headers, files=files, data=data, timeout=120)
             if resp.status_code != 200:
                 logger.error("OpenAI images edit API error: %s %s", resp.status_code, resp.text)
                 raise RuntimeError(f"OpenAI images edit API error: {resp.status_code} {resp.text}")
             j = resp.json()
-            data_items = j.get("data") or []
-            out_paths = []
-            for i, item in enumerate(data_items):
-                b64 = item.get("b64_json") or item.get("b64") or item.get("b64_png")
-                if not b64:
-                    url = item.get("url")
-                    if url:
-                        r2 = requests.get(url, timeout=60)
-                        p = outdir / f"edit_{i:03d}.jpg"
-                        with open(p, "wb") as f2:
-                            f2.write(r2.content)
-                        out_paths.append(str(p))
-                        continue
-                    else:
-                        continue
-                img_bytes = base64.b64decode(b64)
-                p = outdir / f"edit_{i:03d}.jpg"
-                with open(p, "wb") as f2:
-                    f2.write(img_bytes)
-                out_paths.append(str(p))
-            return out_paths
+        return save_results(j.get("data") or [], outdir, prefix="edit")
     except Exception as e:
         logger.exception("generate_variations_from_image failed: %s", e)
         return []
@@ -0,0 +1,77 @@
+"""Chat prompts for metadata generation and repair.
+
+Every prompt starts with a static system message (instructions + the
+platform schema, serialized deterministically) and puts the per-request
+fields last. Identical prefixes across requests let the provider reuse its
+prompt cache, which lowers latency and input-token cost.
+"""
+import json
+from functools import lru_cache
+
+from .validation import schema_for, schema_key
+
+METADATA_INSTRUCTIONS = (
+    "You are an assistant that writes ecommerce product listing metadata. "
+    "Return a single valid JSON object and nothing else. "
+    "Keys: title (short string), bullets (array of 3 concise bullet points), "
+    "description (short marketing paragraph), tags (array), and attributes (object). "
+    "The JSON must conform to this schema:\n"
+)
+
+REPAIR_INSTRUCTIONS = (
+    "You are a helpful assistant that fixes JSON to match the requested schema. "
+    "The user message contains (possibly invalid) JSON for ecommerce product listing metadata. "
+    "Return ONLY a single valid JSON object, no explanation, that conforms to this schema:\n"
+)
+
+
+def _schema_text(platform: str | None) -> str:
+    return json.dumps(schema_for(platform), sort_keys=True, separators=(",", ":"))
+
+
+# Cached per schema registry key, not per raw platform string: clients send
+# arbitrary values, which must not each add a cache entry
+@lru_cache(maxsize=32)
+def _metadata_system_prompt(key: str) -> str:
+    return METADATA_INSTRUCTIONS + _schema_text(key)
+
+
+@lru_cache(maxsize=32)
+def _repair_system_prompt(key: str) -> str:
+    return REPAIR_INSTRUCTIONS + _schema_text(key)
+
+
+def metadata_system_prompt(platform: str | None = None) -> str:
+    return _metadata_system_prompt(schema_key(platform))
+
+
+def repair_system_prompt(platform: str | None = None) -> str:
+    return _repair_system_prompt(schema_key(platform))
+
+
+def describe_image(info: dict) -> str:
+    parts = [f"width={info.get('width')}, height={info.get('height')}, format={info.get('format')}, mode={info.get('mode')}"]
+    if info.get("aspect"):
+        parts.append(f"aspect={info['aspect']}")
+    colors = info.get("dominant_colors")
+    if colors:
+        parts.append("dominant colors=" + ", ".join(f"{c['name']} {round(c['share'] * 100)}%" for c in colors))
+    if info.get("brightness") is not None:
+        parts.append(f"brightness={info['brightness']}, saturation={info.get('saturation')}")
+    background = info.get("background")
+    if background:
+        parts.append(f"background={background['color']} (uniformity {background['uniformity']})")
+    return "; ".join(parts)
+
+
+def build_metadata_messages(info: dict, category: str | None, platform: str, tone: str) -> list:
+    """Messages for a metadata request: static prefix first, variable fields at the tail."""
+    user = (
+        f"Image metadata: {describe_image(info)}.\n"
+        f"Category: {category or 'N/A'}. Platform: {platform}. Tone: {tone}."
+    )
+    return [{"role": "system", "content": metadata_system_prompt(platform)}, {"role": "user", "content": user}]
+
+
+def build_repair_messages(invalid_text: str, platform: str | None = None) -> list:
+    return [{"role": "system", "content": repair_system_prompt(platform)}, {"role": "user", "content": invalid_text}]
@@ -17,8 +17,11 @@ def render_template(template_name: str, context: dict) -> str:
 def generate_structured_metadata(info: dict, category: str | None = None, platform: str = "generic", style: str | None = None) -> dict:
     """Generate a structured metadata dict using a local template + lightweight heuristics.
 
-    This function is CPU-friendly and deterministic for demo purposes.
+    This function is CPU-friendly and deterministic for demo purposes. When `info`
+    carries image analysis (see `image_analysis`), the product colors are used
+    in the title, bullets, tags and attributes.
     """
+    colors = product_colors(info)
     ctx = {
         "width": info.get("width"),
         "height": info.get("height"),
@@ -27,18 +30,40 @@ def generate_structured_metadata(info: dict, category: str | None = None, platfo
         "category": category or "Product",
         "platform": platform,
         "style": style or "stylish",
+        "colors": " and ".join(colors),
     }
 
-    title = f"{ctx['style'].capitalize()} {ctx['category']} — {ctx['format']}"
+    if colors:
+        title = f"{ctx['style'].capitalize()} {colors[0].capitalize()} {ctx['category']}"
+    else:
+        title = f"{ctx['style'].capitalize()} {ctx['category']} — {ctx['format']}"
     description = render_template("metadata_prompt.j2", ctx)
 
     bullets = [
         f"{ctx['style'].capitalize()} design perfect for everyday use.",
-        f"Made from quality {ctx['format'].lower()} materials for lasting performance.",
+        f"Rich {ctx['colors']} tones that stand out in any setting." if colors
+        else f"Made from quality {ctx['format'].lower()} materials for lasting performance.",
         f"Dimensions: {ctx['width']}x{ctx['height']} px · Color mode: {ctx['mode']}",
     ]
 
-    tags = [ctx['category'].lower(), ctx['style'], ctx['format'].lower()]
+    tags = [ctx['category'].lower(), ctx['style'], ctx['format'].lower()] + colors
     attributes = {"width": ctx['width'], "height": ctx['height'], "format": ctx['format'], "color_mode": ctx['mode']}
+    if colors:
+        attributes["colors"] = colors
+    if info.get("aspect"):
+        attributes["aspect"] = info["aspect"]
+    if info.get("background"):
+        attributes["background"] = info["background"]["color"]
 
     return {"title": title, "bullets": bullets, "description": description, "tags": tags, "attributes": attributes}
+
+
+def product_colors(info: dict, limit: int = 2) -> list:
+    """Names of the dominant colors, skipping a uniform background color."""
+    background = info.get("background") or {}
+    skip = background.get("color") if background.get("uniformity", 0) >= 0.8 else None
+    names = []
+    for c in info.get("dominant_colors") or []:
+        if c["name"] != skip and c["name"] not in names and c.get("share", 0) >= 0.05:
+            names.append(c["name"])
+    return names[:limit]
@@ -0,0 +1,181 @@
+"""Latency and failure controls for calls to external providers.
+
+- ``CircuitBreaker``: opens when the recent error or slow-call rate is too
+  high, so callers can go straight to a local fallback instead of waiting on
+  a degraded provider. After a cooldown a single probe call is let through;
+  its outcome alone decides whether the breaker closes again.
+- ``LatencyTracker``: rolling latency window used for percentile-based
+  hedge delays.
+- ``hedged_call``: run an awaitable factory under a deadline and, if the first
+  attempt is still pending after ``hedge_delay``, race a duplicate attempt.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider while its circuit breaker is open."""
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, window: int = 20, min_calls: int = 5, error_rate: float = 0.5, slow_call_seconds: float = 10.0, slow_rate: float = 0.5, cooldown: float = 30.0, clock=time.monotonic):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.short_circuited = 0
+        self._calls: deque = deque(maxlen=window)
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now (counts a short-circuit when not).
+
+        In the half-open state only one probe is let through; the caller that
+        got it reports back with `record(..., probe=True)` or `release_probe()`.
+        A probe that never reports back is given up after `cooldown`.
+        """
+        now = self.clock()
+        if self.state == self.OPEN and now - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and (not self._probe_in_flight or now - self._probe_started >= self.cooldown):
+            self._probe_in_flight = True
+            self._probe_started = now
+            return True
+        self.short_circuited += 1
+        return False
+
+    def release_probe(self):
+        """Give up the half-open probe without an outcome (e.g. the call was cancelled)."""
+        self._probe_in_flight = False
+
+    def record(self, success: bool, latency: float, probe: bool = False):
+        """Record a finished call; `probe` marks the call that `allow()` let through while half-open."""
+        slow = latency >= self.slow_call_seconds
+        if self.state == self.HALF_OPEN:
+            # calls started before the breaker opened do not decide the probe's outcome
+            if probe:
+                self._probe_in_flight = False
+                if success and not slow:
+                    self.state = self.CLOSED
+                    self._calls.clear()
+                else:
+                    self._open()
+            return
+        if self.state == self.OPEN:
+            return
+        self._calls.append((success, slow))
+        if self.state == self.CLOSED and len(self._calls) >= self.min_calls:
+            errors, slow_calls = self._rates()
+            if errors >= self.error_rate or slow_calls >= self.slow_rate:
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = self.clock()
+        self.times_opened += 1
+
+    def _rates(self):
+        n = len(self._calls) or 1
+        return sum(1 for ok, _ in self._calls if not ok) / n, sum(1 for _, slow in self._calls if slow) / n
+
+    def stats(self) -> dict:
+        errors, slow_calls = self._rates()
+        return {
+            "state": self.state,
+            "error_rate": round(errors, 3),
+            "slow_rate": round(slow_calls, 3),
+            "recent_calls": len(self._calls),
+            "times_opened": self.times_opened,
+            "short_circuited": self.short_circuited,
+        }
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, q: float) -> float | None:
+        if not self._samples:
+            return None
+        values = sorted(self._samples)
+        return values[min(len(values) - 1, math.ceil(q * len(values)) - 1)]
+
+
+class HedgeStats:
+    def __init__(self):
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_won = 0
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_won": self.hedge_won,
+            "hedge_win_rate": round(self.hedge_won / self.hedged, 3) if self.hedged else 0.0,
+        }
+
+
+async def hedged_call(factory, deadline: float, hedge_delay: float | None = None, stats: HedgeStats | None = None):
+    """Await `factory()` within `deadline` seconds, hedging once after `hedge_delay`.
+
+    Returns the first successful result; the losing attempt is cancelled. If
+    every attempt fails the last error is raised. Raises `asyncio.TimeoutError`
+    when the deadline passes first.
+    """
+    if stats is not None:
+        stats.calls += 1
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    first = asyncio.ensure_future(factory())
+    attempts = [first]
+    hedge_pending = hedge_delay is not None and hedge_delay < deadline
+    last_error = None
+    try:
+        while attempts:
+            remaining = end - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            wait_for = min(remaining, hedge_delay) if hedge_pending else remaining
+            done, _ = await asyncio.wait(attempts, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                attempts.remove(task)
+                if task.exception() is None:
+                    if stats is not None and task is not first:
+                        stats.hedge_won += 1
+                    return task.result()
+                last_error = task.exception()
+            if not done and hedge_pending:
+                hedge_pending = False
+                attempts.append(asyncio.ensure_future(factory()))
+                if stats is not None:
+                    stats.hedged += 1
+            elif not done:
+                raise asyncio.TimeoutError()
+            elif not attempts and hedge_pending:
+                # the only attempt failed before the hedge point; don't duplicate a failing call
+                break
+        raise last_error
+    finally:
+        for task in attempts:
+            task.cancel()
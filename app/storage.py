@@ -0,0 +1,226 @@
+"""Content-addressed blob store for uploads and generated outputs.
+
+Every file is stored once under ``<root>/<sha256[:2]>/<sha256>``. The
+logical names the app serves (``/data/uploads/<name>``,
+``/data/outputs/...``) are hard links to those blobs, so identical bytes
+written under many names use the disk space of one file. The reference count
+of a blob is its link count minus one. ``gc()`` removes blobs that no
+logical name points to any more.
+
+Writes go to a temp file inside the store and are renamed into place, so a
+blob or logical name never appears half-written. When the temp content turns
+out to be a blob that already exists, the temp file is simply dropped.
+
+Hard links cannot cross filesystems, and deployments often mount the
+outputs separately from ``/data`` (see docker-compose.yml). ``get_store(dest)``
+therefore returns the store on the same filesystem as ``dest``: ``BLOB_DIR``
+when it is on that filesystem, otherwise a ``.blobs`` directory at the root of
+the mount that holds ``dest``. Only if linking still fails does a logical
+name fall back to a copy (logged; the copy is not counted as a reference).
+"""
+import errno
+import hashlib
+import io
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = os.getenv("BLOB_DIR", "/data/blobs")
+
+
+class BlobStore:
+    def __init__(self, root: str = BLOB_DIR):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.stored = 0
+        self.deduplicated = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def temp_path(self) -> str:
+        """A fresh temp file name on the store's filesystem (write there, then `commit`)."""
+        return os.path.join(self.tmp_dir, uuid.uuid4().hex)
+
+    def commit(self, tmp: str, digest: str, dest: str | None = None) -> str:
+        """Move `tmp` (whose SHA-256 is `digest`) into the store and optionally link it as `dest`.
+
+        Returns the blob path. If the blob already exists, `tmp` is discarded.
+        """
+        blob = self.blob_path(digest)
+        if os.path.exists(blob):
+            size = os.path.getsize(tmp)
+            os.unlink(tmp)
+            with self._lock:
+                self.deduplicated += 1
+                self.bytes_saved += size
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            _move(tmp, blob)
+            with self._lock:
+                self.stored += 1
+        if dest is not None:
+            self.link(digest, dest)
+        return blob
+
+    def put_bytes(self, data: bytes, dest: str | None = None) -> str:
+        """Store `data`; returns its digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        if os.path.exists(self.blob_path(digest)):
+            with self._lock:
+                self.deduplicated += 1
+                self.bytes_saved += len(data)
+            if dest is not None:
+                self.link(digest, dest)
+            return digest
+        tmp = self.temp_path()
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        self.commit(tmp, digest, dest)
+        return digest
+
+    def put_file(self, path: str, dest: str | None = None) -> str:
+        """Store a copy of the file at `path` (left in place); returns its digest."""
+        tmp = self.temp_path()
+        hasher = hashlib.sha256()
+        with open(path, "rb") as src, open(tmp, "wb") as dst:
+            for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                hasher.update(chunk)
+                dst.write(chunk)
+        digest = hasher.hexdigest()
+        self.commit(tmp, digest, dest)
+        return digest
+
+    def save_image(self, img, dest: str, fmt: str, **params) -> str:
+        """Encode a PIL image and store it as `dest`; returns its digest."""
+        buf = io.BytesIO()
+        img.save(buf, fmt, **params)
+        return self.put_bytes(buf.getvalue(), dest)
+
+    def link(self, digest: str, dest: str):
+        """Point the logical name `dest` at a blob (atomically replacing whatever was there)."""
+        blob = self.blob_path(digest)
+        try:
+            if os.path.samefile(blob, dest):
+                return
+        except OSError:
+            pass
+        tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(blob, tmp)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.ENOTSUP, errno.EMLINK):
+                raise
+            logger.warning("Cannot hard-link %s into %s (%s); storing a copy", blob, dest, e.strerror)
+            shutil.copyfile(blob, tmp)
+        os.replace(tmp, dest)
+
+    def refcount(self, digest: str) -> int:
+        """Number of logical names linked to the blob (0 if it is unreferenced or missing)."""
+        try:
+            return os.stat(self.blob_path(digest)).st_nlink - 1
+        except FileNotFoundError:
+            return 0
+
+    def gc(self, min_age: float = 3600) -> int:
+        """Delete unreferenced blobs and stale temp files older than `min_age` seconds; returns bytes freed.
+
+        The age limit keeps blobs and temp files of writes in progress.
+        """
+        cutoff = time.time() - min_age
+        freed = 0
+        for entry in os.scandir(self.root):
+            if not entry.is_dir() or len(entry.name) != 2:
+                continue
+            for blob in os.scandir(entry.path):
+                st = blob.stat()
+                if st.st_nlink <= 1 and st.st_mtime < cutoff:
+                    freed += st.st_size
+                    os.unlink(blob.path)
+        for tmp in os.scandir(self.tmp_dir):
+            st = tmp.stat()
+            if st.st_mtime < cutoff:
+                freed += st.st_size
+                os.unlink(tmp.path)
+        return freed
+
+    def stats(self) -> dict:
+        return {"stored": self.stored, "deduplicated": self.deduplicated, "bytes_saved": self.bytes_saved}
+
+
+def _move(src: str, dst: str):
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # temp file on another filesystem: copy next to the target, then rename
+        tmp = f"{dst}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+        os.unlink(src)
+
+
+# one store per filesystem (st_dev), created on first use
+_stores: dict = {}
+_store_lock = threading.Lock()
+
+
+def _device(path: str) -> int:
+    """st_dev of `path`, or of its nearest existing ancestor."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return os.stat(path).st_dev
+
+
+def mount_root(path: str) -> str:
+    """Top directory of the filesystem that holds `path`."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    dev = os.stat(path).st_dev
+    while path != os.path.dirname(path) and os.stat(os.path.dirname(path)).st_dev == dev:
+        path = os.path.dirname(path)
+    return path
+
+
+def get_store(dest: str | None = None) -> BlobStore:
+    """The store that can hard-link into `dest` (the `BLOB_DIR` store when `dest` is None or on its filesystem)."""
+    with _store_lock:
+        default = _stores.get("default")
+        if default is None:
+            default = _stores["default"] = BlobStore(BLOB_DIR)
+        if dest is None:
+            return default
+        dev = _device(dest)
+        if dev == _device(default.root):
+            return default
+        store = _stores.get(dev)
+        if store is None:
+            store = _stores[dev] = BlobStore(os.path.join(mount_root(dest), ".blobs"))
+            logger.info("Using blob store %s for files on another filesystem than %s", store.root, BLOB_DIR)
+        return store
+
+
+def all_stores() -> list:
+    with _store_lock:
+        return list(_stores.values())
+
+
+def stats() -> dict:
+    """Counters summed over every store, with the store roots."""
+    stores = all_stores()
+    totals = {"stored": 0, "deduplicated": 0, "bytes_saved": 0}
+    for store in stores:
+        for key, value in store.stats().items():
+            totals[key] += value
+    return {**totals, "roots": [store.root for store in stores]}
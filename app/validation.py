@@ -1,13 +1,17 @@
+import hashlib
 import json
 import logging
 
+from .llm_client import get_client
+from .resilience import CircuitOpenError
+
 logger = logging.getLogger(__name__)
 
 try:
-    from jsonschema import validate, ValidationError
+    from jsonschema import Draft7Validator, ValidationError
     JSONSCHEMA_AVAILABLE = True
 except Exception:
-    validate = None
+    Draft7Validator = None
     ValidationError = Exception
     JSONSCHEMA_AVAILABLE = False
 
@@ -25,19 +29,78 @@ METADATA_SCHEMA = {
     "additionalProperties": True,
 }
 
+# Marketplace listing limits, merged over the base schema's properties
+PLATFORM_SCHEMA_OVERRIDES = {
+    "etsy": {
+        "title": {"maxLength": 140},
+        "tags": {"maxItems": 13, "items": {"type": "string", "maxLength": 20}},
+    },
+    "amazon": {
+        "title": {"maxLength": 200},
+        "bullets": {"maxItems": 5, "items": {"type": "string", "maxLength": 500}},
+    },
+    "ebay": {
+        "title": {"maxLength": 80},
+    },
+}
+
+
+def build_platform_schema(platform: str) -> dict:
+    schema = json.loads(json.dumps(METADATA_SCHEMA))
+    for prop, extra in PLATFORM_SCHEMA_OVERRIDES.get(platform, {}).items():
+        schema["properties"].setdefault(prop, {}).update(extra)
+    return schema
+
+
+def _build_registry() -> dict:
+    """Build every platform schema once; check and compile them into validators."""
+    registry = {}
+    for platform in ["generic", *PLATFORM_SCHEMA_OVERRIDES]:
+        schema = build_platform_schema(platform)
+        validator = None
+        if JSONSCHEMA_AVAILABLE:
+            Draft7Validator.check_schema(schema)
+            validator = Draft7Validator(schema)
+        fingerprint = hashlib.sha256(json.dumps(schema, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        registry[platform] = {"schema": schema, "validator": validator, "fingerprint": fingerprint}
+    return registry
+
+
+SCHEMA_REGISTRY = _build_registry()
+
 
-def is_valid_metadata(obj: dict) -> (bool, str | None):
-    if JSONSCHEMA_AVAILABLE:
-        try:
-            validate(instance=obj, schema=METADATA_SCHEMA)
-            return True, None
-        except ValidationError as e:
-            return False, str(e)
-    # Basic fallback validation (ensure required keys exist)
-    required = METADATA_SCHEMA.get('required', [])
-    for k in required:
+def schema_key(platform: str | None) -> str:
+    """The registry key `platform` maps to ("generic" for unknown platforms)."""
+    key = (platform or "generic").lower()
+    return key if key in SCHEMA_REGISTRY else "generic"
+
+
+def _entry(platform: str | None) -> dict:
+    return SCHEMA_REGISTRY[schema_key(platform)]
+
+
+def schema_for(platform: str | None = None) -> dict:
+    """The metadata schema for `platform` (unknown platforms use the generic schema)."""
+    return _entry(platform)["schema"]
+
+
+def schema_fingerprint(platform: str | None = None) -> str:
+    return _entry(platform)["fingerprint"]
+
+
+def is_valid_metadata(obj: dict, platform: str | None = None) -> (bool, str | None):
+    entry = _entry(platform)
+    # Cheap hand-written pre-check: most bad outputs are the wrong shape or miss a key
+    if not isinstance(obj, dict):
+        return False, "metadata must be an object"
+    for k in entry["schema"]["required"]:
         if k not in obj:
             return False, f"missing required property: {k}"
+    validator = entry["validator"]
+    if validator is not None:
+        error = next(validator.iter_errors(obj), None)
+        return (True, None) if error is None else (False, str(error))
+    # Basic fallback validation when jsonschema is unavailable
     if not isinstance(obj.get('title', ''), str):
         return False, 'title must be a string'
     if not isinstance(obj.get('bullets', []), list):
@@ -45,29 +108,22 @@ def is_valid_metadata(obj: dict) -> (bool, str | None):
     return True, None
 
 
-async def repair_with_openai(openai_module, invalid_text: str) -> str | None:
-    """Ask OpenAI to repair the invalid JSON to conform to METADATA_SCHEMA.
+async def repair_with_openai(invalid_text: str, client=None, platform: str | None = None) -> str | None:
+    """Ask OpenAI to repair the invalid JSON to conform to the (platform) metadata schema.
 
-    `openai_module` should be the imported openai package (older api) so we can call ChatCompletion.
+    Uses the shared non-blocking client from `llm_client` unless `client` is given.
     Returns repaired JSON string or None on failure.
     """
-    if openai_module is None:
+    client = client or get_client()
+    if not client.available:
         return None
     try:
-        prompt = (
-            "The user provided the following (possibly invalid) JSON for an ecommerce product listing metadata:\n"
-            f"{invalid_text}\n\n"
-            "Please return a single valid JSON object that conforms to this schema:\n"
-            f"{json.dumps(METADATA_SCHEMA, indent=2)}\n"
-            "Return ONLY the JSON object, no explanation."
-        )
-        res = openai_module.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "system", "content": "You are a helpful assistant that fixes JSON to match the requested schema."}, {"role": "user", "content": prompt}],
-            temperature=0.0,
-            max_tokens=400,
-        )
+        from .prompt_builder import build_repair_messages
+
+        res = await client.complete(messages=build_repair_messages(invalid_text, platform), temperature=0.0, json_mode=True, purpose="repair")
         return res.choices[0].message.content
+    except CircuitOpenError:
+        return None
     except Exception as e:
         logger.exception("repair_with_openai failed: %s", e)
-        return None
\ No newline at end of file
+        return None
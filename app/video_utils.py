@@ -1,6 +1,10 @@
+import io
 import os
+import re
 import subprocess
+import threading
 import logging
+from fractions import Fraction
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -63,102 +67,216 @@ def create_silent_audio(out_path: str, duration: int = 1):
         raise RuntimeError(f"ffmpeg silent audio generation failed: {e.stderr}")
 
 
+# libx264 settings shared by every slideshow encode
+X264_ARGS = ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-preset", "fast"]
+MP4_AUDIO_CODECS = ("aac", "mp3")
+
+
+def _open_frame(src):
+    """Open a frame given as a file path or as encoded bytes."""
+    from PIL import Image
+
+    return Image.open(io.BytesIO(src) if isinstance(src, bytes) else src)
+
+
+def _frame_name(src) -> str:
+    return f"<{len(src)} bytes>" if isinstance(src, bytes) else str(src)
+
+
+def _probe_frames(frames: list) -> list:
+    """(frame, header) for each readable frame; only headers are parsed, nothing is decoded."""
+    probed = []
+    for src in frames:
+        if not isinstance(src, bytes) and not os.path.exists(src):
+            logger.error(f"Frame not found: {src}")
+            continue
+        try:
+            with _open_frame(src) as img:
+                probed.append((src, {"format": img.format, "mode": img.mode, "size": img.size}))
+        except Exception as e:
+            logger.error(f"Unreadable frame {_frame_name(src)}: {e}")
+    return probed
+
+
+def plan_frames(frames: list) -> tuple:
+    """Choose how frames are streamed to ffmpeg: `(mode, size, frames)`.
+
+    A frame is a file path or the encoded image bytes; unreadable ones are
+    dropped from the returned list.
+
+    `size` is the video size: the first frame's, rounded down to even numbers
+    (yuv420p needs even dimensions). When every frame is a JPEG of exactly
+    that size they are passed through untouched (`"mjpeg"`); otherwise
+    each frame is decoded and fitted to `size` as raw RGB (`"raw"`).
+    """
+    probed = _probe_frames(frames)
+    if not probed:
+        raise RuntimeError("No valid frames found for video creation")
+    width, height = probed[0][1]["size"]
+    size = (max(2, width - width % 2), max(2, height - height % 2))
+    passthrough = all(h["format"] == "JPEG" and h["mode"] in ("RGB", "L") and h["size"] == size for _, h in probed)
+    return ("mjpeg" if passthrough else "raw"), size, [src for src, _ in probed]
+
+
+def _raw_frame(src, size: tuple) -> bytes | None:
+    """RGB24 pixels of frame `src` fitted (letterboxed on white) to `size`; None if it cannot be decoded."""
+    from PIL import Image, ImageOps
+
+    try:
+        with _open_frame(src) as img:
+            if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+                # flatten cutouts onto white instead of whatever color their hidden pixels have
+                rgba = img.convert("RGBA")
+                rgb = Image.new("RGB", rgba.size, (255, 255, 255))
+                rgb.paste(rgba, mask=rgba.getchannel("A"))
+            else:
+                rgb = img.convert("RGB")
+    except Exception as e:
+        logger.warning(f"Skipping frame {_frame_name(src)}: {e}")
+        return None
+    if rgb.size != size:
+        rgb = ImageOps.pad(rgb, size, Image.Resampling.LANCZOS, color=(255, 255, 255))
+    return rgb.tobytes()
+
+
+def _frame_chunks(mode: str, size: tuple, frames: list, repeats: list | None = None):
+    for i, src in enumerate(frames):
+        if mode == "raw":
+            data = _raw_frame(src, size)
+        elif isinstance(src, bytes):
+            data = src
+        else:
+            with open(src, "rb") as fh:
+                data = fh.read()
+        if data is None:
+            continue
+        for _ in range(repeats[i] if repeats else 1):
+            yield data
+
+
+def probe_audio(path: str) -> dict:
+    """`{"duration": seconds, "codec": name}` of an audio file (WAV header, otherwise ffmpeg's stream info)."""
+    import wave
+
+    try:
+        with wave.open(path, "rb") as w:
+            return {"duration": w.getnframes() / float(w.getframerate()), "codec": "pcm"}
+    except (wave.Error, EOFError):
+        pass
+    try:
+        # ffmpeg with no output prints the container info and exits; nothing is decoded
+        info = subprocess.run(["ffmpeg", "-hide_banner", "-i", path], capture_output=True, text=True).stderr
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg not found on PATH; cannot probe audio")
+    duration = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", info)
+    if not duration:
+        raise RuntimeError(f"Cannot read duration of {path}")
+    hours, minutes, seconds = duration.groups()
+    codec = re.search(r"Audio: (\w+)", info)
+    return {"duration": int(hours) * 3600 + int(minutes) * 60 + float(seconds), "codec": codec.group(1) if codec else None}
+
+
+def pace_frames(count: int, fps, duration: float) -> tuple:
+    """Fit `count` frames to `duration` seconds: `(fps, repeats)`.
+
+    At `fps` the narration needs round(duration * fps) frames; each input
+    frame is repeated so they are spread evenly over it. When that is fewer
+    than `count`, every frame is shown once and the rate is raised to
+    count / duration instead. Raises RuntimeError for an empty narration.
+    """
+    if duration <= 0:
+        raise RuntimeError("Narration has no duration; cannot pace frames to it")
+    total = round(duration * float(fps))
+    if total < count:
+        return Fraction(count / duration).limit_denominator(1000), [1] * count
+    return fps, [(i + 1) * total // count - i * total // count for i in range(count)]
+
+
+def _frame_input_args(mode: str, size: tuple, fps) -> list:
+    if mode == "mjpeg":
+        return ["-f", "image2pipe", "-framerate", str(fps), "-c:v", "mjpeg", "-i", "-"]
+    return ["-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{size[0]}x{size[1]}", "-framerate", str(fps), "-i", "-"]
+
+
+def run_ffmpeg_with_input(cmd: list, chunks) -> None:
+    """Run ffmpeg reading stdin from the `chunks` iterator.
+
+    A writer thread produces and writes the chunks while ffmpeg encodes, so
+    decoding the next frame overlaps with encoding the previous one; stderr
+    is drained here so neither side can block on a full pipe.
+    """
+    try:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg not found on PATH; cannot create video")
+    errors = []
+
+    def feed():
+        try:
+            for chunk in chunks:
+                proc.stdin.write(chunk)
+        except BrokenPipeError:
+            pass  # ffmpeg exited early; its stderr says why
+        except Exception as e:
+            errors.append(e)
+            proc.kill()
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    writer = threading.Thread(target=feed, name="ffmpeg-feed", daemon=True)
+    writer.start()
+    stderr = proc.stderr.read().decode("utf-8", "replace")
+    proc.wait()
+    writer.join()
+    if errors:
+        raise RuntimeError(f"Video creation failed: {errors[0]}") from errors[0]
+    if proc.returncode != 0:
+        logger.error(f"FFmpeg error: {stderr}")
+        raise RuntimeError(f"Video creation failed: {stderr}")
+
+
 def make_video_from_frames(frames: list, out_path: str, fps: int = 2, audio_path: str | None = None):
-    """Create a slideshow video from ordered image frame paths."""
-    import tempfile
-    import shutil
-    
+    """Create a slideshow video from ordered frames (file paths or encoded image bytes).
+
+    Frames are streamed to ffmpeg's stdin as they are read (see `plan_frames`);
+    nothing is written to a temp directory. With `audio_path` the frames are
+    paced to the narration's length (see `pace_frames`) and muxed with it in
+    the same ffmpeg run.
+    """
     # Ensure output directory exists
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    
-    with tempfile.TemporaryDirectory() as tmp:
-        # Copy/convert frames with sequential names (re-encode to standard JPEG to avoid codec issues)
-        for i, src in enumerate(frames):
-            if not os.path.exists(src):
-                logger.error(f"Frame not found: {src}")
-                continue
-
-            dst = os.path.join(tmp, f"frame_{i:03d}.jpg")
-            # Prefer re-encoding via PIL to ensure consistent JPEG format and color mode
-            try:
-                from PIL import Image
-                img = Image.open(src)
-                # Convert to RGB if needed (e.g., PNG with alpha)
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                img.save(dst, "JPEG", quality=85)
-                logger.debug(f"Saved frame {i} as {dst} (size={img.size}, mode={img.mode})")
-            except Exception as e:
-                logger.warning(f"PIL re-encode failed for {src}: {e}; falling back to simple copy")
-                try:
-                    shutil.copy(src, dst)
-                except Exception as e2:
-                    logger.error(f"Failed to copy frame {src}: {e2}")
-        
-        # Check if we have any frames
-        frame_files = sorted([f for f in os.listdir(tmp) if f.startswith('frame_') and f.endswith('.jpg')])
-        if not frame_files:
-            raise RuntimeError("No valid frames found for video creation")
-        
-        # Create video from frames
-        tmp_pattern = os.path.join(tmp, "frame_%03d.jpg")
-        
-        if audio_path and os.path.exists(audio_path):
-            # Create video with audio
-            intermediate_video = os.path.join(tmp, "temp_video.mp4")
-            
-            # First create video without audio
-            cmd1 = [
-                "ffmpeg",
-                "-y",
-                "-framerate", str(fps),
-                "-i", tmp_pattern,
-                "-c:v", "libx264",
-                "-pix_fmt", "yuv420p",
-                "-preset", "fast",
-                intermediate_video
-            ]
-            
-            # Then merge with audio
-            cmd2 = [
-                "ffmpeg",
-                "-y",
-                "-i", intermediate_video,
-                "-i", audio_path,
-                "-c:v", "copy",
-                "-c:a", "aac",
-                "-shortest",
-                out_path
-            ]
-            
-            try:
-                logger.info("Creating video without audio...")
-                subprocess.run(cmd1, check=True, capture_output=True, text=True)
-                
-                logger.info("Merging with audio...")
-                subprocess.run(cmd2, check=True, capture_output=True, text=True)
-            except subprocess.CalledProcessError as e:
-                logger.error(f"FFmpeg error: {e.stderr}")
-                raise RuntimeError(f"Video creation failed: {e.stderr}")
-        else:
-            # Create video without audio
-            cmd = [
-                "ffmpeg",
-                "-y",
-                "-framerate", str(fps),
-                "-i", tmp_pattern,
-                "-c:v", "libx264",
-                "-pix_fmt", "yuv420p",
-                "-preset", "fast",
-                out_path
-            ]
-            try:
-                subprocess.run(cmd, check=True, capture_output=True, text=True)
-            except subprocess.CalledProcessError as e:
-                logger.error(f"FFmpeg error: {e.stderr}")
-                raise RuntimeError(f"Video creation failed: {e.stderr}")
-    
+
+    mode, size, frames = plan_frames(frames)
+    logger.debug(f"Streaming {len(frames)} frames to ffmpeg as {mode} ({size[0]}x{size[1]})")
+
+    audio = probe_audio(audio_path) if audio_path and os.path.exists(audio_path) else None
+    if audio is not None and audio["duration"] <= 0:
+        # e.g. a TTS engine that wrote an empty WAV: make the slideshow without it
+        logger.warning(f"Ignoring empty narration {audio_path}")
+        audio = None
+
+    if audio is not None:
+        fps, repeats = pace_frames(len(frames), fps, audio["duration"])
+        cmd = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            *_frame_input_args(mode, size, fps),
+            "-i", audio_path,
+            "-map", "0:v", "-map", "1:a",
+            *X264_ARGS,
+            # MP4 carries AAC and MP3 as they are; anything else (e.g. WAV from TTS) is encoded to AAC
+            "-c:a", "copy" if audio["codec"] in MP4_AUDIO_CODECS else "aac",
+            out_path,
+        ]
+        run_ffmpeg_with_input(cmd, _frame_chunks(mode, size, frames, repeats))
+    else:
+        # Create video without audio
+        cmd = ["ffmpeg", "-y", "-loglevel", "error", *_frame_input_args(mode, size, fps), *X264_ARGS, out_path]
+        run_ffmpeg_with_input(cmd, _frame_chunks(mode, size, frames))
+
     if not os.path.exists(out_path):
         raise RuntimeError(f"Video file was not created: {out_path}")
-    
-    return out_path
\ No newline at end of file
+
+    return out_path
@@ -0,0 +1,295 @@
+"""Local (PIL) supplementary visual generation off the event loop.
+
+The source image is decoded once in the server process and its RGB pixels
+are copied into a ``multiprocessing.shared_memory`` block. Each variant is
+rendered by a worker of a process pool that maps that block directly, so
+the pixels are never pickled and the variants run in parallel on all cores.
+Variant parameters are drawn up front in the server process from a seed
+derived from the image content hash and the variant index; workers only
+crop, resize, enhance and encode. Output files are named after a key of
+source hash + transform spec, so repeat requests reuse stored outputs.
+
+The source is decoded at a working resolution (``VISUALS_WORKING_SIZE`` px on
+the long edge; JPEGs are DCT-scaled while decoding) and every variant is
+derived from that shared proxy. Outputs are ``VISUALS_OUTPUT_SIZE`` px on the
+long edge, keeping the source aspect and never upscaling past the original.
+
+``VISUALS_WORKERS`` sets the pool size (default: CPU count, at most 4);
+``0`` renders in the server's thread pool instead of separate processes.
+
+Files are encoded with the ``encoding`` presets ``VISUALS_PRESET`` (default
+``etsy-hero``) and, for background-removed cutouts, ``VISUALS_CUTOUT_PRESET``
+(default ``transparent``).
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+
+from . import filters
+from .encoding import encode, get_preset
+from .cache import make_key, sha256_file
+from .storage import get_store
+
+logger = logging.getLogger(__name__)
+
+VISUALS_WORKERS = int(os.getenv("VISUALS_WORKERS", str(min(4, os.cpu_count() or 1))))
+VISUALS_OUTPUT_SIZE = int(os.getenv("VISUALS_OUTPUT_SIZE", "1024"))
+# Headroom above the output size so the random crops are still downscaled
+VISUALS_WORKING_SIZE = int(os.getenv("VISUALS_WORKING_SIZE", str(max(1536, VISUALS_OUTPUT_SIZE))))
+VISUALS_PRESET = os.getenv("VISUALS_PRESET", "etsy-hero")
+VISUALS_CUTOUT_PRESET = os.getenv("VISUALS_CUTOUT_PRESET", "transparent")
+# Bump when rendering changes so previously stored variants are not reused
+VARIANTS_VERSION = "1"
+
+_counts = {"cached": 0, "rendered": 0}
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def get_pool() -> ProcessPoolExecutor | None:
+    """The shared worker pool, created on first use (None when VISUALS_WORKERS is 0)."""
+    global _pool
+    if _pool is None and VISUALS_WORKERS > 0:
+        # spawn: forking a process with a running event loop and threads is unsafe
+        _pool = ProcessPoolExecutor(max_workers=VISUALS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def variant_seed(source_hash: str, index: int, salt=None) -> int:
+    """Seed for variant `index` of an image: same image (+ salt) gives the same variants."""
+    return int(make_key("variant-seed", source_hash, index, salt)[:16], 16)
+
+
+def plan_variant(rng: random.Random) -> dict:
+    """Random crop box (as fractions of the image) and enhancement factors for one variant."""
+    box = (rng.uniform(0, 0.25), rng.uniform(0, 0.25), 1 - rng.uniform(0, 0.25), 1 - rng.uniform(0, 0.25))
+    enhance = {}
+    for name in ("brightness", "contrast", "saturation"):
+        if rng.random() > 0.5:
+            enhance[name] = round(rng.uniform(0.8, 1.2), 4)
+    return {"box": tuple(round(v, 4) for v in box), "enhance": enhance}
+
+
+def variant_key(source_hash: str, plan: dict, output_size: int, preset: str = VISUALS_PRESET) -> str:
+    """Derivative key: source content + transform spec (the seeded plan and output settings)."""
+    spec = json.dumps({"plan": plan, "output": output_size, "working": VISUALS_WORKING_SIZE, "encoding": get_preset(preset).spec()}, sort_keys=True)
+    return make_key("variant", VARIANTS_VERSION, source_hash, spec)
+
+
+def fit_size(size: tuple, long_edge: int | None) -> tuple:
+    """`size` scaled down so its long edge is at most `long_edge` (aspect kept)."""
+    width, height = size
+    if not long_edge or max(width, height) <= long_edge:
+        return width, height
+    scale = long_edge / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def load_source(path: str, working_size: int | None = None) -> tuple:
+    """Decode `path` as RGB at (about) `working_size` px, flattening any transparency onto white.
+
+    Returns `(proxy, original_size)`.
+    """
+    with Image.open(path) as img:
+        original = img.size
+        target = fit_size(original, working_size)
+        if img.format == "JPEG" and target != original:
+            # DCT scaling: decode at 1/2, 1/4 or 1/8 of full size, never below target
+            img.draft("RGB", target)
+        img.load()
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            rgba = img.convert("RGBA")
+            proxy = Image.new("RGB", rgba.size, (255, 255, 255))
+            proxy.paste(rgba, mask=rgba.getchannel("A"))
+        else:
+            proxy = img.convert("RGB")
+    if proxy.size != target:
+        proxy = proxy.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    return proxy, original
+
+
+def render_variant(img: Image.Image, plan: dict, out_size: tuple | None = None) -> Image.Image:
+    left, top, right, bottom = plan["box"]
+    box = (round(left * img.width), round(top * img.height), max(round(right * img.width), 1), max(round(bottom * img.height), 1))
+    variant = img.crop(box).resize(out_size or img.size, Image.Resampling.LANCZOS)
+    return filters.enhance(variant, **plan["enhance"])
+
+
+def _render_to_file(shm_name: str, size: tuple, plan: dict, out_size: tuple, output_path: str, preset: str) -> str:
+    """Worker entry point: render one variant from the pixels in shared memory and encode it."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        src = Image.frombuffer("RGB", size, shm.buf, "raw", "RGB", 0, 1)
+        variant = render_variant(src, plan, out_size)
+        # drop every view of the buffer before closing the mapping
+        del src
+        save_encoded(variant, output_path, preset)
+    finally:
+        shm.close()
+    return output_path
+
+
+def _render_to_buffer(shm_name: str, size: tuple, plan: dict, out_size: tuple, dst_name: str, offset: int):
+    """Worker entry point: render one variant and leave its raw RGB pixels in `dst_name` at `offset`."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    dst = shared_memory.SharedMemory(name=dst_name)
+    try:
+        src = Image.frombuffer("RGB", size, shm.buf, "raw", "RGB", 0, 1)
+        data = render_variant(src, plan, out_size).tobytes()
+        del src
+        dst.buf[offset:offset + len(data)] = data
+    finally:
+        shm.close()
+        dst.close()
+
+
+def save_encoded(img: Image.Image, path: str, preset: str):
+    """Encode with `preset` and store via the blob store; the name appears only once fully written."""
+    get_store(path).put_bytes(encode(img, preset).data, path)
+
+
+def _render_inline(img: Image.Image, plans: list, out_size: tuple, paths: list | None = None, preset: str = VISUALS_PRESET) -> list:
+    variants = [render_variant(img, plan, out_size) for plan in plans]
+    if paths is None:
+        return variants
+    for variant, path in zip(variants, paths):
+        save_encoded(variant, path, preset)
+    return paths
+
+
+def _share_pixels(img: Image.Image) -> shared_memory.SharedMemory:
+    data = img.tobytes()
+    shm = shared_memory.SharedMemory(create=True, size=len(data))
+    shm.buf[:len(data)] = data
+    return shm
+
+
+async def render_variants(img: Image.Image, plans: list, out_size: tuple, paths: list | None = None, preset: str = VISUALS_PRESET) -> list:
+    """Render one variant per plan, in the process pool when there is one.
+
+    With `paths` the variants are encoded there with `preset` and the paths are
+    returned; otherwise the rendered images are returned in memory (their
+    pixels come back from the workers through shared memory, not pickling).
+    """
+    pool = get_pool()
+    if pool is None:
+        return await run_in_threadpool(_render_inline, img, plans, out_size, paths, preset)
+
+    src = await run_in_threadpool(_share_pixels, img)
+    dst = None
+    try:
+        if paths is not None:
+            futures = [pool.submit(_render_to_file, src.name, img.size, plan, out_size, path, preset) for plan, path in zip(plans, paths)]
+            return list(await asyncio.gather(*(asyncio.wrap_future(f) for f in futures)))
+        frame = out_size[0] * out_size[1] * 3
+        dst = shared_memory.SharedMemory(create=True, size=frame * len(plans))
+        futures = [pool.submit(_render_to_buffer, src.name, img.size, plan, out_size, dst.name, i * frame) for i, plan in enumerate(plans)]
+        await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        return [Image.frombytes("RGB", out_size, bytes(dst.buf[i * frame:(i + 1) * frame])) for i in range(len(plans))]
+    except BrokenProcessPool:
+        # a worker died (OOM kill etc.): start a fresh pool next time, render this request here
+        logger.exception("Visuals process pool broke; rendering in-process")
+        shutdown_pool()
+        return await run_in_threadpool(_render_inline, img, plans, out_size, paths, preset)
+    finally:
+        for shm in (src, dst):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+
+def write_outputs(variants: list, matted: list, flat_paths: list, cutout_paths: list, preset: str = VISUALS_PRESET, cutout_preset: str = VISUALS_CUTOUT_PRESET) -> list:
+    """Encode the final files: `cutout_preset` for matted variants, `preset` where matting was skipped or failed."""
+    paths = []
+    for variant, cutout, flat_path, cutout_path in zip(variants, matted, flat_paths, cutout_paths):
+        if isinstance(cutout, Image.Image):
+            save_encoded(cutout, cutout_path, cutout_preset)
+            paths.append(cutout_path)
+            continue
+        if isinstance(cutout, Exception):
+            logger.error("Background removal failed for %s: %r", os.path.basename(flat_path), cutout)
+        save_encoded(variant, flat_path, preset)
+        paths.append(flat_path)
+    return paths
+
+
+async def generate_variants(image_path: str, outdir: str, count: int = 5, output_size: int | None = None, matte=None, matte_name: str = "matte", seed=None,
+                            preset: str | None = None, cutout_preset: str | None = None) -> list:
+    """Render `count` seeded variants of `image_path` into `outdir`; returns their paths.
+
+    Variant `i` is seeded from the image content hash, `i` and `seed`, and its
+    file is named after a key of source hash + transform spec, so a repeat
+    request finds the existing files (the cutout, or the flat fallback written
+    when matting failed) and returns them without decoding or encoding
+    anything. Variants are `output_size` px (default
+    VISUALS_OUTPUT_SIZE) on the long edge, encoded with `preset` (default
+    VISUALS_PRESET).
+
+    Without `matte` they are encoded straight away by the workers. With
+    `matte` (a batch function from a list of PIL images to a list of RGBA
+    images or exceptions, e.g. `image_utils.remove_background_batch`;
+    `matte_name` identifies it in the cutout keys) they stay in memory through
+    matting and only the final cutouts (`cutout_preset`, default
+    VISUALS_CUTOUT_PRESET) are written.
+    """
+    source_hash = await run_in_threadpool(sha256_file, image_path)
+    long_edge = output_size or VISUALS_OUTPUT_SIZE
+    plans = [plan_variant(random.Random(variant_seed(source_hash, i, seed))) for i in range(count)]
+    preset = preset or VISUALS_PRESET
+    cutout_preset = cutout_preset or VISUALS_CUTOUT_PRESET
+    flat_ext, cutout_ext = get_preset(preset).extension, get_preset(cutout_preset).extension
+    keys = [variant_key(source_hash, plan, long_edge, preset) for plan in plans]
+    flat_paths = [os.path.join(outdir, f"variant_{key[:24]}{flat_ext}") for key in keys]
+    cutout_spec = json.dumps(get_preset(cutout_preset).spec(), sort_keys=True)
+    cutout_paths = [os.path.join(outdir, f"variant_{make_key(key, 'cutout', matte_name, cutout_spec)[:24]}{cutout_ext}") for key in keys]
+    if matte is None:
+        wanted = flat_paths
+    else:
+        # a variant whose matting was unavailable or failed was stored flat; reuse that too
+        wanted = [flat if not os.path.exists(cutout) and os.path.exists(flat) else cutout for flat, cutout in zip(flat_paths, cutout_paths)]
+    missing = [i for i, path in enumerate(wanted) if not os.path.exists(path)]
+    _counts["cached"] += count - len(missing)
+    _counts["rendered"] += len(missing)
+    if not missing:
+        return wanted
+
+    img, original = await run_in_threadpool(load_source, image_path, VISUALS_WORKING_SIZE)
+    out_size = fit_size(original, long_edge)
+    todo = [plans[i] for i in missing]
+    if matte is None:
+        await render_variants(img, todo, out_size, [flat_paths[i] for i in missing], preset)
+        return wanted
+
+    variants = await render_variants(img, todo, out_size)
+    try:
+        matted = await run_in_threadpool(matte, variants)
+    except ImportError:
+        logger.info("rembg is not installed; skipping background removal")
+        matted = [None] * len(variants)
+    written = await run_in_threadpool(
+        write_outputs, variants, matted, [flat_paths[i] for i in missing], [cutout_paths[i] for i in missing], preset, cutout_preset
+    )
+    paths = list(wanted)
+    for i, path in zip(missing, written):
+        paths[i] = path
+    return paths
+
+
+def stats() -> dict:
+    return dict(_counts)
@@ -0,0 +1,100 @@
+"""Benchmark: old per-pixel/per-call filters vs `app.filters` on a 12MP image.
+
+"before" reproduces the previous implementations from
+`scripts/generate_supplementary_visuals.py`: sepia as a Python loop over
+every pixel, the vignette as dozens of ellipses plus a large blur, and the
+overlay reloading its font on every call. "after" is `app.filters`.
+
+The "copy" row is the floor for any filter that returns a new full-size
+image: one pass over the pixels. The vignette is a single composite, so it
+cannot get much below that; only sepia (a Python loop before) can show a
+speedup far beyond it.
+
+Usage: python scripts/bench_filters.py [--width 4000 --height 3000] [--overlays 200]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont  # noqa: E402
+from app import filters  # noqa: E402
+
+
+def old_sepia(im):
+    gray = im.convert("L")
+    sep = Image.new("RGB", im.size)
+    pixels = sep.load()
+    gpx = gray.load()
+    for y in range(im.size[1]):
+        for x in range(im.size[0]):
+            v = gpx[x, y]
+            pixels[x, y] = (int(v * 0.95), int(v * 0.85), int(v * 0.65))
+    return sep
+
+
+def old_vignette(im):
+    width, height = im.size
+    vign = Image.new("L", im.size, 0)
+    draw = ImageDraw.Draw(vign)
+    maxrad = min(width, height)
+    for i in range(0, maxrad // 2, 10):
+        draw.ellipse((i, i, width - i, height - i), fill=255 - int(255 * (i / (maxrad // 2))))
+    vign = vign.filter(ImageFilter.GaussianBlur(radius=max(1, width // 30)))
+    im_rgb = im.convert("RGB")
+    im_rgb.putalpha(vign)
+    bg = Image.new("RGB", im.size, (10, 10, 10))
+    bg.paste(im_rgb, mask=im_rgb.split()[3])
+    return bg
+
+
+def old_overlay(im, text):
+    draw = ImageDraw.Draw(im)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", size=max(16, im.size[0] // 32))
+    except Exception:
+        font = ImageFont.load_default()
+    bbox = draw.textbbox((0, 0), text, font=font)
+    x = im.size[0] - (bbox[2] - bbox[0]) - 10
+    y = im.size[1] - (bbox[3] - bbox[1]) - 10
+    draw.text((x, y), text, fill=(255, 255, 255), font=font)
+    return im
+
+
+def timed(fn, repeat=1):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--overlays", type=int, default=200, help="overlay calls on a 1024px image")
+    args = parser.parse_args()
+
+    im = Image.radial_gradient("L").resize((args.width, args.height)).convert("RGB")
+    small = im.resize((1024, 768))
+    cases = [
+        ("sepia", lambda: old_sepia(im), lambda: filters.sepia(im), 1, 3),
+        ("vignette", lambda: old_vignette(im), lambda: filters.vignette(im), 1, 3),
+        ("overlay x%d" % args.overlays,
+         lambda: [old_overlay(small.copy(), "Handmade - Size: L") for _ in range(args.overlays)],
+         lambda: [filters.overlay_text(small, "Handmade - Size: L") for _ in range(args.overlays)], 1, 1),
+    ]
+    print(f"image {args.width}x{args.height} ({args.width * args.height / 1e6:.1f} MP), one full copy: {timed(im.copy, 3) * 1000:.1f} ms")
+    print(f"{'filter':<14}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for name, before, after, rep_before, rep_after in cases:
+        t_before = timed(before, rep_before)
+        t_after = timed(after, rep_after)
+        print(f"{name:<14}{t_before * 1000:>14.1f}{t_after * 1000:>14.1f}{t_before / t_after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
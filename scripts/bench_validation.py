@@ -0,0 +1,55 @@
+"""Micro-benchmark: per-call metadata validation cost before/after the compiled registry.
+
+"before" is the old approach (`jsonschema.validate` with the module schema on
+every call); "after" is `app.validation.is_valid_metadata`, which uses
+validators compiled once at import plus a hand-written required-key check.
+
+Usage: python scripts/bench_validation.py [--n 500]
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from jsonschema import validate, ValidationError  # noqa: E402
+from app.validation import METADATA_SCHEMA, is_valid_metadata  # noqa: E402
+
+VALID = {
+    "title": "Stylish Ceramic Mug",
+    "bullets": ["Handmade", "Microwave safe", "12 oz capacity"],
+    "description": "A beautiful ceramic mug perfect for coffee lovers.",
+    "tags": ["ceramic", "mug", "kitchen"],
+    "attributes": {"color": "white", "material": "ceramic"},
+}
+MISSING_KEY = {"title": "No bullets", "description": "x"}
+
+
+def old_is_valid(obj):
+    try:
+        validate(instance=obj, schema=METADATA_SCHEMA)
+        return True, None
+    except ValidationError as e:
+        return False, str(e)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=500)
+    args = parser.parse_args()
+
+    cases = [
+        ("valid", lambda: old_is_valid(VALID), lambda: is_valid_metadata(VALID)),
+        ("valid/etsy", lambda: old_is_valid(VALID), lambda: is_valid_metadata(VALID, "etsy")),
+        ("missing key", lambda: old_is_valid(MISSING_KEY), lambda: is_valid_metadata(MISSING_KEY)),
+    ]
+    print(f"{'case':<14}{'before (us)':>14}{'after (us)':>14}{'speedup':>10}")
+    for name, before, after in cases:
+        t_before = min(timeit.repeat(before, number=args.n, repeat=3)) / args.n * 1e6
+        t_after = min(timeit.repeat(after, number=args.n, repeat=3)) / args.n * 1e6
+        print(f"{name:<14}{t_before:>14.2f}{t_after:>14.2f}{t_before / t_after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark: visual variants + background removal, disk round trip vs in-memory pipeline.
+
+"before" is the old flow: each variant is encoded to JPEG on disk, read back,
+decoded again for matting and written a second time as PNG. "after" is
+`app.visuals.generate_variants(..., matte=...)`, which keeps the variants as
+PIL images until the final PNGs are written.
+
+Matting uses rembg when it is installed (`--rembg`), otherwise a cheap
+threshold stand-in so the I/O difference is measured on its own.
+
+Usage: python scripts/bench_visuals_pipeline.py [--size 3000] [--runs 3] [--rembg]
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from PIL import Image, ImageDraw  # noqa: E402
+from app import visuals  # noqa: E402
+
+
+def threshold_matte(images):
+    """Stand-in for rembg: alpha from luminance (the sample has a light background)."""
+    out = []
+    for img in images:
+        cutout = img.convert("RGBA")
+        cutout.putalpha(img.convert("L").point(lambda v: 0 if v > 200 else 255))
+        out.append(cutout)
+    return out
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path))
+
+
+async def before(source: str, outdir: str, matte) -> list:
+    img, original = visuals.load_source(source, visuals.VISUALS_WORKING_SIZE)
+    out_size = visuals.fit_size(original, visuals.VISUALS_OUTPUT_SIZE)
+    plans = [visuals.plan_variant(random.Random(i)) for i in range(5)]
+    jpegs = [os.path.join(outdir, f"variant_{i}.jpg") for i in range(5)]
+    await visuals.render_variants(img, plans, out_size, jpegs)
+    outputs = []
+    for path in jpegs:
+        with open(path, "rb") as fh:
+            data = fh.read()
+        cutout = matte([Image.open(io.BytesIO(data))])[0]
+        buf = io.BytesIO()
+        cutout.save(buf, "PNG")
+        png = os.path.splitext(path)[0] + ".png"
+        with open(png, "wb") as fh:
+            fh.write(buf.getvalue())
+        outputs.append(png)
+    return outputs
+
+
+async def after(source: str, outdir: str, matte) -> list:
+    return await visuals.generate_variants(source, outdir, count=5, matte=matte)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=3000, help="long edge of the synthetic source photo")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--rembg", action="store_true", help="matte with rembg instead of the threshold stand-in")
+    args = parser.parse_args()
+
+    matte = threshold_matte
+    if args.rembg:
+        from app.image_utils import remove_background_batch, warmup_background_removal
+
+        warmup_background_removal()
+        matte = remove_background_batch
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.jpg")
+        w, h = args.size, args.size * 3 // 4
+        im = Image.new("RGB", (w, h), (235, 235, 230))
+        ImageDraw.Draw(im).ellipse((w // 4, h // 4, 3 * w // 4, 3 * h // 4), fill=(150, 60, 40))
+        im.save(source, quality=90)
+
+        print(f"{'pipeline':<10}{'wall (ms)':>12}{'written (KiB)':>16}")
+        for name, run in (("before", before), ("after", after)):
+            best, written = float("inf"), 0
+            for i in range(args.runs):
+                outdir = os.path.join(tmp, f"{name}_{i}")
+                os.makedirs(outdir)
+                start = time.perf_counter()
+                asyncio.run(run(source, outdir, matte))
+                best = min(best, time.perf_counter() - start)
+                written = _dir_bytes(outdir)
+            print(f"{name:<10}{best * 1000:>12.1f}{written / 1024:>16.1f}")
+    visuals.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Move existing uploads and outputs into the content-addressed blob store.
+
+Every regular file under the given directories is hashed; the first file with
+a given content becomes the blob (by hard-linking it, no copy), later files
+with the same content are replaced by links to that blob. Logical names do
+not change. Run once after upgrading; new files go through the store anyway.
+Each file is linked into the store on its own filesystem (see
+`app.storage.get_store`), unless `--blob-dir` forces one store.
+
+Usage: python scripts/dedupe_storage.py [--dry-run] [--gc] [dirs ...]
+       (default dirs: /data/uploads /data/outputs)
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.cache import sha256_file  # noqa: E402
+from app.storage import BlobStore, all_stores, get_store  # noqa: E402
+
+
+def migrate(store: BlobStore | None, roots: list, dry_run: bool = False) -> dict:
+    """Link every file under `roots` into `store` (None: the store on each file's filesystem)."""
+    files = linked = reclaimed = 0
+    seen = set()  # (store root, digest) stored during this run (a dry run creates no blobs)
+    fixed_store = store
+    for root in roots:
+        for dirpath, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                if os.path.islink(path) or not os.path.isfile(path):
+                    continue
+                files += 1
+                store = fixed_store or get_store(path)
+                digest = sha256_file(path)
+                blob = store.blob_path(digest)
+                if (store.root, digest) in seen or os.path.exists(blob):
+                    if os.path.exists(blob) and os.path.samefile(blob, path):
+                        continue
+                    # only the last name of a file frees its bytes
+                    if os.stat(path).st_nlink == 1:
+                        reclaimed += os.path.getsize(path)
+                    linked += 1
+                    if not dry_run:
+                        store.link(digest, path)
+                    continue
+                seen.add((store.root, digest))
+                if not dry_run:
+                    os.makedirs(os.path.dirname(blob), exist_ok=True)
+                    try:
+                        os.link(path, blob)
+                    except OSError:
+                        store.put_file(path, path)
+    return {"files": files, "linked": linked, "bytes_reclaimed": reclaimed}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dirs", nargs="*", default=["/data/uploads", "/data/outputs"])
+    parser.add_argument("--blob-dir", help="use this one store for every file (default: one per filesystem)")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be linked without changing anything")
+    parser.add_argument("--gc", action="store_true", help="afterwards delete blobs no file refers to")
+    args = parser.parse_args()
+
+    store = BlobStore(args.blob_dir) if args.blob_dir else None
+    result = migrate(store, args.dirs, dry_run=args.dry_run)
+    print(f"{result['files']} files, {result['linked']} duplicates {'to link' if args.dry_run else 'linked'}, "
+          f"{result['bytes_reclaimed'] / 1024 / 1024:.1f} MiB reclaimed")
+    if args.gc and not args.dry_run:
+        freed = sum(s.gc() for s in ([store] if store else all_stores()))
+        print(f"gc freed {freed / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
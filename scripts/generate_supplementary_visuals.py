@@ -1,100 +1,60 @@
 """Generate CPU-friendly supplementary visuals (fallback for ComfyUI) using PIL.
 
 Produces multiple stylized variants from an input image and saves frames for a short slideshow.
+Variants are encoded with an ``app.encoding`` preset (``--preset``); frames use ``video-frame``.
 """
 import argparse
 import json
 import os
+import sys
 from pathlib import Path
-from PIL import Image, ImageEnhance, ImageFilter, ImageDraw, ImageFont
+from PIL import Image, ImageFilter, ImageDraw
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.encoding import encode, get_preset  # noqa: E402
+from app.filters import enhance, overlay_text, sepia as apply_sepia, vignette as add_vignette  # noqa: E402
+from app.storage import get_store  # noqa: E402
 
 
 def ensure_outdir(path: Path):
     path.mkdir(parents=True, exist_ok=True)
 
 
-def apply_sepia(im: Image.Image) -> Image.Image:
-    gray = im.convert("L")
-    sep = Image.new("RGB", im.size)
-    pixels = sep.load()
-    gpx = gray.load()
-    for y in range(im.size[1]):
-        for x in range(im.size[0]):
-            v = gpx[x, y]
-            r = int(v * 0.95)
-            g = int(v * 0.85)
-            b = int(v * 0.65)
-            pixels[x, y] = (r, g, b)
-    return sep
-
-
-def add_vignette(im: Image.Image) -> Image.Image:
-    width, height = im.size
-    vign = Image.new("L", im.size, 0)
-    draw = ImageDraw.Draw(vign)
-    maxrad = min(width, height)
-    for i in range(0, maxrad//2, 10):
-        # avoid coordinates where y1 < y0 by bounding to min(width,height)
-        draw.ellipse((i, i, width - i, height - i), fill=255 - int(255 * (i / (maxrad//2))))
-    vign = vign.filter(ImageFilter.GaussianBlur(radius=max(1, width//30)))
-    im_rgb = im.convert("RGB")
-    im_rgb.putalpha(vign)
-    bg = Image.new("RGB", im.size, (10, 10, 10))
-    bg.paste(im_rgb, mask=im_rgb.split()[3])
-    return bg
-
-
-def overlay_text(im: Image.Image, text: str = "Sample Product", position: str = "bottom-right") -> Image.Image:
-    draw = ImageDraw.Draw(im)
-    try:
-        font = ImageFont.truetype("arial.ttf", size=max(16, im.size[0] // 32))
-    except Exception:
-        font = ImageFont.load_default()
-    # Compatible sizing across Pillow versions
-    try:
-        bbox = draw.textbbox((0, 0), text, font=font)
-        w = bbox[2] - bbox[0]
-        h = bbox[3] - bbox[1]
-    except Exception:
-        try:
-            w, h = font.getsize(text)
-        except Exception:
-            w, h = (len(text) * 6, 12)
-    padding = 10
-    x = im.size[0] - w - padding
-    y = im.size[1] - h - padding
-    draw.rectangle(((x - 6, y - 6), (x + w + 6, y + h + 6)), fill=(0, 0, 0, 120))
-    draw.text((x, y), text, fill=(255, 255, 255), font=font)
-    return im
-
-
-def generate_variants(input_path: Path, outdir: Path, title: str = "Handmade Product", frames: int = 5) -> list:
+def save(im: Image.Image, path: Path, preset: str) -> Path:
+    """Encode `im` with `preset` into the blob store; the suffix of `path` is replaced by the preset's.
+
+    The name is swapped to the new blob, never rewritten in place: after
+    `dedupe_storage.py` the old file shares its inode with other names.
+    """
+    path = path.with_suffix(get_preset(preset).extension)
+    get_store(str(path)).put_bytes(encode(im, preset).data, str(path))
+    return path
+
+
+def generate_variants(input_path: Path, outdir: Path, title: str = "Handmade Product", frames: int = 5, preset: str = "etsy-hero") -> list:
     ensure_outdir(outdir)
     im = Image.open(input_path).convert("RGB")
     outputs = []
 
     # Variant 1: color boosted
-    im1 = ImageEnhance.Color(im).enhance(1.4)
-    im1 = ImageEnhance.Contrast(im1).enhance(1.1)
-    im1 = overlay_text(im1.copy(), title)
-    p1 = outdir / (input_path.stem + "_colorboost.jpg")
-    im1.save(p1, quality=90)
+    im1 = enhance(im, contrast=1.1, saturation=1.4)
+    im1 = overlay_text(im1, title)
+    p1 = save(im1, outdir / (input_path.stem + "_colorboost.jpg"), preset)
     outputs.append(str(p1))
 
     # Variant 2: sepia + vignette
     im2 = apply_sepia(im)
     im2 = add_vignette(im2)
-    p2 = outdir / (input_path.stem + "_sepia_vignette.jpg")
-    im2.save(p2, quality=90)
+    p2 = save(im2, outdir / (input_path.stem + "_sepia_vignette.jpg"), preset)
     outputs.append(str(p2))
 
     # Variant 3: stylized blur + border
     im3 = im.filter(ImageFilter.GaussianBlur(radius=2))
-    im3 = ImageEnhance.Color(im3).enhance(1.2)
+    im3 = enhance(im3, saturation=1.2)
     border = Image.new("RGB", (im3.size[0] + 20, im3.size[1] + 20), (240, 238, 235))
     border.paste(im3, (10, 10))
-    p3 = outdir / (input_path.stem + "_styled_frame.jpg")
-    border.save(p3, quality=90)
+    p3 = save(border, outdir / (input_path.stem + "_styled_frame.jpg"), preset)
     outputs.append(str(p3))
 
     # Sequence frames for simple slideshow (scale + slight rotate)
@@ -109,8 +69,7 @@ def generate_variants(input_path: Path, outdir: Path, title: str = "Handmade Pro
         left = (f.width - im.width) // 2
         top = (f.height - im.height) // 2
         f = f.crop((left, top, left + im.width, top + im.height))
-        fn = outdir / f"{input_path.stem}_frame_{i:02d}.jpg"
-        f.save(fn, quality=85)
+        fn = save(f, outdir / f"{input_path.stem}_frame_{i:02d}.jpg", "video-frame")
         frame_paths.append(str(fn))
     outputs.extend(frame_paths)
 
@@ -122,6 +81,7 @@ def main():
     parser.add_argument("--input", type=str, default=None, help="Input image path (defaults to sample created)")
     parser.add_argument("--outdir", type=str, default="outputs/supplementary", help="Output directory")
     parser.add_argument("--title", type=str, default="Handmade Product", help="Overlay title text")
+    parser.add_argument("--preset", type=str, default="etsy-hero", help="Encoding preset for the variants (see app/encoding.py)")
     args = parser.parse_args()
 
     outdir = Path(args.outdir)
@@ -138,7 +98,7 @@ def main():
     else:
         input_path = Path(args.input)
 
-    paths = generate_variants(input_path, outdir, title=args.title)
+    paths = generate_variants(input_path, outdir, title=args.title, preset=args.preset)
     print(json.dumps({"generated": paths}, indent=2))
 
 
@@ -82,7 +82,10 @@ form.addEventListener('submit', async (e) =>{
   hideSpinner();
 });
 
-function renderGallery(list){ const gallery = document.getElementById('visuals'); gallery.innerHTML = ''; list.forEach((u,i)=>{ const fig = document.createElement('figure'); const img = document.createElement('img'); img.src = u.startsWith('/') ? u : ('/' + u.replaceAll('\\\\','/')); img.alt = `visual-${i}`; img.addEventListener('click', ()=>openModal(img.src)); const cap = document.createElement('figcaption'); cap.innerHTML = `<span>Visual ${i+1}</span> <a href="${img.src}" download>Download</a>`; fig.appendChild(img); fig.appendChild(cap); gallery.appendChild(fig); }) }
+// Gallery tiles load a small server-side derivative; the modal and download keep the full-size file
+function thumbUrl(src, w, h){ return /^\/(uploads|outputs)\//.test(src) ? `/api/derivative?src=${encodeURIComponent(src)}&w=${w}&h=${h}&fit=cover&format=webp` : src }
+
+function renderGallery(list){ const gallery = document.getElementById('visuals'); gallery.innerHTML = ''; list.forEach((u,i)=>{ const fig = document.createElement('figure'); const img = document.createElement('img'); const full = u.startsWith('/') ? u : ('/' + u.replaceAll('\\\\','/')); img.src = thumbUrl(full, 400, 280); img.loading = 'lazy'; img.alt = `visual-${i}`; img.addEventListener('click', ()=>openModal(full)); const cap = document.createElement('figcaption'); cap.innerHTML = `<span>Visual ${i+1}</span> <a href="${full}" download>Download</a>`; fig.appendChild(img); fig.appendChild(cap); gallery.appendChild(fig); }) }
 
 genVisualsBtn.addEventListener('click', async ()=>{
   if(!lastImagePath){ setStatus('No image available to generate visuals', true); showToast('No uploaded image'); return; }
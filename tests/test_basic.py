@@ -29,3 +29,10 @@ def test_generate_metadata_basic():
     assert "tags" in payload and isinstance(payload["tags"], list)
     assert "attributes" in payload and isinstance(payload["attributes"], dict)
     assert "image_path" in payload
+
+
+def test_stats_reports_metadata_cache():
+    res = client.get("/api/stats")
+    assert res.status_code == 200
+    stats = res.json()["metadata_cache"]
+    assert {"hits_memory", "hits_disk", "misses", "disk_bytes"} <= set(stats)
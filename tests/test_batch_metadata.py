@@ -0,0 +1,50 @@
+import io
+import json
+import pytest
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+from app.main import app
+from PIL import Image
+
+client = TestClient(app)
+
+
+def _jpeg(color, size=(120, 90)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color=color).save(buf, format="JPEG")
+    buf.seek(0)
+    return buf
+
+
+def test_batch_streams_ndjson_per_item():
+    # An already-uploaded image can be referenced instead of re-sent
+    first = client.post("/generate-metadata", files={"file": ("ref.jpg", _jpeg((10, 20, 30)), "image/jpeg")}).json()
+
+    files = [
+        ("files", ("a.jpg", _jpeg((200, 10, 10)), "image/jpeg")),
+        ("files", ("b.jpg", _jpeg((10, 200, 10)), "image/jpeg")),
+        ("files", ("notes.txt", io.BytesIO(b"not an image"), "text/plain")),
+    ]
+    items = [
+        {"category": "Mug", "platform": "etsy"},
+        {"image_filename": first["image_filename"], "category": "Vase", "tone": "playful"},
+    ]
+    res = client.post("/api/generate-metadata/batch", files=files, data={"items": json.dumps(items), "platform": "ebay"})
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = [json.loads(l) for l in res.text.splitlines() if l.strip()]
+    by_index = {l["index"]: l for l in lines}
+    assert sorted(by_index) == [0, 1, 2, 3]
+
+    assert by_index[0]["ok"] and by_index[0]["result"]["category"] == "Mug"
+    assert by_index[0]["result"]["platform"] == "etsy"
+    ref = by_index[1]["result"]
+    assert ref["image_filename"] == first["image_filename"] and ref["tone"] == "playful"
+    assert by_index[2]["ok"] and by_index[2]["result"]["platform"] == "ebay"
+    assert not by_index[3]["ok"] and "image" in by_index[3]["error"]
+
+
+def test_batch_rejects_bad_items():
+    res = client.post("/api/generate-metadata/batch", data={"items": "{not json"})
+    assert res.status_code == 400
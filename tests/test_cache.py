@@ -0,0 +1,42 @@
+import os
+import time
+from app.cache import TieredCache, DiskCache, make_key
+
+
+def test_tiered_cache_memory_and_disk_hits(tmp_path):
+    cache = TieredCache(str(tmp_path / "meta"), max_entries=4)
+    key = make_key("abc123", "Mug", "etsy", "professional")
+    assert cache.get(key) is None
+
+    cache.put(key, {"title": "Mug", "bullets": ["a"]})
+    value = cache.get(key)
+    assert value == {"title": "Mug", "bullets": ["a"]}
+    # Callers get a copy they can mutate without poisoning the cache
+    value["image_filename"] = "x.jpg"
+    assert "image_filename" not in cache.get(key)
+
+    # A fresh process (empty memory tier) is served from disk
+    fresh = TieredCache(str(tmp_path / "meta"), max_entries=4)
+    assert fresh.get(key)["title"] == "Mug"
+    stats = fresh.stats()
+    assert stats["hits_disk"] == 1 and stats["misses"] == 0
+    assert cache.stats()["hits_memory"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_disk_cache_ttl_and_size_eviction(tmp_path):
+    disk = DiskCache(str(tmp_path / "d"), ttl_seconds=60, max_bytes=250)
+    for i in range(5):
+        disk.put(make_key(i), b"x" * 100)
+        # ensure distinct mtimes so eviction order is deterministic
+        old = time.time() - (10 - i)
+        os.utime(disk.path_for(make_key(i)), (old, old))
+    assert disk.total_bytes <= 250
+    assert disk.get(make_key(4)) is not None
+    assert disk.get(make_key(0)) is None
+    assert disk.evictions >= 3
+
+    expired = DiskCache(str(tmp_path / "e"), ttl_seconds=1)
+    path = expired.put("ffff", b"data")
+    os.utime(path, (time.time() - 10, time.time() - 10))
+    assert expired.get("ffff") is None
+    assert not os.path.exists(path)
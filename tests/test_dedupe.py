@@ -0,0 +1,96 @@
+import asyncio
+import base64
+import io
+import uuid
+import pytest
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.dedupe import IdempotencyConflict, IdempotencyStore, SingleFlight
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": 42}
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(r == {"value": 42} for r in results)
+    # every caller gets its own copy
+    results[0]["value"] = 0
+    assert results[1]["value"] == 42
+    assert flight.stats()["coalesced"] == 4 and flight.stats()["in_flight"] == 0
+
+
+def test_single_flight_shares_errors_and_reruns_afterwards():
+    flight = SingleFlight()
+    calls = []
+
+    async def boom():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("nope")
+
+    async def main():
+        return await asyncio.gather(flight.do("k", boom), flight.do("k", boom), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in asyncio.run(main()))
+    asyncio.run(main())
+    assert len(calls) == 2
+
+
+def test_idempotency_store_replays_and_detects_conflicts():
+    store = IdempotencyStore(ttl_seconds=60)
+    assert store.get("a", "fp1") is None
+    store.put("a", {"ok": True}, "fp1")
+    assert store.get("a", "fp1") == {"ok": True}
+    with pytest.raises(IdempotencyConflict):
+        store.get("a", "fp2")
+    expired = IdempotencyStore(ttl_seconds=-1)
+    expired.put("a", {"ok": True})
+    assert expired.get("a") is None
+
+
+def test_generate_metadata_replays_idempotent_retry():
+    key = uuid.uuid4().hex
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), (30, 120, 200)).save(buf, format="JPEG")
+
+    first = client.post("/generate-metadata", files={"file": ("a.jpg", buf.getvalue(), "image/jpeg")}, headers={"Idempotency-Key": key})
+    retry = client.post("/generate-metadata", files={"file": ("a.jpg", buf.getvalue(), "image/jpeg")}, headers={"Idempotency-Key": key})
+    assert first.status_code == retry.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    # the retry did not store a second upload
+    assert retry.json()["image_filename"] == first.json()["image_filename"]
+    # the same key with other options or another image is a conflict, not a replay
+    other_tone = client.post("/generate-metadata", files={"file": ("a.jpg", buf.getvalue(), "image/jpeg")}, data={"tone": "playful"}, headers={"Idempotency-Key": key})
+    other_image = client.post("/generate-metadata", files={"file": ("b.jpg", buf.getvalue() + b"\0", "image/jpeg")}, headers={"Idempotency-Key": key})
+    assert other_tone.status_code == other_image.status_code == 422
+
+
+def test_generate_video_rejects_reused_key_with_other_payload():
+    key = uuid.uuid4().hex
+    frame = io.BytesIO()
+    Image.new("RGB", (32, 32), (200, 50, 50)).save(frame, format="PNG")
+    data_url = "data:image/png;base64," + base64.b64encode(frame.getvalue()).decode()
+
+    first = client.post("/api/generate-video", json={"frames": [data_url]}, headers={"Idempotency-Key": key})
+    if first.status_code != 200:
+        pytest.skip("video encoding unavailable")
+    retry = client.post("/api/generate-video", json={"frames": [data_url]}, headers={"Idempotency-Key": key})
+    assert retry.json() == first.json()
+    other = client.post("/api/generate-video", json={"frames": [data_url, data_url]}, headers={"Idempotency-Key": key})
+    assert other.status_code == 422
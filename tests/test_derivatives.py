@@ -0,0 +1,73 @@
+import io
+import os
+import pytest
+from PIL import Image
+from app.derivatives import DerivativeCache, parse_spec, render_derivative
+
+
+def _photo(path, size=(1600, 1200)):
+    Image.effect_noise(size, 40).convert("RGB").save(path, quality=92)
+    return str(path)
+
+
+def test_parse_spec_rejects_bad_parameters():
+    assert parse_spec(200, None, "contain", "JPG")["format"] == "jpeg"
+    for args in [(None, None), (200, None, "cover"), (200, 100, "stretch"), (200, 100, "contain", "gif"), (0, 100), (200, 100, "contain", "webp", 0)]:
+        with pytest.raises(ValueError):
+            parse_spec(*args)
+
+
+@pytest.mark.parametrize("fit,expected", [("contain", (200, 150)), ("cover", (200, 200)), ("fill", (200, 200))])
+def test_render_fits_the_box(tmp_path, fit, expected):
+    src = _photo(tmp_path / "src.jpg")
+    data = render_derivative(src, parse_spec(200, 200, fit, "jpeg"))
+    with Image.open(io.BytesIO(data)) as out:
+        assert out.format == "JPEG"
+        assert out.size == expected
+
+
+def test_webp_keeps_alpha_and_single_dimension_keeps_aspect(tmp_path):
+    src = tmp_path / "cutout.png"
+    Image.new("RGBA", (400, 200), (255, 0, 0, 0)).save(src)
+    with Image.open(io.BytesIO(render_derivative(str(src), parse_spec(100, None, fmt="webp")))) as out:
+        assert out.format == "WEBP"
+        assert out.size == (100, 50)
+        assert out.mode == "RGBA"
+
+
+def test_cache_renders_once_and_is_much_smaller(tmp_path):
+    src = _photo(tmp_path / "src.jpg")
+    cache = DerivativeCache(str(tmp_path / "cache"))
+    spec = parse_spec(200, 200, "cover", "webp")
+    first = cache.get_or_render(src, spec)
+    assert cache.get_or_render(src, spec) == first
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 1
+    assert len(first) * 10 < os.path.getsize(src)
+
+    # a replaced source (new inode/mtime) gets a fresh derivative
+    _photo(tmp_path / "other.jpg", (800, 800))
+    os.replace(tmp_path / "other.jpg", src)
+    cache.get_or_render(src, spec)
+    assert cache.stats()["misses"] == 2
+
+
+def test_derivative_endpoint_serves_cacheable_thumbnails(tmp_path):
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    from app import main
+
+    name = "derivative_test.jpg"
+    _photo(os.path.join(main.UPLOAD_DIR, name))
+    try:
+        client = TestClient(main.app)
+        r = client.get("/api/derivative", params={"src": f"/uploads/{name}", "w": 200, "h": 200, "fit": "cover"})
+        assert r.status_code == 200
+        assert r.headers["content-type"] == "image/webp"
+        assert "max-age" in r.headers["cache-control"]
+        assert client.get("/api/derivative", params={"src": f"/uploads/{name}", "w": 200, "h": 200, "fit": "cover"},
+                          headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+
+        assert client.get("/api/derivative", params={"src": "/uploads/../../etc/passwd", "w": 10}).status_code == 404
+        assert client.get("/api/derivative", params={"src": f"/uploads/{name}", "w": 10, "format": "gif"}).status_code == 400
+    finally:
+        os.unlink(os.path.join(main.UPLOAD_DIR, name))
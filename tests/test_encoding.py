@@ -0,0 +1,69 @@
+import io
+
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+from app.encoding import PRESETS, Preset, encode, get_preset, psnr
+
+
+def _photo(size=(800, 600)):
+    im = Image.effect_noise(size, 60).convert("RGB").filter(ImageFilter.GaussianBlur(1))
+    ImageDraw.Draw(im).ellipse((size[0] // 4, size[1] // 4, 3 * size[0] // 4, 3 * size[1] // 4), fill=(150, 60, 40))
+    return im
+
+
+def _cutout(size=(800, 600)):
+    im = _photo(size).convert("RGBA")
+    alpha = Image.new("L", size, 0)
+    ImageDraw.Draw(alpha).ellipse((size[0] // 4, size[1] // 4, 3 * size[0] // 4, 3 * size[1] // 4), fill=255)
+    im.putalpha(alpha)
+    return im
+
+
+def test_unknown_preset_lists_known_names():
+    with pytest.raises(ValueError, match="etsy-hero"):
+        get_preset("nope")
+
+
+def test_jpeg_presets_are_progressive_and_flatten_alpha_onto_white():
+    out = encode(_cutout(), "amazon-main")
+    with Image.open(io.BytesIO(out.data)) as img:
+        assert img.format == "JPEG" and img.mode == "RGB"
+        assert img.info.get("progressive") or img.info.get("progression")
+        assert all(v > 245 for v in img.getpixel((2, 2)))
+
+
+def test_quality_search_respects_the_byte_budget():
+    im = _photo()
+    unbounded = encode(im, Preset("t", "JPEG", min_quality=30, max_quality=95))
+    budget = len(unbounded.data) // 2
+    bounded = encode(im, Preset("t", "JPEG", max_bytes=budget, min_quality=30, max_quality=95))
+    assert len(bounded.data) <= budget
+    assert 30 <= bounded.setting < unbounded.setting == 95
+
+
+def test_perceptual_threshold_lowers_quality_for_simple_images():
+    flat = Image.new("RGB", (400, 300), (120, 160, 200))
+    out = encode(flat, Preset("t", "WEBP", min_quality=50, max_quality=90, min_psnr=40))
+    assert out.setting == 50
+    with Image.open(io.BytesIO(out.data)) as img:
+        assert psnr(flat, img) >= 40
+
+
+def test_transparent_presets_keep_alpha_and_shrink_cutouts():
+    cutout = _cutout()
+    plain = io.BytesIO()
+    cutout.save(plain, "PNG")
+    for name in ("transparent", "web-transparent"):
+        out = encode(cutout, name)
+        assert len(out.data) < len(plain.getvalue())
+        with Image.open(io.BytesIO(out.data)) as img:
+            assert img.format == PRESETS[name].format
+            assert img.convert("RGBA").getchannel("A").getextrema() == (0, 255)
+
+
+def test_max_edge_downscales():
+    out = encode(_photo((1600, 1200)), "web-thumb")
+    with Image.open(io.BytesIO(out.data)) as img:
+        assert img.size == (512, 384)
+        assert len(out.data) <= PRESETS["web-thumb"].max_bytes
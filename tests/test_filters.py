@@ -0,0 +1,35 @@
+from PIL import Image
+
+from app import filters
+
+
+def test_sepia_matches_tinted_luma():
+    im = Image.new("RGB", (8, 8), (200, 100, 50))
+    luma = Image.new("RGB", (1, 1), (200, 100, 50)).convert("L").getpixel((0, 0))
+    r, g, b = filters.sepia(im).getpixel((4, 4))
+    assert abs(r - luma * 0.95) <= 1 and abs(g - luma * 0.85) <= 1 and abs(b - luma * 0.65) <= 1
+
+
+def test_vignette_darkens_corners_only():
+    im = Image.new("RGB", (300, 200), (200, 200, 200))
+    out = filters.vignette(im)
+    assert out.getpixel((150, 100)) == (200, 200, 200)
+    assert sum(out.getpixel((0, 0))) < sum(out.getpixel((150, 100))) / 2
+
+
+def test_vignette_mask_and_fonts_are_cached():
+    assert filters.vignette_mask((320, 240)) is filters.vignette_mask((320, 240))
+    assert filters.load_font(24) is filters.load_font(24)
+
+
+def test_overlay_text_does_not_modify_input():
+    im = Image.new("RGB", (400, 300), (50, 120, 200))
+    out = filters.overlay_text(im, "Handmade", position="top-left")
+    assert im.getpixel((12, 12)) == (50, 120, 200)
+    assert out.getpixel((12, 12)) != (50, 120, 200)
+
+
+def test_enhance_identity_returns_same_image():
+    im = Image.new("RGB", (4, 4), (10, 20, 30))
+    assert filters.enhance(im) is im
+    assert filters.enhance(im, saturation=0.0).getpixel((0, 0))[0] == filters.enhance(im, saturation=0.0).getpixel((0, 0))[2]
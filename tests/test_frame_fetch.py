@@ -0,0 +1,132 @@
+import asyncio
+import base64
+
+import pytest
+
+from app.frame_fetch import FrameFetcher, FrameTooLarge, decode_data_url
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web  # noqa: E402
+
+
+async def _serve(routes):
+    app = web.Application()
+    app.add_routes(routes)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_decode_data_url_checks_size_before_decoding():
+    url = "data:image/jpeg;base64," + base64.b64encode(b"x" * 100).decode()
+    assert decode_data_url(url) == b"x" * 100
+    with pytest.raises(FrameTooLarge):
+        decode_data_url(url, max_bytes=50)
+    with pytest.raises(ValueError):
+        decode_data_url("data:image/jpeg,rawdata")
+
+
+def test_frames_keep_order_and_downloads_are_bounded(tmp_path):
+    state = {"active": 0, "peak": 0}
+
+    async def frame(request):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        i = int(request.match_info["i"])
+        # later frames finish first
+        await asyncio.sleep(0.05 * (6 - i))
+        state["active"] -= 1
+        return web.Response(body=f"frame-{i}".encode())
+
+    async def main():
+        runner, base = await _serve([web.get("/frame/{i}", frame)])
+        fetcher = FrameFetcher(concurrency=3)
+        try:
+            local = tmp_path / "a.jpg"
+            local.write_bytes(b"local")
+            data_url = "data:image/png;base64," + base64.b64encode(b"inline").decode()
+            urls = [f"{base}/frame/{i}" for i in range(6)]
+            frames = await fetcher.fetch_frames(
+                [urls[0], "/uploads/a.jpg", data_url, "/uploads/missing.jpg", *urls[1:]],
+                local=lambda url: str(local) if url == "/uploads/a.jpg" else None,
+            )
+        finally:
+            await fetcher.aclose()
+            await runner.cleanup()
+        return frames, fetcher
+
+    frames, fetcher = asyncio.run(main())
+    assert frames == [b"frame-0", str(tmp_path / "a.jpg"), b"inline", *(f"frame-{i}".encode() for i in range(1, 6))]
+    assert state["peak"] == 3
+    assert fetcher.stats()["fetched"] == 6
+    assert fetcher.stats()["failed"] == 1
+
+
+def test_oversized_errors_and_late_frames_are_dropped():
+    async def big(request):
+        # no Content-Length: the limit is enforced while streaming
+        resp = web.StreamResponse()
+        await resp.prepare(request)
+        for _ in range(10):
+            await resp.write(b"x" * 1000)
+        return resp
+
+    async def slow(request):
+        await asyncio.sleep(2)
+        return web.Response(body=b"late")
+
+    async def ok(request):
+        return web.Response(body=b"ok")
+
+    async def missing(request):
+        return web.Response(status=404)
+
+    async def main():
+        runner, base = await _serve([
+            web.get("/ok", ok),
+            web.get("/big", big),
+            web.get("/missing", missing),
+            web.get("/slow", slow),
+        ])
+        fetcher = FrameFetcher(max_bytes=5000, deadline=0.5)
+        try:
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            frames = await fetcher.fetch_frames([f"{base}/ok", f"{base}/big", f"{base}/missing", f"{base}/slow"])
+            elapsed = loop.time() - start
+        finally:
+            await fetcher.aclose()
+            await runner.cleanup()
+        return frames, elapsed, fetcher
+
+    frames, elapsed, fetcher = asyncio.run(main())
+    assert frames == [b"ok"]
+    assert elapsed < 2
+    assert fetcher.stats()["failed"] == 2
+    assert fetcher.stats()["timed_out"] == 1
+
+
+def test_data_urls_are_decoded_off_the_event_loop(monkeypatch):
+    import threading
+
+    from app import frame_fetch
+
+    threads = []
+    real = frame_fetch.decode_data_url
+
+    def recording(url, max_bytes):
+        threads.append(threading.get_ident())
+        return real(url, max_bytes)
+
+    monkeypatch.setattr(frame_fetch, "decode_data_url", recording)
+    url = "data:image/png;base64," + base64.b64encode(b"inline").decode()
+
+    async def main():
+        return await FrameFetcher().fetch_frames([url, url]), threading.get_ident()
+
+    frames, loop_thread = asyncio.run(main())
+    assert frames == [b"inline", b"inline"]
+    assert threads and loop_thread not in threads
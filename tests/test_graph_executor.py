@@ -0,0 +1,103 @@
+import asyncio
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from app.graph_executor import Graph, GraphError, GraphExecutor, RunContext, load_graph
+
+GRAPH_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "comfyui", "node_graphs", "supplementary_visuals.json")
+
+
+@pytest.fixture
+def ctx(tmp_path):
+    (tmp_path / "in").mkdir()
+    Image.new("RGB", (400, 300), (180, 90, 60)).save(tmp_path / "in" / "input.jpg")
+    return RunContext(str(tmp_path / "in"), str(tmp_path / "out"), "result.jpg")
+
+
+def test_shipped_graph_is_sorted_by_dependency():
+    graph = load_graph(GRAPH_FILE)
+    assert graph.order == ["loader", "resize", "color", "stylize", "overlay", "save"]
+
+
+def test_rejects_cycles_and_unknown_types():
+    with pytest.raises(GraphError):
+        Graph({"nodes": [{"id": "a", "type": "Resize"}, {"id": "b", "type": "Resize"}], "connections": [["a", "b"], ["b", "a"]]})
+    with pytest.raises(GraphError):
+        Graph({"nodes": [{"id": "a", "type": "Diffusion"}]})
+
+
+def test_rerun_with_new_overlay_text_reuses_upstream_nodes(ctx):
+    graph = load_graph(GRAPH_FILE)
+    executor = GraphExecutor()
+    first = asyncio.run(executor.run(graph, ctx))
+    assert set(first["computed"]) == set(graph.nodes)
+    saved = first["outputs"]["save"]
+    assert saved == os.path.join(ctx.output_root, "supplementary", "result.jpg")
+    with Image.open(saved) as out:
+        assert out.size == (1024, 768)
+
+    second = asyncio.run(executor.run(graph, ctx, {"overlay": {"text": "Blue - Size: M"}}))
+    assert sorted(second["cached"]) == ["color", "loader", "resize", "stylize"]
+    assert sorted(second["computed"]) == ["overlay", "save"]
+
+
+def test_independent_branches_both_run(ctx):
+    graph = Graph({
+        "nodes": [
+            {"id": "in", "type": "ImageLoader", "params": {"path": "input.jpg"}},
+            {"id": "small", "type": "Resize", "params": {"width": 100, "height": 100}},
+            {"id": "glow", "type": "StylizeFilter", "params": {"filter": "soft_glow", "strength": 0.5}},
+            {"id": "save_small", "type": "ImageSaver", "params": {"path": "a.jpg"}},
+            {"id": "save_glow", "type": "ImageSaver", "params": {"path": "b.jpg"}},
+        ],
+        "connections": [["in", "small"], ["in", "glow"], ["small", "save_small"], ["glow", "save_glow"]],
+    })
+    result = asyncio.run(GraphExecutor().run(graph, ctx))
+    assert sorted(result["outputs"]) == ["save_glow", "save_small"]
+    assert result["computed"].count("in") == 1
+
+
+def test_paths_cannot_escape_roots(ctx):
+    with pytest.raises(GraphError):
+        ctx.resolve_output("../../etc/passwd")
+    with pytest.raises(GraphError):
+        ctx.resolve_input("/etc/passwd")
+
+
+def test_run_graph_endpoint():
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+    assert "supplementary_visuals" in client.get("/api/graphs").json()["graphs"]
+    buf = io.BytesIO()
+    Image.new("RGB", (200, 150), (20, 120, 200)).save(buf, format="JPEG")
+    upload = client.post("/generate-metadata", files={"file": ("g.jpg", buf.getvalue(), "image/jpeg")}).json()
+
+    res = client.post("/api/graphs/supplementary_visuals/run", json={"image_filename": upload["image_filename"], "params": {"overlay": {"text": "Test"}}})
+    assert res.status_code == 200, res.text
+    url = res.json()["outputs"]["save"]
+    assert url.startswith("/outputs/supplementary/")
+    assert client.get(url).status_code == 200
+
+    bad = client.post("/api/graphs/supplementary_visuals/run", json={"image_filename": upload["image_filename"], "params": {"nope": {}}})
+    assert bad.status_code == 400
+    assert client.post("/api/graphs/missing/run", json={"image_filename": upload["image_filename"]}).status_code == 404
+
+    # outputs cannot be pointed at other files under /data/outputs
+    def run(**extra):
+        return client.post("/api/graphs/supplementary_visuals/run", json={"image_filename": upload["image_filename"], **extra})
+
+    assert run(params={"save": {"path": "outputs/supplementary/variant_x.jpg"}}).status_code == 400
+    assert run(output_name="../variant_x.jpg").status_code == 400
+    # oversized or malformed params are client errors
+    assert run(params={"resize": {"width": 100000, "height": 100000}}).status_code == 400
+    for params in (["resize"], {"resize": ["width", 10]}, {"resize": "big"}, {"resize": {"width": "1e999"}}):
+        assert run(params=params).status_code == 400, params
+    named = run(output_name="variant_x.jpg")
+    assert named.status_code == 200
+    assert named.json()["outputs"]["save"] != "/outputs/supplementary/variant_x.jpg"
@@ -0,0 +1,62 @@
+import io
+import struct
+from PIL import Image, ImageDraw
+from app.image_analysis import analyze_image_file, aspect_class, exif_thumbnail
+
+
+def _product_photo(size=(1600, 1200), color=(20, 30, 110)):
+    im = Image.new("RGB", size, (245, 245, 245))
+    w, h = size
+    ImageDraw.Draw(im).ellipse((w // 4, h // 4, 3 * w // 4, 3 * h // 4), fill=color)
+    return im
+
+
+def _exif_with_thumbnail(thumb: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    thumb.save(buf, "JPEG")
+    data = buf.getvalue()
+    # TIFF header, empty IFD0 pointing at IFD1 with JPEGInterchangeFormat(+Length), then the thumbnail
+    ifd1 = 14
+    thumb_offset = ifd1 + 2 + 2 * 12 + 4
+    tiff = b"II*\x00" + struct.pack("<I", 8) + struct.pack("<HI", 0, ifd1)
+    tiff += struct.pack("<H", 2) + struct.pack("<HHII", 0x0201, 4, 1, thumb_offset) + struct.pack("<HHII", 0x0202, 4, 1, len(data)) + struct.pack("<I", 0)
+    return b"Exif\x00\x00" + tiff + data
+
+
+def test_analysis_reports_colors_background_and_aspect(tmp_path):
+    path = tmp_path / "mug.jpg"
+    _product_photo().save(path, quality=90)
+    info = analyze_image_file(str(path))
+    assert (info["width"], info["height"], info["format"]) == (1600, 1200, "JPEG")
+    names = [c["name"] for c in info["dominant_colors"]]
+    assert names[0] == "white" and "navy" in names
+    assert info["background"]["color"] == "white" and info["background"]["uniformity"] > 0.9
+    assert info["aspect"] == "landscape"
+    assert 0.5 < info["brightness"] <= 1.0
+
+
+def test_transparent_png_is_analysed_on_white(tmp_path):
+    im = Image.new("RGBA", (600, 900), (0, 0, 0, 0))
+    ImageDraw.Draw(im).rectangle((150, 200, 450, 700), fill=(200, 30, 30, 255))
+    path = tmp_path / "cutout.png"
+    im.save(path)
+    info = analyze_image_file(str(path))
+    assert info["aspect"] == "portrait"
+    assert {"white", "red"} <= {c["name"] for c in info["dominant_colors"]}
+
+
+def test_exif_thumbnail_is_used_when_present(tmp_path):
+    path = tmp_path / "phone.jpg"
+    # main image navy, embedded thumbnail red: the analysis must come from the thumbnail
+    _product_photo(size=(4000, 3000)).save(path, quality=85, exif=_exif_with_thumbnail(Image.new("RGB", (160, 120), (200, 30, 30))))
+    with Image.open(path) as im:
+        assert exif_thumbnail(im).size == (160, 120)
+    info = analyze_image_file(str(path))
+    assert info["dominant_colors"][0]["name"] == "red"
+    assert info["width"] == 4000
+
+
+def test_aspect_classes():
+    assert aspect_class(1000, 1000) == "square"
+    assert aspect_class(3000, 1000) == "panoramic"
+    assert aspect_class(800, 1200) == "portrait"
@@ -0,0 +1,46 @@
+import importlib.util
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import image_utils
+
+
+def test_session_pool_loads_model_once():
+    created = []
+    pool = image_utils.SessionPool(size=2, factory=lambda: created.append(1) or object())
+    pool.load()
+    pool.load()
+    with pool.session():
+        pass
+    assert len(created) == 2
+
+
+def test_session_pool_caps_concurrency():
+    pool = image_utils.SessionPool(size=2, factory=object)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def borrow(_):
+        with pool.session():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+
+    with ThreadPoolExecutor(max_workers=6) as ex:
+        list(ex.map(borrow, range(6)))
+    assert peak[0] == 2
+
+
+@pytest.mark.skipif(importlib.util.find_spec("rembg") is not None, reason="rembg is installed")
+def test_background_removal_reports_missing_rembg():
+    assert image_utils.warmup_background_removal() is False
+    with pytest.raises(ImportError):
+        image_utils.remove_background_bytes(b"")
+    with pytest.raises(ImportError):
+        image_utils.remove_background_batch([b""])
@@ -0,0 +1,33 @@
+import asyncio
+import hashlib
+import io
+import pytest
+pytest.importorskip("fastapi")
+from fastapi import UploadFile
+from PIL import Image
+from app.ingest import ingest_upload, CHUNK_SIZE
+
+
+def _upload(data: bytes, name: str) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename=name)
+
+
+def test_ingest_hashes_and_sniffs_in_one_pass(tmp_path):
+    buf = io.BytesIO()
+    # noisy content so the file spans several chunks
+    Image.effect_noise((1200, 900), 64).convert("RGB").save(buf, format="JPEG", quality=95)
+    data = buf.getvalue()
+    assert len(data) > CHUNK_SIZE
+
+    stored = asyncio.run(ingest_upload(_upload(data, "../photo.jpg"), str(tmp_path)))
+    assert stored["sha256"] == hashlib.sha256(data).hexdigest()
+    assert stored["size"] == len(data)
+    assert stored["info"] == {"width": 1200, "height": 900, "mode": "RGB", "format": "JPEG"}
+    assert stored["filename"].endswith("_photo.jpg")
+    assert (tmp_path / stored["filename"]).read_bytes() == data
+
+
+def test_ingest_non_image_has_no_info(tmp_path):
+    stored = asyncio.run(ingest_upload(_upload(b"hello world", "notes.txt"), str(tmp_path), prefix="edited_"))
+    assert stored["info"] is None
+    assert stored["filename"].startswith("edited_")
@@ -0,0 +1,164 @@
+import asyncio
+import os
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.jobs import JobQueue, backoff
+
+
+def _queue(tmp_path, **kwargs):
+    return JobQueue(str(tmp_path / "jobs.db"), **kwargs)
+
+
+def test_backoff_doubles_up_to_the_cap():
+    assert [backoff(n, base=2, cap=10) for n in (1, 2, 3, 4)] == [2, 4, 8, 10]
+
+
+def test_claim_runs_jobs_in_submission_order(tmp_path):
+    q = _queue(tmp_path)
+    q.register("echo", None)
+    first, second = q.submit("echo", {"n": 1}), q.submit("echo", {"n": 2})
+    job = q.claim()
+    assert job["id"] == first and job["status"] == "running" and job["attempts"] == 1
+    assert q.claim()["id"] == second
+    assert q.claim() is None
+    with pytest.raises(ValueError):
+        q.submit("unknown", {})
+
+
+def test_failed_attempts_are_retried_with_backoff_then_fail(tmp_path):
+    q = _queue(tmp_path, max_attempts=2, retry_base=60)
+    q.register("flaky", None)
+    job_id = q.submit("flaky", {})
+    q.claim()
+    assert q.fail(job_id, {"status_code": 500, "detail": "boom"}) == "queued"
+    # not due yet
+    assert q.claim() is None
+    assert 59 < q.next_ready_in() <= 60
+    with q._lock:
+        q._db.execute("UPDATE jobs SET run_after = 0 WHERE id = ?", (job_id,))
+    q.claim()
+    assert q.fail(job_id, {"status_code": 500, "detail": "boom"}) == "failed"
+    assert q.get(job_id)["error"] == {"status_code": 500, "detail": "boom"}
+
+
+def test_jobs_survive_a_restart(tmp_path):
+    q = _queue(tmp_path)
+    q.register("work", None)
+    running, queued = q.submit("work", {"a": 1}), q.submit("work", {"b": 2})
+    q.claim()
+    q.close()  # the process dies with one job running
+
+    restarted = _queue(tmp_path)
+    assert restarted.requeue_running() == 1
+    assert restarted.get(running)["status"] == "queued"
+    assert restarted.get(queued)["payload"] == {"b": 2}
+    assert [restarted.claim()["id"], restarted.claim()["id"]] == [running, queued]
+
+
+def test_workers_run_handlers_and_report_progress(tmp_path):
+    q = _queue(tmp_path, retry_base=0)
+    calls = []
+
+    async def handler(payload, progress):
+        calls.append(payload)
+        progress(0.5, "halfway")
+        if payload.get("bad"):
+            raise HTTPException(status_code=404, detail="no such image")
+        if len(calls) == 2 and payload.get("flaky"):
+            raise RuntimeError("transient")
+        return {"doubled": payload["n"] * 2}
+
+    q.register("double", handler)
+
+    async def scenario():
+        await q.start(workers=2)
+        try:
+            ids = [q.submit("double", {"n": 1}), q.submit("double", {"n": 2, "flaky": True}), q.submit("double", {"n": 3, "bad": True})]
+            deadline = time.time() + 10
+            while any(q.get(i)["status"] not in ("succeeded", "failed") for i in ids) and time.time() < deadline:
+                await asyncio.sleep(0.02)
+            return [q.get(i) for i in ids]
+        finally:
+            await q.stop()
+
+    ok, retried, bad = asyncio.run(scenario())
+    assert ok["status"] == "succeeded" and ok["result"] == {"doubled": 2} and ok["progress"] == 1
+    assert ok["message"] == "halfway"
+    assert retried["status"] == "succeeded" and retried["attempts"] == 2
+    # client errors are not retried
+    assert bad["status"] == "failed" and bad["attempts"] == 1
+    assert bad["error"] == {"status_code": 404, "detail": "no such image"}
+
+
+def test_worker_survives_a_job_that_cannot_be_completed(tmp_path):
+    q = _queue(tmp_path, max_attempts=1)
+
+    async def handler(payload, progress):
+        progress(0.5)
+        # not JSON-serializable: complete() raises
+        return {"value": object()} if payload.get("bad") else {"ok": True}
+
+    q.register("echo", handler)
+
+    async def scenario():
+        await q.start(workers=1)
+        try:
+            ids = [q.submit("echo", {"bad": True}), q.submit("echo", {})]
+            deadline = time.time() + 10
+            while any(q.get(i)["status"] not in ("succeeded", "failed") for i in ids) and time.time() < deadline:
+                await asyncio.sleep(0.02)
+            return [q.get(i) for i in ids], q.stats()["workers"]
+        finally:
+            await q.stop()
+
+    (bad, ok), workers = asyncio.run(scenario())
+    assert bad["status"] == "failed" and bad["error"]["status_code"] == 500
+    assert ok["status"] == "succeeded" and ok["result"] == {"ok": True}
+    assert workers == 1
+
+
+def test_async_requests_are_refused_without_workers():
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    from app import main
+
+    # no lifespan: the workers never started, as with JOB_WORKERS=0
+    client = TestClient(main.app)
+    r = client.post("/api/generate-video", json={"frames": ["/uploads/x.jpg"]}, headers={"Prefer": "respond-async"})
+    assert r.status_code == 503
+
+
+def test_visuals_endpoint_runs_as_a_background_job(tmp_path):
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    from PIL import Image
+    from app import main
+
+    name = "job_test.jpg"
+    Image.new("RGB", (320, 240), (150, 80, 60)).save(os.path.join(main.UPLOAD_DIR, name))
+    try:
+        with TestClient(main.app) as client:
+            payload = {"image_filename": name, "remove_background": False, "output_size": 160}
+            r = client.post("/api/generate-visuals", json=payload, headers={"Prefer": "respond-async"})
+            assert r.status_code == 202
+            job = r.json()
+            assert r.headers["location"] == job["status_url"]
+
+            deadline = time.time() + 30
+            while client.get(job["status_url"]).json()["status"] not in ("succeeded", "failed") and time.time() < deadline:
+                time.sleep(0.05)
+            result = client.get(job["result_url"])
+            assert result.status_code == 200
+            assert result.json()["success"] is True and len(result.json()["generated"]) == 5
+
+            missing = client.post("/api/generate-visuals", json={"image_filename": "nope.jpg", "async": True})
+            assert missing.status_code == 202
+            while client.get(missing.json()["status_url"]).json()["status"] != "failed" and time.time() < deadline:
+                time.sleep(0.05)
+            assert client.get(missing.json()["result_url"]).status_code == 404
+            assert client.get("/api/jobs/does-not-exist").status_code == 404
+    finally:
+        os.unlink(os.path.join(main.UPLOAD_DIR, name))
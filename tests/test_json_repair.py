@@ -0,0 +1,58 @@
+from app.json_repair import local_repair, parse_lenient
+from app.validation import METADATA_SCHEMA, is_valid_metadata
+
+
+def test_fenced_output_with_prose_and_trailing_commas():
+    text = 'Sure! Here is the listing:\n```json\n{"title": "Mug", "bullets": ["a", "b",], "description": "d",}\n```\nHope it helps.'
+    obj = local_repair(text, METADATA_SCHEMA)
+    assert obj == {"title": "Mug", "bullets": ["a", "b"], "description": "d"}
+
+
+def test_single_quotes_and_python_literals():
+    obj = parse_lenient("{'title': 'Tom\\'s \"best\" mug', 'bullets': ['x'], 'description': 'd', 'attributes': {'gift': True, 'size': None}}")
+    assert obj["title"] == 'Tom\'s "best" mug'
+    assert obj["attributes"] == {"gift": True, "size": None}
+
+
+def test_truncated_output_is_closed():
+    text = '{"title": "Vase", "bullets": ["Hand thrown", "Glazed", "Wat'
+    obj = parse_lenient(text)
+    assert obj["title"] == "Vase"
+    assert obj["bullets"][:2] == ["Hand thrown", "Glazed"]
+
+    # truncated right after a key: back off to the last complete element
+    obj = parse_lenient('{"title": "Vase", "description": "Nice", "tags": ["a", "b"], "attri')
+    assert obj == {"title": "Vase", "description": "Nice", "tags": ["a", "b"]}
+
+
+def test_string_vs_list_coercion():
+    text = '{"title": ["Ceramic", "Mug"], "bullets": "- Handmade\\n- Dishwasher safe", "description": "d", "tags": "mug, ceramic, kitchen"}'
+    obj = local_repair(text, METADATA_SCHEMA)
+    assert obj["title"] == "Ceramic Mug"
+    assert obj["bullets"] == ["Handmade", "Dishwasher safe"]
+    assert obj["tags"] == ["mug", "ceramic", "kitchen"]
+    assert is_valid_metadata(obj)[0]
+
+
+def test_unrepairable_returns_none():
+    assert local_repair("I cannot help with that.", METADATA_SCHEMA) is None
+
+
+def test_try_ai_generate_prefers_local_repair(monkeypatch):
+    import asyncio
+    import pytest
+    pytest.importorskip("fastapi")
+    from app import main
+
+    async def fake_generate(prompt):
+        return '```json\n{"title": "Mug", "bullets": "Handmade", "description": "d",}\n```'
+
+    async def no_remote(text, **kwargs):
+        raise AssertionError("remote repair should not be called")
+
+    monkeypatch.setattr(main, "openai_generate", fake_generate)
+    monkeypatch.setattr(main, "repair_with_openai", no_remote)
+    before = main.metadata_path_counts["local_repair"]
+    result = asyncio.run(main.try_ai_generate("prompt"))
+    assert result["bullets"] == ["Handmade"] and result["ai_used"] is True
+    assert main.metadata_path_counts["local_repair"] == before + 1
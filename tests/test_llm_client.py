@@ -0,0 +1,98 @@
+import asyncio
+import time
+import pytest
+pytest.importorskip("openai")
+from app import llm_client
+from app.llm_client import LLMClient
+
+
+class _Msg:
+    def __init__(self, content):
+        self.message = type("M", (), {"content": content})()
+
+
+def _fake_acreate(delay, peak):
+    state = {"active": 0}
+
+    async def acreate(**kwargs):
+        state["active"] += 1
+        peak.append(state["active"])
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            state["active"] -= 1
+        return type("R", (), {"choices": [_Msg('{"ok": true}')]})()
+
+    return acreate
+
+
+def test_concurrent_calls_overlap_and_respect_limit(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    peak = []
+    monkeypatch.setattr(llm_client.openai.ChatCompletion, "acreate", _fake_acreate(0.2, peak))
+    client = LLMClient(max_concurrency=3)
+
+    async def run():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        hb = asyncio.create_task(heartbeat())
+        start = time.perf_counter()
+        results = await asyncio.gather(*[client.chat([{"role": "user", "content": "hi"}]) for _ in range(6)])
+        elapsed = time.perf_counter() - start
+        hb.cancel()
+        await client.aclose()
+        return results, elapsed, ticks
+
+    results, elapsed, ticks = asyncio.run(run())
+    assert len(results) == 6
+    # 6 calls of 0.2s with 3 slots: two waves, not six sequential waits
+    assert elapsed < 0.8
+    assert max(peak) == 3
+    # the event loop kept running other work while completions were pending
+    assert ticks > 10
+
+
+def test_cancelled_probe_frees_the_half_open_slot(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(llm_client.openai.ChatCompletion, "acreate", _fake_acreate(5, []))
+    client = LLMClient()
+    client.breaker._open()
+    client.breaker.opened_at -= client.breaker.cooldown
+
+    async def run():
+        probe = asyncio.create_task(client.complete([{"role": "user", "content": "hi"}], hedge=False))
+        await asyncio.sleep(0.05)
+        assert not client.breaker.allow()
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        await client.aclose()
+
+    asyncio.run(run())
+    assert client.breaker.state == "half_open"
+    assert client.breaker.allow()
+
+
+def test_length_finish_is_recorded_as_truncated(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+
+    async def acreate(**kwargs):
+        return {"choices": [{"message": {"content": '{"title": "cut'}, "finish_reason": "length"}],
+                "usage": {"prompt_tokens": 50, "completion_tokens": kwargs["max_tokens"]}}
+
+    monkeypatch.setattr(llm_client.openai.ChatCompletion, "acreate", acreate)
+    client = LLMClient()
+
+    async def run():
+        await client.chat([{"role": "user", "content": "hi"}], max_tokens=300, purpose="metadata")
+        await client.aclose()
+
+    asyncio.run(run())
+    assert client.tokens.stats()["metadata"]["truncated"] == 1
+    assert client.tokens.max_tokens("metadata") == 600
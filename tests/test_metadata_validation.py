@@ -20,3 +20,25 @@ def test_missing_required():
     ok, err = is_valid_metadata(bad)
     assert not ok
     assert "bullets" in err or "is a required property" in err
+
+
+def test_platform_schemas_apply_marketplace_limits():
+    sample = {
+        "title": "T" * 100,
+        "bullets": ["Handmade"],
+        "description": "d",
+        "tags": ["tag%d" % i for i in range(15)],
+    }
+    assert is_valid_metadata(sample)[0]
+    assert is_valid_metadata(sample, "amazon")[0]
+    ok, err = is_valid_metadata(sample, "etsy")
+    assert not ok
+    ok, err = is_valid_metadata(sample, "ebay")
+    assert not ok and "long" in err
+    # unknown platforms fall back to the generic schema
+    assert is_valid_metadata(sample, "shopify")[0]
+
+
+def test_precheck_rejects_non_objects():
+    ok, err = is_valid_metadata(["title"])
+    assert not ok
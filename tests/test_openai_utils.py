@@ -0,0 +1,95 @@
+import base64
+import hashlib
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from app.openai_utils import save_results
+
+
+def _png(color):
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+IMAGES = {f"/img{i}.png": _png((i * 40, 100, 200)) for i in range(4)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = IMAGES.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+def test_save_results_downloads_and_decodes_in_order(tmp_path, server):
+    items = [
+        {"url": f"{server}/img0.png"},
+        {"b64_json": base64.b64encode(IMAGES["/img1.png"]).decode()},
+        {"url": f"{server}/missing.png"},
+        {"url": f"{server}/img2.png"},
+    ]
+    paths = save_results(items, tmp_path, prefix="edit")
+    assert len(paths) == 3
+    for path, key in zip(paths, ["/img0.png", "/img1.png", "/img2.png"]):
+        data = open(path, "rb").read()
+        assert data == IMAGES[key]
+        assert path.endswith(f"edit_{hashlib.sha256(data).hexdigest()[:32]}.png")
+    # no partial downloads are left behind
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(p.rsplit("/", 1)[1] for p in paths)
+
+
+def test_concurrent_jobs_do_not_overwrite_each_other(tmp_path, server):
+    def job(i):
+        return save_results([{"url": f"{server}/img{i}.png"}], tmp_path, prefix="image")
+
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        results = list(ex.map(job, range(4)))
+    paths = [r[0] for r in results]
+    assert len(set(paths)) == 4
+    for i, path in enumerate(paths):
+        assert open(path, "rb").read() == IMAGES[f"/img{i}.png"]
+
+
+def test_cutouts_do_not_replace_content_named_results(tmp_path, server, monkeypatch):
+    import asyncio
+
+    from app import image_utils, main
+
+    def fake_matte(sources):
+        out = []
+        for data in sources:
+            buf = io.BytesIO()
+            Image.open(io.BytesIO(data)).convert("RGBA").save(buf, format="PNG")
+            out.append(buf.getvalue())
+        return out
+
+    monkeypatch.setattr(image_utils, "remove_background_batch", fake_matte)
+    paths = save_results([{"url": f"{server}/img0.png"}], tmp_path, prefix="edit")
+    cutouts = asyncio.run(main._remove_backgrounds_from_files(paths, str(tmp_path)))
+    assert cutouts[0] != paths[0] and cutouts[0].endswith("_cutout.png")
+    assert open(paths[0], "rb").read() == IMAGES["/img0.png"]
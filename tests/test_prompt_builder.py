@@ -0,0 +1,60 @@
+from app.prompt_builder import build_metadata_messages, build_repair_messages
+from app.llm_client import TokenAccounting
+
+
+def test_metadata_prompts_share_a_static_prefix():
+    a = build_metadata_messages({"width": 640, "height": 480, "format": "JPEG", "mode": "RGB"}, "Mug", "etsy", "playful")
+    b = build_metadata_messages({"width": 1200, "height": 900, "format": "PNG", "mode": "RGBA"}, "Vase", "etsy", "professional")
+    assert a[0] == b[0]
+    assert a[0]["role"] == "system" and '"maxLength":140' in a[0]["content"]
+    # per-request fields live only in the tail message
+    assert "640" not in a[0]["content"] and "640" in a[1]["content"]
+    assert "Mug" in a[1]["content"] and "playful" in a[1]["content"]
+
+    other = build_metadata_messages({"width": 1}, None, "ebay", "x")
+    assert other[0] != a[0]
+
+
+def test_repair_prompt_prefix_is_stable():
+    assert build_repair_messages("{bad", "amazon")[0] == build_repair_messages("{other", "amazon")[0]
+
+
+def test_token_accounting_sizes_max_tokens(monkeypatch):
+    monkeypatch.delenv("OPENAI_MAX_TOKENS", raising=False)
+    acct = TokenAccounting(min_samples=5, default_max_tokens=400)
+    assert acct.max_tokens("metadata") == 400
+    for n in (180, 190, 200, 210, 220):
+        acct.record("metadata", {"prompt_tokens": 900, "completion_tokens": n, "prompt_tokens_details": {"cached_tokens": 768}})
+    assert acct.max_tokens("metadata") == 275  # p99 (220) * 1.25
+    stats = acct.stats()["metadata"]
+    assert stats["requests"] == 5 and stats["avg_completion_tokens"] == 200
+    assert stats["cached_prompt_ratio"] > 0.8
+
+    monkeypatch.setenv("OPENAI_MAX_TOKENS", "350")
+    assert acct.max_tokens("metadata") == 350
+
+
+def test_truncated_completions_do_not_shrink_the_budget(monkeypatch):
+    monkeypatch.delenv("OPENAI_MAX_TOKENS", raising=False)
+    acct = TokenAccounting(min_samples=5, default_max_tokens=400)
+    for n in (150, 160, 170, 180, 190):
+        acct.record("metadata", {"prompt_tokens": 900, "completion_tokens": n})
+    budget = acct.max_tokens("metadata")
+    assert budget == 238  # p99 (190) * 1.25
+    # answers now need more: they hit the limit and report completion_tokens == limit
+    for _ in range(20):
+        acct.record("metadata", {"prompt_tokens": 900, "completion_tokens": budget}, truncated=True, limit=budget)
+    assert acct.max_tokens("metadata") == 2 * budget
+    assert acct.stats()["metadata"]["truncated"] == 20
+
+
+def test_system_prompt_cache_is_keyed_on_known_platforms():
+    from app import prompt_builder
+
+    generic = prompt_builder.metadata_system_prompt("generic")
+    before = prompt_builder._metadata_system_prompt.cache_info().currsize
+    for i in range(50):
+        assert prompt_builder.metadata_system_prompt(f"garbage-{i}") == generic
+        assert prompt_builder.repair_system_prompt(f"garbage-{i}") == prompt_builder.repair_system_prompt(None)
+    assert prompt_builder._metadata_system_prompt.cache_info().currsize == before
+    assert prompt_builder.metadata_system_prompt("ETSY") == prompt_builder.metadata_system_prompt("etsy")
@@ -12,3 +12,17 @@ def test_generate_structured_metadata_basic():
     assert "attributes" in meta and isinstance(meta["attributes"], dict)
     assert meta["attributes"]["width"] == 640
     assert "handmade" in meta["tags"]
+
+
+def test_generate_structured_metadata_uses_image_colors():
+    info = {
+        "width": 800, "height": 800, "format": "JPEG", "mode": "RGB",
+        "dominant_colors": [{"name": "white", "share": 0.6}, {"name": "navy", "share": 0.35}, {"name": "gray", "share": 0.01}],
+        "background": {"color": "white", "uniformity": 0.95},
+        "aspect": "square",
+    }
+    meta = generate_structured_metadata(info, category="Mug")
+    assert "Navy" in meta["title"]
+    assert "navy" in meta["tags"] and "white" not in meta["tags"]
+    assert meta["attributes"]["colors"] == ["navy"]
+    assert "navy" in meta["description"]
@@ -25,9 +25,9 @@ def test_remove_background_returns_png_and_has_alpha():
     assert res.headers["content-type"].startswith("image/png")
 
     img = Image.open(io.BytesIO(res.content))
-    # Should be RGBA (alpha channel present)
-    assert img.mode == "RGBA"
+    # Should carry transparency (RGBA, or a palette PNG with a transparent entry)
+    assert img.mode == "RGBA" or "transparency" in img.info
     # Alpha channel should exist and have at least one non-opaque pixel (some transparency)
-    alpha = img.getchannel("A")
+    alpha = img.convert("RGBA").getchannel("A")
     min_alpha, max_alpha = alpha.getextrema()
     assert min_alpha < 255
@@ -0,0 +1,120 @@
+import asyncio
+import time
+import pytest
+from app.resilience import CircuitBreaker, HedgeStats, hedged_call
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_on_errors_and_probes_after_cooldown():
+    clock = FakeClock()
+    breaker = CircuitBreaker(window=10, min_calls=4, error_rate=0.5, cooldown=30, clock=clock)
+    for ok in (True, False, True, False):
+        assert breaker.allow()
+        breaker.record(ok, 0.2)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.stats()["short_circuited"] == 1
+
+    clock.now = 31
+    assert breaker.allow()          # single half-open probe
+    assert not breaker.allow()
+    breaker.record(True, 0.3, probe=True)
+    assert breaker.state == "closed"
+
+
+def _half_open(clock):
+    breaker = CircuitBreaker(window=10, min_calls=2, error_rate=0.5, cooldown=30, clock=clock)
+    for _ in range(2):
+        breaker.record(False, 0.1)
+    clock.now = 31
+    assert breaker.allow()
+    return breaker
+
+
+def test_released_probe_lets_the_next_call_probe():
+    clock = FakeClock()
+    breaker = _half_open(clock)
+    assert not breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+
+
+def test_stale_probe_expires_after_cooldown():
+    clock = FakeClock()
+    breaker = _half_open(clock)
+    clock.now = 1000
+    assert [breaker.allow(), breaker.allow()] == [True, False]
+
+
+def test_only_the_probe_decides_the_half_open_outcome():
+    clock = FakeClock()
+    breaker = _half_open(clock)
+    # calls that were already in flight when the breaker opened
+    breaker.record(True, 0.1)
+    breaker.record(False, 0.1)
+    assert breaker.state == "half_open"
+    breaker.record(False, 0.1, probe=True)
+    assert breaker.state == "open"
+
+
+def test_breaker_opens_on_slow_calls():
+    breaker = CircuitBreaker(min_calls=3, slow_call_seconds=5, slow_rate=0.6, clock=FakeClock())
+    for _ in range(3):
+        breaker.record(True, 8.0)
+    assert breaker.state == "open"
+
+
+def _attempts(*delays):
+    calls = iter(delays)
+
+    async def factory():
+        delay = next(calls)
+        await asyncio.sleep(delay)
+        return delay
+
+    return factory
+
+
+def test_hedge_wins_when_first_attempt_is_slow():
+    stats = HedgeStats()
+    start = time.perf_counter()
+    result = asyncio.run(hedged_call(_attempts(1.0, 0.02), deadline=2.0, hedge_delay=0.05, stats=stats))
+    assert result == 0.02
+    assert time.perf_counter() - start < 0.5
+    assert stats.stats() == {"calls": 1, "hedged": 1, "hedge_won": 1, "hedge_win_rate": 1.0}
+
+
+def test_no_hedge_when_first_attempt_is_fast():
+    stats = HedgeStats()
+    assert asyncio.run(hedged_call(_attempts(0.01), deadline=1.0, hedge_delay=0.2, stats=stats)) == 0.01
+    assert stats.hedged == 0
+
+
+def test_deadline_raises_timeout():
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(hedged_call(_attempts(1.0), deadline=0.05))
+
+
+def test_client_short_circuits_when_breaker_open(monkeypatch):
+    pytest.importorskip("openai")
+    from app.llm_client import LLMClient
+    from app.resilience import CircuitOpenError
+
+    client = LLMClient()
+    client.breaker.state = CircuitBreaker.OPEN
+    client.breaker.opened_at = time.monotonic()
+
+    async def must_not_call(*args, **kwargs):
+        raise AssertionError("network call while breaker open")
+
+    monkeypatch.setattr(client, "chat", must_not_call)
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(client.complete([{"role": "user", "content": "x"}]))
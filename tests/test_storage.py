@@ -0,0 +1,116 @@
+import os
+from PIL import Image
+from app.storage import BlobStore
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"))
+    a, b = tmp_path / "a.bin", tmp_path / "b.bin"
+    digest = store.put_bytes(b"same bytes", str(a))
+    assert store.put_bytes(b"same bytes", str(b)) == digest
+
+    assert os.path.samefile(a, b)
+    assert os.path.samefile(a, store.blob_path(digest))
+    assert store.refcount(digest) == 2
+    assert store.stats() == {"stored": 1, "deduplicated": 1, "bytes_saved": len(b"same bytes")}
+    assert os.listdir(store.tmp_dir) == []
+
+
+def test_commit_of_known_content_drops_the_temp_file(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"))
+    digest = store.put_bytes(b"payload")
+    tmp = store.temp_path()
+    with open(tmp, "wb") as fh:
+        fh.write(b"payload")
+    store.commit(tmp, digest, str(tmp_path / "named.bin"))
+    assert not os.path.exists(tmp)
+    assert (tmp_path / "named.bin").read_bytes() == b"payload"
+
+
+def test_link_replaces_existing_name_atomically(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"))
+    dest = tmp_path / "out.bin"
+    old = store.put_bytes(b"old", str(dest))
+    new = store.put_bytes(b"new", str(dest))
+    assert dest.read_bytes() == b"new"
+    assert store.refcount(old) == 0
+    assert store.refcount(new) == 1
+    # no temp names left next to the logical file
+    assert sorted(os.listdir(tmp_path)) == ["blobs", "out.bin"]
+
+
+def test_gc_removes_only_unreferenced_blobs(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"))
+    kept = store.put_bytes(b"kept", str(tmp_path / "kept.bin"))
+    dropped = store.put_bytes(b"dropped", str(tmp_path / "dropped.bin"))
+    os.unlink(tmp_path / "dropped.bin")
+
+    # fresh blobs survive the default age limit
+    assert store.gc() == 0
+    assert store.gc(min_age=0) == len(b"dropped")
+    assert os.path.exists(store.blob_path(kept))
+    assert not os.path.exists(store.blob_path(dropped))
+
+
+def test_save_image_dedupes_identical_encodings(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"))
+    img = Image.new("RGB", (32, 32), (200, 40, 40))
+    d1 = store.save_image(img, str(tmp_path / "v1.png"), "PNG")
+    d2 = store.save_image(img.copy(), str(tmp_path / "v2.png"), "PNG")
+    assert d1 == d2
+    assert store.refcount(d1) == 2
+    with Image.open(tmp_path / "v2.png") as out:
+        assert out.size == (32, 32)
+
+
+def _other_filesystem(tmp_path):
+    """A directory on another filesystem than tmp_path (skips when there is none)."""
+    import tempfile
+
+    import pytest
+
+    shm = "/dev/shm"
+    if not os.path.isdir(shm) or not os.access(shm, os.W_OK) or os.stat(shm).st_dev == os.stat(tmp_path).st_dev:
+        pytest.skip("no second writable filesystem")
+    return tempfile.mkdtemp(dir=shm)
+
+
+def test_linking_across_filesystems_falls_back_to_a_copy(tmp_path):
+    import shutil
+
+    other = _other_filesystem(tmp_path)
+    try:
+        store = BlobStore(str(tmp_path / "blobs"))
+        dest = os.path.join(other, "out.bin")
+        digest = store.put_bytes(b"copied", dest)
+        # EXDEV: a separate file, not a reference to the blob
+        assert not os.path.samefile(dest, store.blob_path(digest))
+        assert store.refcount(digest) == 0
+    finally:
+        shutil.rmtree(other)
+
+
+def test_outputs_on_another_filesystem_get_their_own_store(tmp_path, monkeypatch):
+    import shutil
+
+    from app import storage
+
+    other = _other_filesystem(tmp_path)
+    monkeypatch.setattr(storage, "BLOB_DIR", str(tmp_path / "blobs"))
+    monkeypatch.setattr(storage, "_stores", {})
+    monkeypatch.setattr(storage, "mount_root", lambda path: other)
+    try:
+        a, b = os.path.join(other, "a.bin"), os.path.join(other, "b.bin")
+        store = storage.get_store(a)
+        assert store.root == os.path.join(other, ".blobs")
+        assert storage.get_store(str(tmp_path / "x.bin")).root == str(tmp_path / "blobs")
+        digest = store.put_bytes(b"regenerated", a)
+        assert storage.get_store(b).put_bytes(b"regenerated", b) == digest
+        # one copy of the bytes on that filesystem, referenced by both names
+        assert os.path.samefile(a, b) and os.path.samefile(a, store.blob_path(digest))
+        assert store.refcount(digest) == 2
+        os.unlink(b)
+        assert store.gc(min_age=0) == 0
+        assert storage.stats()["deduplicated"] == 1
+    finally:
+        shutil.rmtree(other)
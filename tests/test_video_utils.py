@@ -0,0 +1,126 @@
+import re
+import shutil
+import subprocess
+
+import pytest
+from PIL import Image
+
+from app import video_utils
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+
+
+def _frames(tmp_path, n, size=(320, 240), fmt="JPEG"):
+    paths = []
+    for i in range(n):
+        path = tmp_path / f"frame_{i}.{fmt.lower()}"
+        Image.new("RGB", size, (40 * i % 255, 120, 200)).save(path, fmt)
+        paths.append(str(path))
+    return paths
+
+
+def _duration(path) -> float:
+    info = subprocess.run(["ffmpeg", "-i", str(path)], capture_output=True, text=True).stderr
+    h, m, s = re.search(r"Duration: (\d+):(\d+):([\d.]+)", info).groups()
+    return int(h) * 3600 + int(m) * 60 + float(s)
+
+
+def test_plan_frames_passes_matching_jpegs_through(tmp_path):
+    frames = _frames(tmp_path, 3)
+    assert video_utils.plan_frames(frames + [str(tmp_path / "missing.jpg")]) == ("mjpeg", (320, 240), frames)
+
+
+def test_plan_frames_decodes_mixed_or_odd_sized_frames(tmp_path):
+    assert video_utils.plan_frames(_frames(tmp_path, 2, fmt="PNG"))[:2] == ("raw", (320, 240))
+    odd = _frames(tmp_path, 2, size=(321, 241))
+    assert video_utils.plan_frames(odd)[:2] == ("raw", (320, 240))
+    with pytest.raises(RuntimeError):
+        video_utils.plan_frames([str(tmp_path / "missing.jpg")])
+
+
+@needs_ffmpeg
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG"])
+def test_make_video_streams_frames_without_temp_files(tmp_path, monkeypatch, fmt):
+    import tempfile
+
+    def no_temp_dirs(*args, **kwargs):
+        raise AssertionError("frames must not be staged in a temp directory")
+
+    monkeypatch.setattr(tempfile, "TemporaryDirectory", no_temp_dirs)
+    frames = _frames(tmp_path, 4, fmt=fmt)
+    # a transparent frame of another size is letterboxed into the first frame's size
+    cutout = tmp_path / "cutout.png"
+    Image.new("RGBA", (100, 200), (0, 0, 0, 0)).save(cutout)
+    out = tmp_path / "out" / "video.mp4"
+    assert video_utils.make_video_from_frames(frames + [str(cutout)], str(out), fps=2) == str(out)
+    assert _duration(out) == pytest.approx(2.5, abs=0.1)
+
+
+def test_frames_can_be_given_as_bytes(tmp_path):
+    paths = _frames(tmp_path, 2)
+    data = [open(p, "rb").read() for p in paths]
+    assert video_utils.plan_frames([paths[0], data[1], b"not an image"]) == ("mjpeg", (320, 240), [paths[0], data[1]])
+    chunks = list(video_utils._frame_chunks("mjpeg", (320, 240), [paths[0], data[1]]))
+    assert chunks == data
+    raw = list(video_utils._frame_chunks("raw", (320, 240), [data[0]]))
+    assert len(raw[0]) == 320 * 240 * 3
+
+
+@needs_ffmpeg
+def test_ffmpeg_failure_is_reported(tmp_path):
+    with pytest.raises(RuntimeError, match="Video creation failed"):
+        video_utils.run_ffmpeg_with_input(["ffmpeg", "-f", "rawvideo", "-i", "-", "-bogus-option", str(tmp_path / "x.mp4")], iter([b"\0" * 16]))
+
+
+@needs_ffmpeg
+def test_make_video_from_passthrough_jpegs(tmp_path):
+    out = tmp_path / "video.mp4"
+    video_utils.make_video_from_frames(_frames(tmp_path, 6), str(out), fps=3)
+    assert _duration(out) == pytest.approx(2.0, abs=0.1)
+
+
+def _wav(path, seconds, rate=8000):
+    import wave
+
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\0\0" * int(seconds * rate))
+    return str(path)
+
+
+def test_pace_frames_spreads_frames_over_the_narration():
+    assert video_utils.pace_frames(4, 2, 5.0) == (2, [2, 3, 2, 3])
+    assert sum(video_utils.pace_frames(3, 2, 7.0)[1]) == 14
+    # narration shorter than one slot per frame: show each once, faster
+    fps, repeats = video_utils.pace_frames(6, 2, 2.0)
+    assert fps == 3 and repeats == [1] * 6
+    with pytest.raises(RuntimeError):
+        video_utils.pace_frames(3, 2, 0.0)
+
+
+@needs_ffmpeg
+def test_empty_narration_is_ignored(tmp_path):
+    out = tmp_path / "video.mp4"
+    video_utils.make_video_from_frames(_frames(tmp_path, 4), str(out), fps=2, audio_path=_wav(tmp_path / "empty.wav", 0))
+    assert _duration(out) == pytest.approx(2.0, abs=0.1)
+
+
+def test_probe_audio_reads_wav_header(tmp_path):
+    assert video_utils.probe_audio(_wav(tmp_path / "a.wav", 1.5)) == {"duration": 1.5, "codec": "pcm"}
+
+
+@needs_ffmpeg
+def test_narrated_video_is_muxed_in_one_pass(tmp_path, monkeypatch):
+    def no_second_pass(*args, **kwargs):
+        raise AssertionError("audio must be muxed in the encoding run")
+
+    monkeypatch.setattr(video_utils.subprocess, "run", no_second_pass)
+    out = tmp_path / "narrated.mp4"
+    video_utils.make_video_from_frames(_frames(tmp_path, 3), str(out), fps=2, audio_path=_wav(tmp_path / "n.wav", 4.0))
+    monkeypatch.undo()
+    info = subprocess.run(["ffmpeg", "-i", str(out)], capture_output=True, text=True).stderr
+    assert "Audio: aac" in info
+    # the slideshow runs as long as the narration instead of being trimmed to the frames
+    assert _duration(out) == pytest.approx(4.0, abs=0.15)
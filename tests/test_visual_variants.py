@@ -0,0 +1,165 @@
+import asyncio
+import os
+import random
+
+import pytest
+from PIL import Image
+
+from app import visuals
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "src.png"
+    img = Image.new("RGBA", (320, 240), (0, 0, 0, 0))
+    img.paste((200, 60, 40, 255), (80, 60, 240, 180))
+    img.save(path)
+    return str(path)
+
+
+def test_plan_variant_stays_inside_image():
+    for i in range(20):
+        plan = visuals.plan_variant(random.Random(i))
+        left, top, right, bottom = plan["box"]
+        assert 0 <= left < right <= 1 and 0 <= top < bottom <= 1
+        assert all(0.8 <= f <= 1.2 for f in plan["enhance"].values())
+
+
+def test_variant_seeds_are_stable_per_image_and_index():
+    assert visuals.variant_seed("abc", 0) == visuals.variant_seed("abc", 0)
+    assert visuals.variant_seed("abc", 0) != visuals.variant_seed("abc", 1)
+    assert visuals.variant_seed("abc", 0) != visuals.variant_seed("abc", 0, salt=7)
+
+
+def test_load_source_flattens_transparency(source):
+    img, original = visuals.load_source(source)
+    assert img.mode == "RGB" and original == (320, 240)
+    assert img.getpixel((0, 0)) == (255, 255, 255)
+
+
+def test_load_source_decodes_at_working_size(tmp_path):
+    path = tmp_path / "big.jpg"
+    Image.new("RGB", (4000, 3000), (90, 140, 200)).save(path, quality=90)
+    img, original = visuals.load_source(str(path), working_size=1000)
+    assert original == (4000, 3000)
+    assert img.size == (1000, 750)
+
+
+def test_fit_size_never_upscales():
+    assert visuals.fit_size((4000, 3000), 1024) == (1024, 768)
+    assert visuals.fit_size((300, 600), 1024) == (300, 600)
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_generate_variants(monkeypatch, tmp_path, source, workers):
+    monkeypatch.setattr(visuals, "VISUALS_WORKERS", workers)
+    monkeypatch.setattr(visuals, "VISUALS_WORKING_SIZE", 200)
+    visuals.shutdown_pool()
+    try:
+        paths = asyncio.run(visuals.generate_variants(source, str(tmp_path), count=3, output_size=160))
+    finally:
+        visuals.shutdown_pool()
+    assert len(paths) == 3
+    for p in paths:
+        with Image.open(p) as out:
+            assert out.format == "JPEG" and out.size == (160, 120)
+
+
+def _fake_matte(images):
+    # stand-in for rembg: keep the red product, cut out everything else
+    out = []
+    for img in images:
+        alpha = img.getchannel("R").point(lambda v: 255 if v > 150 else 0)
+        cutout = img.convert("RGBA")
+        cutout.putalpha(alpha)
+        out.append(cutout)
+    out[-1] = RuntimeError("matting failed")
+    return out
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_generate_variants_mattes_in_memory(monkeypatch, tmp_path, source, workers):
+    monkeypatch.setattr(visuals, "VISUALS_WORKERS", workers)
+    visuals.shutdown_pool()
+    try:
+        outdir = tmp_path / "out"
+        outdir.mkdir()
+        paths = asyncio.run(visuals.generate_variants(source, str(outdir), count=3, matte=_fake_matte))
+    finally:
+        visuals.shutdown_pool()
+    # only the final outputs are written: two cutouts plus the JPEG fallback for the failed one
+    assert sorted(p.name for p in outdir.iterdir()) == sorted(os.path.basename(p) for p in paths)
+    assert [os.path.splitext(p)[1] for p in paths] == [".png", ".png", ".jpg"]
+    with Image.open(paths[0]) as out:
+        # palette PNG from the default "transparent" preset
+        assert out.format == "PNG" and out.size == (320, 240)
+        assert out.convert("RGBA").getchannel("A").getextrema()[1] == 255
+
+
+@pytest.mark.parametrize("matte", [None, lambda images: [img.convert("RGBA") for img in images]])
+def test_repeat_request_returns_stored_variants_without_decoding(monkeypatch, tmp_path, source, matte):
+    monkeypatch.setattr(visuals, "VISUALS_WORKERS", 0)
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    first = asyncio.run(visuals.generate_variants(source, str(outdir), count=3, matte=matte))
+    mtimes = [os.stat(p).st_mtime_ns for p in first]
+
+    def no_decode(*args):
+        raise AssertionError("source decoded again")
+
+    monkeypatch.setattr(visuals, "load_source", no_decode)
+    again = asyncio.run(visuals.generate_variants(source, str(outdir), count=3, matte=matte))
+    assert again == first
+    assert [os.stat(p).st_mtime_ns for p in again] == mtimes
+    assert len(set(first)) == 3
+
+
+def _matting_unavailable(images):
+    raise ImportError("rembg")
+
+
+def test_repeat_request_reuses_flat_fallback_when_matting_fails(monkeypatch, tmp_path, source):
+    monkeypatch.setattr(visuals, "VISUALS_WORKERS", 0)
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    first = asyncio.run(visuals.generate_variants(source, str(outdir), count=3, matte=_matting_unavailable))
+    assert all(p.endswith(".jpg") for p in first)
+    before = visuals.stats()
+    again = asyncio.run(visuals.generate_variants(source, str(outdir), count=3, matte=_matting_unavailable))
+    after = visuals.stats()
+    assert again == first
+    assert after["cached"] - before["cached"] == 3
+    assert after["rendered"] == before["rendered"]
+
+
+@pytest.mark.parametrize("output_size", [True, 0, "160", 1.5])
+def test_visuals_endpoint_rejects_bad_output_size(source, output_size):
+    import shutil
+
+    from fastapi.testclient import TestClient
+    from app import main
+
+    name = "output_size_test.jpg"
+    shutil.copy(source, os.path.join(main.UPLOAD_DIR, name))
+    try:
+        r = TestClient(main.app).post("/api/generate-visuals", json={"image_filename": name, "output_size": output_size})
+    finally:
+        os.unlink(os.path.join(main.UPLOAD_DIR, name))
+    assert r.status_code == 400
+
+
+@pytest.mark.parametrize("field", ["preset", "cutout_preset"])
+@pytest.mark.parametrize("value", [["etsy-hero"], "nope"])
+def test_visuals_endpoint_rejects_bad_presets(source, field, value):
+    import shutil
+
+    from fastapi.testclient import TestClient
+    from app import main
+
+    name = "preset_test.jpg"
+    shutil.copy(source, os.path.join(main.UPLOAD_DIR, name))
+    try:
+        r = TestClient(main.app).post("/api/generate-visuals", json={"image_filename": name, field: value})
+    finally:
+        os.unlink(os.path.join(main.UPLOAD_DIR, name))
+    assert r.status_code == 400
@@ -17,3 +17,22 @@ def test_generate_variants_creates_files(tmp_path):
     assert len(paths) >= 3
     for p in paths:
         assert Path(p).exists()
+
+
+def test_rerun_does_not_rewrite_linked_outputs_in_place(tmp_path):
+    import os
+    from PIL import Image
+
+    sample = tmp_path / "sample.jpg"
+    Image.new("RGB", (320, 240), color=(100, 120, 140)).save(sample)
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    first = Path(generate_variants(sample, outdir, title="One", frames=1)[0])
+    # another name for the same inode, as left by scripts/dedupe_storage.py
+    other = tmp_path / "other.jpg"
+    os.unlink(first)
+    first.write_bytes(b"shared content")
+    os.link(first, other)
+    generate_variants(sample, outdir, title="Two", frames=1)
+    assert other.read_bytes() == b"shared content"
+    assert first.read_bytes() != b"shared content"